@@ -7,12 +7,29 @@
 import requests
 import time
 import os
-import pandas as pd
-from datetime import datetime, timedelta
 import traceback
-import subprocess
-import sys
 import json
+import numpy as np
+from collections import deque
+
+from market_state import CoinState, to_float
+from history_store import HistoryStore
+from market_scanner import MarketScanner
+from scheduler import JobScheduler
+from rate_limit import TokenBucket
+from bithumb_client import BithumbClient
+from response_recorder import ResponseRecorder
+from log_writer import AsyncLogWriter
+from wall_tracker import WallTracker
+from order_book import OrderBookSnapshot
+from snapshot_channel import SnapshotPublisher, SnapshotRegionWriter
+from metrics import MetricsRegistry, measure_observation_cost
+from coin_shards import ShardPool, ShardTick, merge_metrics_snapshots
+from anomaly_events import (
+    AnomalyEvent, DETECTOR_FLUCTUATION, DETECTOR_TREND, DETECTOR_WASH_TRADE,
+    DETECTOR_ORDER_WALL, DETECTOR_PUMP_DUMP, DETECTOR_SPOOFING
+)
+from trade_tape import TradeSnapshot, SIDE_BID, find_wash_trade_pairs, format_epoch_ms
 
 # --- 설정 (Configuration) ---
 BASE_URL = "https://api.bithumb.com/public"
@@ -21,41 +38,54 @@ TICKER_REQUEST_URL = BASE_URL + TICKER_ENDPOINT
 
 TARGET_COINS = ["BTC", "ETH", "DOGE"] # 감시할 코인 목록
 
-CSV_FILE_PATH = "bithumb_ticker_data.csv" # 데이터 저장 CSV 파일 경로 (이력 관리용)
+# 전체 시장 스캔 설정 (ALL_KRW 티커 응답의 모든 심볼에 24H 변동률/추세 이탈 검사를 한꺼번에 적용)
+# 스캔에서 이상 징후 점수가 높은 상위 SCAN_TOP_K개 심볼은 이번 주기에 체결 내역/호가창 정밀 탐지 대상에 추가됩니다.
+SCAN_MODE_ENABLED = True
+SCAN_TOP_K = 5
+
+HISTORY_STORE_DIR = "history_store" # 시세 이력 저장소 디렉터리 (날짜별 파티션 파일)
+LEGACY_CSV_FILE_PATH = "bithumb_ticker_data.csv" # 예전 CSV 이력 파일 (저장소가 비어 있으면 시작 시 한 번 옮겨 옴)
 LOG_FILE_PATH = "anomaly_detection_log.log" # 콘솔 출력 로그 파일 경로 (디버깅용)
 SHARED_DATA_FILE = "shared_data.json" # 웹 서버와 공유할 데이터 파일
+SNAPSHOT_REGION_FILE = "shared_snapshot.mmap" # 웹 서버와 공유할 메모리 매핑 스냅샷 영역 (serve_web.py와 같은 값이어야 함)
+
+# 로그 출력 설정 (파일에는 모든 레벨이 기록되고, 콘솔에는 CONSOLE_LOG_LEVEL 이상만 출력)
+CONSOLE_LOG_LEVEL = "INFO" # "DEBUG", "INFO", "WARNING", "ERROR" 중 하나
+LOG_FLUSH_INTERVAL_SECONDS = 0.5 # 로그 파일/콘솔 버퍼를 비우는 최대 간격
+LOG_MAX_BYTES = 10 * 1024 * 1024 # 로그 파일이 이 크기를 넘으면 새 파일로 교체
+LOG_ROTATE_INTERVAL_SECONDS = None # 시간 기준 교체 주기 (예: 86400 = 하루, None이면 사용 안 함)
+LOG_BACKUP_COUNT = 5 # 보관할 이전 로그 파일 수
 
 # 웹 UI에 표시할 데이터 이력 길이 (예: 5분치 데이터, 5초마다 업데이트 시 60개)
 DATA_HISTORY_LENGTH = 60
+ANOMALY_LOG_MAX_LENGTH = 100 # 웹 UI에 보여줄 최근 이상 징후 이벤트 수
+
+# 분석용으로 메모리에 유지할 코인별 시세 이력 길이 (링 버퍼 크기, 예: 5초 주기 시 1시간치 720개)
+# 이동 평균 창과 펌프 탐지 창을 모두 담을 수 있을 만큼 커야 합니다.
+# 프로그램 시작 시 이력 저장소에서는 마지막 이 개수만큼의 시각만 읽어옵니다.
+IN_MEMORY_HISTORY_LENGTH = 720
 
 # --- 전역 변수 (Global Variables for Shared Data) ---
 # 이 변수들은 주기적으로 JSON 파일에 저장됩니다.
 global_coin_data_history = {coin: [] for coin in TARGET_COINS}
-global_anomaly_logs = [] # 웹 UI에 표시할 이상 징후 로그
+# 웹 UI에 표시할 이상 징후 이벤트 (AnomalyEvent). 가득 차면 가장 오래된 것부터 자동으로 밀려납니다.
+global_anomaly_events = deque(maxlen=ANOMALY_LOG_MAX_LENGTH)
+global_event_sequence = 0 # 이상 징후 이벤트 일련번호 (마지막으로 부여한 값)
 global_current_summary = {coin: {} for coin in TARGET_COINS} # 웹 UI에 표시할 최신 요약 정보
 
-# 스푸핑 탐지를 위해 직전 주기에서 감지된 대규모 호가벽 정보를 저장합니다.
-# {'coin_symbol': [{'price': float, 'quantity': float, 'type': 'ask'/'bid', 'timestamp': datetime}, ...]}
-global_last_detected_large_walls = {coin: [] for coin in TARGET_COINS}
+# 스푸핑 탐지를 위한 코인별 호가창 벽 추적기 (wall_tracker.WallTracker, 처음 필요할 때 생성)
+global_wall_trackers = {}
+# 공유 데이터 파일에서 읽어 온, 아직 추적기로 복원하지 않은 벽 상태 {'coin_symbol': [벽 딕셔너리, ...]}
+global_saved_wall_state = {}
 
 
-# 프로그램 시작 시 기존 공유 데이터 로드
-if os.path.exists(SHARED_DATA_FILE):
-    try:
-        with open(SHARED_DATA_FILE, 'r', encoding='utf-8') as f:
-            loaded_data = json.load(f)
-            if isinstance(loaded_data.get('history'), dict):
-                global_coin_data_history = loaded_data['history']
-            if isinstance(loaded_data.get('anomaly_logs'), list):
-                global_anomaly_logs = loaded_data['anomaly_logs']
-            if isinstance(loaded_data.get('current_summary'), dict):
-                global_current_summary = loaded_data['current_summary']
-            # 이전 스푸핑 관련 데이터도 로드 시도 (없으면 빈 리스트로 초기화)
-            if isinstance(loaded_data.get('last_detected_large_walls'), dict):
-                global_last_detected_large_walls = loaded_data['last_detected_large_walls']
-            print(f"기존 공유 데이터 '{SHARED_DATA_FILE}' 로드 완료.")
-    except Exception as e:
-        print(f"공유 데이터 '{SHARED_DATA_FILE}' 로드 실패: {e}. 새 데이터로 시작합니다.")
+# 공유 데이터 발행기 (임시 파일 + 원자적 교체, 내용이 바뀐 주기에만 기록)
+snapshot_publisher = SnapshotPublisher(SHARED_DATA_FILE)
+
+# 단계별 소요 시간 히스토그램과 요청/오류/이상 징후/주기 초과 카운터 (공유 데이터의 'metrics'로 발행, 웹 서버 /metrics에서 조회)
+global_metrics = MetricsRegistry()
+# 마지막으로 발행할 계측 사본 (티커 작업을 실행한 반복에서만 새로 만들어, 정밀 탐지만 한 반복에서는 공유 데이터를 다시 쓰지 않게 함)
+global_metrics_snapshot = None
 
 # 기존 이상 징후 감지 설정
 FLUCTUATION_THRESHOLD_PERCENT = 5.0
@@ -65,246 +95,447 @@ WASH_TRADE_TIME_WINDOW_SECONDS = 2
 WASH_TRADE_PRICE_TOLERANCE_PERCENT = 0.05
 WASH_TRADE_QUANTITY_TOLERANCE_PERCENT = 0.1
 RECENT_TRADES_LOOKBACK_COUNT = 50
+TRADE_TAPE_CAPACITY = 5000 # 코인별로 메모리에 보관할 최대 체결 수 (주기 간 중복 제거된 체결 테이프)
 ORDER_BOOK_COUNT = 10
+ORDER_BOOK_DEPTH_PERCENT = 1.0 # 호가창 깊이 지표(누적 수량, 매수/매도 불균형)를 계산할 중간가 대비 범위 (%)
 ORDER_WALL_VOLUME_MULTIPLIER = 2.0
 ORDER_WALL_PRICE_DISTANCE_PERCENT = 0.5
-PUMP_DETECTION_WINDOW_SECONDS = 300
-PUMP_PRICE_INCREASE_PERCENT = 3.0
+WALL_PRICE_TOLERANCE_PERCENT = 0.01 # 이 가격 차이(%) 이내의 벽은 같은 가격대의 벽으로 추적
+WALL_QUANTITY_TOLERANCE_PERCENT = 0.01 # 수량이 이 비율(%) 이상 바뀌면 직전 벽이 사라지고 새 벽이 세워진 것으로 봄
+WALL_TRACKER_RETENTION_SECONDS = 3600 # 사라진 벽을 기억할 시간 (이 안에 같은 가격대에 다시 세워지면 반복으로 집계)
+SPOOFING_REPEAT_PULL_COUNT = 3 # 같은 가격대의 벽이 이 횟수 이상 철회되면 가격 움직임과 무관하게 반복 스푸핑으로 의심
+# 펌프 탐지 창 (창 길이 초, 가격 상승률 임계치 %). 모든 창을 한 번에 평가합니다.
+# 가장 긴 창이 IN_MEMORY_HISTORY_LENGTH x TICKER_INTERVAL_SECONDS 안에 들어와야 합니다.
+PUMP_DETECTION_WINDOWS = (
+    (60, 1.5), # 1분
+    (300, 3.0), # 5분
+    (900, 5.0), # 15분
+)
 PUMP_VOLUME_MULTIPLIER_FROM_AVG_24H = 5.0
 
-API_CALL_INTERVAL_SECONDS = 5 # API 호출 및 전체 분석 주기 (초 단위)
+# 수집 주기 설정 (작업 스케줄러)
+# 티커(ALL_KRW 한 번 요청으로 모든 코인 시세)는 가벼우므로 짧은 고정 주기로 수집하고,
+# 코인별 체결 내역/호가창 요청은 비싸므로 코인의 변동성(전체 시장 스캔 점수)에 따라 주기를 조절합니다.
+TICKER_INTERVAL_SECONDS = 5 # 티커 수집 및 24H 변동률/추세 분석 주기 (초 단위)
+DETAIL_MIN_INTERVAL_SECONDS = 5 # 변동성이 큰 코인(스캔 점수 1 이상)의 체결 내역/호가창 탐지 주기
+DETAIL_MAX_INTERVAL_SECONDS = 30 # 조용한 코인(스캔 점수 0)의 체결 내역/호가창 탐지 주기
+API_REQUEST_RATE_LIMIT_PER_SECOND = 15 # 빗썸 Public API 요청 예산 (초당 요청 수, 거래소 제한보다 충분히 낮게)
+API_REQUEST_BURST = 15 # 예산이 쌓였을 때 한꺼번에 보낼 수 있는 최대 요청 수
+SCHEDULER_LATENESS_TOLERANCE_SECONDS = 1.0 # 예정 시각보다 이만큼 넘게 늦게 시작하면 마감 초과로 집계
+SCHEDULER_STATS_LOG_INTERVAL_SECONDS = 60 # 스케줄러 통계 로그 주기
+
+# HTTP 요청 설정 (모든 요청이 하나의 keep-alive 커넥션 풀을 공유합니다)
+HTTP_MAX_CONCURRENCY = 8 # 코인별 요청을 동시에 보낼 최대 개수
+HTTP_CONNECT_TIMEOUT_SECONDS = 3.05 # 연결 타임아웃
+HTTP_READ_TIMEOUT_SECONDS = 5 # 응답 읽기 타임아웃 (HTTP_ENDPOINT_TIMEOUTS에 없는 엔드포인트)
+# 엔드포인트별 (연결, 읽기) 타임아웃. 코인별 요청은 짧게 잡아 느린 엔드포인트 하나가 다른 작업을 오래 막지 않게 합니다.
+HTTP_ENDPOINT_TIMEOUTS = {
+    "/ticker": (HTTP_CONNECT_TIMEOUT_SECONDS, 5), # ALL_KRW 응답은 크므로 여유 있게
+    "/transaction_history": (HTTP_CONNECT_TIMEOUT_SECONDS, 3),
+    "/orderbook": (HTTP_CONNECT_TIMEOUT_SECONDS, 3),
+}
+HTTP_MAX_RETRIES = 2 # 네트워크 오류, 429, 5xx 응답 시 추가 시도 횟수 (지터가 들어간 지수 백오프)
+HTTP_BACKOFF_BASE_SECONDS = 0.25 # 첫 재시도 대기 시간 상한 (시도마다 두 배)
+HTTP_BACKOFF_MAX_SECONDS = 4.0 # 재시도 대기 시간 최대값
+HTTP_RATE_LIMIT_MAX_WAIT_SECONDS = 5.0 # 요청 예산(토큰)을 기다릴 최대 시간
+CIRCUIT_BREAKER_FAILURE_THRESHOLD = 5 # 엔드포인트별 연속 실패가 이 횟수가 되면 서킷 브레이커 열림
+CIRCUIT_BREAKER_COOLDOWN_SECONDS = 30 # 서킷 브레이커가 열린 뒤 해당 엔드포인트 요청을 건너뛰는 시간
+
+# 원본 응답 기록 설정 (장애 재현, replay.py 재생, 벤치마크 입력용. 티커 응답이 커서 하루 수백 MB가 될 수 있으므로 기본값은 꺼짐)
+RESPONSE_RECORDING_ENABLED = False
+RESPONSE_RECORDING_DIR = "recordings" # 날짜별 기록 파일({날짜}.responses.gz)을 둘 디렉터리
+RESPONSE_RECORDING_QUEUE_SIZE = 10000 # 기록 대기 큐 크기 (가득 차면 수집을 늦추지 않고 응답을 버림)
+
+# 코인 분할(멀티 프로세스) 모드 설정
+# 0이면 한 프로세스에서 모두 처리합니다. N이면 티커 요청, 이력 저장소 기록, 전체 시장 스캔, 공유 데이터 발행은 이 프로세스가 맡고,
+# 코인별 상태(링 버퍼, 체결 테이프, 벽 추적기)와 추세 분석/정밀 탐지는 심볼의 crc32 값으로 나눈 작업 프로세스 N개가 맡습니다.
+SHARD_WORKER_COUNT = 0
+SHARD_WATCH_ALL_KRW = False # True면 티커 응답의 모든 KRW 심볼을 대상 코인처럼 추세 분석/정밀 탐지 (분할 모드 전용, 요청 예산도 그만큼 필요)
+SHARD_MAX_DETAIL_JOBS_PER_CYCLE = 50 # 작업 프로세스가 한 반복에 실행할 최대 정밀 탐지 작업 수 (밀린 작업 사이사이에 새 티커를 반영하도록)
+SHARD_PUBLISH_INTERVAL_SECONDS = 1.0 # 작업 프로세스 결과만 들어온 경우 공유 데이터를 다시 발행하는 최소 간격
+SHARD_LOG_FILE_FORMAT = "anomaly_detection_log.shard{shard}.log" # 작업 프로세스별 로그 파일 (콘솔에는 오류만 출력)
+
+# 분석용 코인별 메모리 상태 (링 버퍼 + 이동 통계). 이력 저장소는 보관용으로 기록하고 시작 시에만 읽습니다.
+global_coin_states = {coin: CoinState(coin, IN_MEMORY_HISTORY_LENGTH, MOVING_AVERAGE_WINDOW, TRADE_TAPE_CAPACITY) for coin in TARGET_COINS}
+
+# 전체 시장 스캐너 (모든 KRW 심볼의 심볼 x 시간 행렬). 스캔에서 승격된 코인의 상태는 처음 필요할 때 global_coin_states에 추가됩니다.
+global_market_scanner = MarketScanner(IN_MEMORY_HISTORY_LENGTH, MOVING_AVERAGE_WINDOW)
+
+# 코인별 최신 현재가와 24H 거래량 (티커 작업이 갱신하고, 호가창 작업이 읽음)
+# {'coin_symbol': {'closing_price': str, 'units_traded_24H': str}}
+global_latest_ticker = {}
+
+# 빗썸 Public API 클라이언트 생성 (커넥션 풀 + 동시 요청용 스레드 풀)
+# rate_limit_per_second, burst: 이 클라이언트의 요청 예산 (코인 분할 모드의 작업 프로세스는 전체 예산을 나눈 몫을 받음)
+# recording_dir: 원본 응답 기록 디렉터리 (RESPONSE_RECORDING_ENABLED일 때만 사용, 프로세스마다 다른 디렉터리여야 함)
+def make_http_client(rate_limit_per_second, burst, recording_dir=RESPONSE_RECORDING_DIR):
+    return BithumbClient(
+        BASE_URL, HTTP_MAX_CONCURRENCY, (HTTP_CONNECT_TIMEOUT_SECONDS, HTTP_READ_TIMEOUT_SECONDS),
+        endpoint_timeouts=HTTP_ENDPOINT_TIMEOUTS,
+        rate_limiter=TokenBucket(rate_limit_per_second, burst),
+        limiter_max_wait=HTTP_RATE_LIMIT_MAX_WAIT_SECONDS,
+        max_retries=HTTP_MAX_RETRIES,
+        backoff_base=HTTP_BACKOFF_BASE_SECONDS,
+        backoff_max=HTTP_BACKOFF_MAX_SECONDS,
+        breaker_failure_threshold=CIRCUIT_BREAKER_FAILURE_THRESHOLD,
+        breaker_cooldown=CIRCUIT_BREAKER_COOLDOWN_SECONDS,
+        recorder=ResponseRecorder(recording_dir, queue_size=RESPONSE_RECORDING_QUEUE_SIZE) if RESPONSE_RECORDING_ENABLED else None,
+        metrics=global_metrics
+    )
+
+# 빗썸 Public API 공용 클라이언트
+# 모든 요청(재시도 포함)은 공용 요청 예산(토큰 버킷)을 거치며, 스케줄러도 같은 예산을 보고 작업 실행 여부를 정합니다.
+http_client = make_http_client(API_REQUEST_RATE_LIMIT_PER_SECOND, API_REQUEST_BURST)
 
 # --- 함수 정의 (Function Definitions) ---
 
+# 로그 파일 경로별 비동기 로그 기록기 (처음 사용할 때 생성)
+_log_writers = {}
+
+def get_log_writer(file_path=LOG_FILE_PATH):
+    writer = _log_writers.get(file_path)
+    if writer is None:
+        writer = AsyncLogWriter(
+            file_path,
+            console_level=CONSOLE_LOG_LEVEL,
+            flush_interval=LOG_FLUSH_INTERVAL_SECONDS,
+            max_bytes=LOG_MAX_BYTES,
+            rotate_interval_seconds=LOG_ROTATE_INTERVAL_SECONDS,
+            backup_count=LOG_BACKUP_COUNT
+        )
+        _log_writers[file_path] = writer
+    return writer
+
 # 모든 print() 출력을 파일과 콘솔 모두에 기록하도록 오버라이드
-# is_anomaly=True 일 경우 웹 UI용 로그에도 추가
-def print_and_log(message, file_path=LOG_FILE_PATH, is_anomaly=False):
-    print(message)
+# 실제 쓰기는 백그라운드 스레드가 모아서 처리하므로 여기서는 큐에 넣기만 합니다.
+# message: 문자열 또는 AnomalyEvent (문장은 기록 스레드에서 만들어짐)
+# level: "DEBUG"/"INFO"/"WARNING"/"ERROR" (콘솔 출력 여부 결정)
+def print_and_log(message, file_path=LOG_FILE_PATH, level="INFO"):
+    get_log_writer(file_path).write(message, level)
+
+# 수집 루프 단계 하나의 소요 시간을 'stage_seconds{stage=...}' 히스토그램에 기록 (with 문으로 사용)
+def stage_timer(stage):
+    return global_metrics.span('stage_seconds', stage=stage)
+
+# 'YYYY-MM-DD HH:MM:SS' 형식의 로컬 시각 문자열을 epoch 초로 변환
+def timestamp_to_epoch(current_timestamp):
+    return time.mktime(time.strptime(current_timestamp, '%Y-%m-%d %H:%M:%S'))
+
+# 이상 징후 이벤트를 기록하는 함수 (웹 UI용 이벤트 목록에 추가 + 로그 출력)
+# 탐지 함수는 수치 근거만 넘기고, 알림 문장은 로그/웹 UI에서 필요할 때 만들어집니다.
+def record_anomaly(coin_symbol, detector, current_timestamp, **evidence):
+    return append_anomaly_event(coin_symbol, detector, timestamp_to_epoch(current_timestamp), evidence)
+
+# 이벤트 일련번호와 다음 스냅샷 version을 붙여 이벤트 목록에 추가하고 로그 출력
+# (코인 분할 모드에서는 작업 프로세스가 보낸 이벤트를 조정 프로세스가 이 함수로 합칩니다)
+def append_anomaly_event(coin_symbol, detector, epoch, evidence):
+    global global_event_sequence
+    global_event_sequence += 1
+    event = AnomalyEvent(coin_symbol, detector, epoch, evidence, global_event_sequence, snapshot_publisher.next_version)
+    global_anomaly_events.append(event)
+    global_metrics.increment('anomalies_total', detector=detector)
+    print_and_log(event, level="WARNING")
+    return event
+
+
+# 프로그램 시작 시 기존 공유 데이터 로드 (웹 UI 이력/이벤트와 벽 추적 상태를 이어 감)
+# 수집기를 실행할 때만 호출하므로, 다른 모듈(재생 엔진 등)이 이 모듈을 가져와도 공유 데이터 파일을 읽지 않습니다.
+def load_shared_data(file_path):
+    global global_coin_data_history, global_event_sequence, global_current_summary, global_saved_wall_state
+    if not os.path.exists(file_path):
+        return
     try:
-        with open(file_path, 'a', encoding='utf-8') as f:
-            f.write(message + "\n")
-            f.flush() # 즉시 파일에 쓰기 (버퍼링 방지)
-    except IOError as e:
-        print(f"로그 파일 '{file_path}' 쓰기 오류: {e}")
-    
-    # 웹 UI용 로그에 추가 (이상 징후만 추가)
-    if is_anomaly:
-        global global_anomaly_logs
-        # 로그에 타임스탬프 추가
-        global_anomaly_logs.append(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} - {message}")
-        # 로그가 너무 많아지지 않도록 일정 길이 유지
-        if len(global_anomaly_logs) > 100: # 최대 100개 로그 유지
-            global_anomaly_logs = global_anomaly_logs[-100:]
-
-# CSV 파일 헤더 작성 함수
-def write_csv_header_if_not_exists(file_path, coins):
-    header_parts = ["Timestamp (KST)"]
-    for coin in coins:
-        header_parts.append(f"{coin}_closing_price")
-        header_parts.append(f"{coin}_fluctate_rate_24H")
-        header_parts.append(f"{coin}_units_traded_24H")
-
-    if not os.path.exists(file_path) or os.stat(file_path).st_size == 0:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            loaded_data = json.load(f)
+            if isinstance(loaded_data.get('history'), dict):
+                global_coin_data_history = loaded_data['history']
+            if isinstance(loaded_data.get('anomaly_events'), list):
+                for event_data in loaded_data['anomaly_events']:
+                    try:
+                        global_anomaly_events.append(AnomalyEvent.from_dict(event_data))
+                    except (KeyError, TypeError, ValueError):
+                        continue
+                global_event_sequence = max((event.seq for event in global_anomaly_events), default=0)
+            if isinstance(loaded_data.get('current_summary'), dict):
+                global_current_summary = loaded_data['current_summary']
+            # 이전 스푸핑 관련 데이터도 로드 시도 (예전 파일의 'last_detected_large_walls'도 같은 형식으로 읽음)
+            saved_walls = loaded_data.get('wall_trackers', loaded_data.get('last_detected_large_walls'))
+            if isinstance(saved_walls, dict):
+                global_saved_wall_state = saved_walls
+            print(f"기존 공유 데이터 '{file_path}' 로드 완료.")
+    except Exception as e:
+        print(f"공유 데이터 '{file_path}' 로드 실패: {e}. 새 데이터로 시작합니다.")
+
+# 시세 이력 저장소 열기
+# 저장소가 비어 있고 예전 CSV 파일이 있으면 한 번만 저장소로 옮깁니다. (CSV 파일은 그대로 남겨 둠)
+def open_history_store(store_dir, legacy_csv_path):
+    store = HistoryStore(store_dir)
+    if not store.partitions() and os.path.exists(legacy_csv_path) and os.stat(legacy_csv_path).st_size > 0:
         try:
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(",".join(header_parts) + "\n")
-            print_and_log(f"새로운 CSV 파일 '{file_path}'이 생성되고 헤더가 작성되었습니다.")
-        except IOError as e:
-            print_and_log(f"CSV 파일 헤더 작성 중 오류 발생: {e}")
-    else:
-        print_and_log(f"기존 CSV 파일 '{file_path}'에 데이터를 추가합니다.")
+            imported_rows = store.import_csv(legacy_csv_path)
+            print_and_log(f"기존 CSV 파일 '{legacy_csv_path}'의 {imported_rows}개 행을 이력 저장소 '{store_dir}'로 옮겼습니다.")
+        except (IOError, UnicodeDecodeError) as e:
+            print_and_log(f"  [오류] CSV 이력 변환 중 오류 발생: {e}", level="ERROR")
+    return store
+
+# 이력 저장소의 최근 max_ticks개 시각만 읽어 코인별 링 버퍼를 채우는 함수 (프로그램 시작 시 1회)
+# 최신 날짜 파티션부터 필요한 만큼만 읽으므로 저장된 이력이 아무리 길어도 읽는 양은 일정합니다.
+# 어떤 시각에 값이 없는 코인은 'N/A'(NaN)로 채워 코인 간 시각 배치를 맞춥니다.
+def load_recent_history(store, coin_states, max_ticks):
+    try:
+        records = store.read_tail(max_ticks, symbols=list(coin_states))
+    except (IOError, ValueError) as e:
+        print_and_log(f"  [오류] 이력 저장소 로드 중 오류 발생: {e}", level="ERROR")
+        return 0
+    if len(records) == 0:
+        return 0
+
+    tick_times, tick_index = np.unique(records['timestamp'], return_inverse=True)
+    symbol_names = store.symbol_names(records)
+    for coin, state in coin_states.items():
+        mask = symbol_names == coin
+        columns = []
+        for field in ('closing_price', 'fluctate_rate_24H', 'units_traded_24H'):
+            column = np.full(len(tick_times), np.nan)
+            column[tick_index[mask]] = records[field][mask]
+            columns.append(column)
+        for timestamp, closing_price, fluctate_rate_24H, units_traded_24H in zip(tick_times, *columns):
+            state.append_ticker(float(timestamp), closing_price, fluctate_rate_24H, units_traded_24H)
+    return len(tick_times)
 
 # 이상 징후 분석 및 알림 함수 (24시간 변동률, 추세 분석)
-def analyze_and_notify_anomaly(df, fluctuation_threshold, deviation_threshold, target_coins, current_timestamp, ma_window):
+# coin_states의 링 버퍼와 이동 통계(RollingStats)를 직접 읽으므로 코인당 O(1)이며 pandas가 필요 없습니다.
+# 이동 통계의 창 크기는 CoinState 생성 시 정해지며 ma_window와 같아야 합니다.
+def analyze_and_notify_anomaly(coin_states, fluctuation_threshold, deviation_threshold, target_coins, current_timestamp, ma_window):
     anomalies_detected_this_cycle = False
     print_and_log(f"\n--- [{current_timestamp}] 현재가/추세 분석 결과 ---")
 
-    if len(df) < ma_window + 1: 
-        print_and_log(f"  데이터 부족: 이동 평균 계산을 위해 최소 {ma_window + 1}개의 데이터가 필요합니다. 현재 {len(df)}개.")
+    history_length = min((len(coin_states[coin].buffer) for coin in target_coins), default=0)
+
+    if history_length < ma_window + 1: 
+        print_and_log(f"  데이터 부족: 이동 평균 계산을 위해 최소 {ma_window + 1}개의 데이터가 필요합니다. 현재 {history_length}개.")
         print_and_log("  추세 분석을 건너뛰고 24시간 변동률만 확인합니다.")
         
         for coin in target_coins:
-            fluctuation_col_name = f"{coin}_fluctate_rate_24H"
-            fluctuate_rate_str = df.iloc[-1].get(fluctuation_col_name)
-
-            processed_fluctuate_str = str(fluctuate_rate_str).strip().upper()
+            fluctuate_rate = coin_states[coin].buffer.latest('fluctate_rate_24H')
 
-            if pd.isna(fluctuate_rate_str) or processed_fluctuate_str == 'N/A' or processed_fluctuate_str == '':
+            if np.isnan(fluctuate_rate):
                 print_and_log(f"  {coin}: 변동률 데이터 없음 (N/A 또는 비어있음)")
                 continue
             
-            try:
-                fluctuate_rate = float(fluctuate_rate_str)
-                if abs(fluctuate_rate) >= fluctuation_threshold:
-                    print_and_log(f"  [!!! 24H 변동률 이상 감지 !!!] {coin}: 24시간 변동률 = {fluctuate_rate:.2f}% (임계치 {fluctuation_threshold}%)", is_anomaly=True)
-                    anomalies_detected_this_cycle = True
-            except ValueError:
-                print_and_log(f"  {coin}: 변동률 데이터 '{fluctuate_rate_str}'를 숫자로 변환할 수 없습니다. (데이터 형식 오류)")
+            if abs(fluctuate_rate) >= fluctuation_threshold:
+                record_anomaly(coin, DETECTOR_FLUCTUATION, current_timestamp, fluctuate_rate=fluctuate_rate, threshold=fluctuation_threshold)
+                anomalies_detected_this_cycle = True
         
         if not anomalies_detected_this_cycle:
             print_and_log("  => 현재 시점에서 특별한 이상 징후는 감지되지 않았습니다.")
         print_and_log("------------------------------------")
         return
 
-    latest_data = df.iloc[-1]
-
     for coin in target_coins:
-        closing_price_col = f"{coin}_closing_price"
-        fluctuation_col_name = f"{coin}_fluctate_rate_24H"
-        
-        current_closing_price = latest_data.get(closing_price_col)
+        buffer = coin_states[coin].buffer
+        price_stats = coin_states[coin].price_stats
+        current_closing_price_float = buffer.latest('closing_price')
         
-        if pd.isna(current_closing_price) or current_closing_price == 'N/A' or str(current_closing_price).strip() == '':
+        if np.isnan(current_closing_price_float):
             print_and_log(f"  {coin}: 현재가 데이터 없음 (N/A 또는 비어있음). 추세 및 변동률 분석 건너뜀.")
             continue
 
-        try:
-            current_closing_price_float = float(current_closing_price)
-            
-            fluctuate_rate_str = latest_data.get(fluctuation_col_name) 
-            processed_fluctuate_str = str(fluctuate_rate_str).strip().upper()
+        fluctuate_rate = buffer.latest('fluctate_rate_24H')
 
-            if not (pd.isna(fluctuate_rate_str) or processed_fluctuate_str == 'N/A' or processed_fluctuate_str == ''):
-                fluctuate_rate = float(fluctuate_rate_str)
-                if abs(fluctuate_rate) >= fluctuation_threshold:
-                    print_and_log(f"  [!!! 24H 변동률 이상 감지 !!!] {coin}: 24시간 변동률 = {fluctuate_rate:.2f}% (임계치 {fluctuation_threshold}%)", is_anomaly=True)
-                    anomalies_detected_this_cycle = True
-            else:
-                print_and_log(f"  {coin}: 24시간 변동률 데이터 없음.")
+        if not np.isnan(fluctuate_rate):
+            if abs(fluctuate_rate) >= fluctuation_threshold:
+                record_anomaly(coin, DETECTOR_FLUCTUATION, current_timestamp, fluctuate_rate=fluctuate_rate, threshold=fluctuation_threshold)
+                anomalies_detected_this_cycle = True
+        else:
+            print_and_log(f"  {coin}: 24시간 변동률 데이터 없음.")
 
-            recent_prices = df[closing_price_col].tail(ma_window)
-            recent_prices_numeric = pd.to_numeric(recent_prices, errors='coerce').dropna()
+        if price_stats.count > 0:
+            moving_average = price_stats.mean
             
-            if len(recent_prices_numeric) > 0:
-                moving_average = recent_prices_numeric.mean()
-                
-                if moving_average != 0:
-                    deviation_from_ma = ((current_closing_price_float - moving_average) / moving_average) * 100
-
-                    if abs(deviation_from_ma) >= deviation_threshold:
-                        print_and_log(f"  🚨🚨🚨 [추세 이탈 이상 감지!] 🚨🚨🚨")
-                        print_and_log(f"  코인: {coin}")
-                        print_and_log(f"  현재가: {current_closing_price_float:.2f} KRW")
-                        print_and_log(f"  이동 평균({ma_window}개): {moving_average:.2f} KRW")
-                        print_and_log(f"  추세 이탈률: {deviation_from_ma:.2f}% (임계치 ±{deviation_threshold}%)")
-                        print_and_log(f"  경고: {coin}의 현재가가 이동 평균선에서 크게 벗어났습니다!", is_anomaly=True)
-                        print_and_log(f"  🚨🚨🚨🚨🚨🚨🚨🚨🚨🚨🚨🚨🚨🚨")
-                        anomalies_detected_this_cycle = True
-                else:
-                    print_and_log(f"  {coin}: 이동 평균 계산을 위한 데이터의 평균이 0입니다. (이상)")
+            if moving_average != 0:
+                deviation_from_ma = price_stats.deviation_percent(current_closing_price_float)
+
+                if abs(deviation_from_ma) >= deviation_threshold:
+                    print_and_log(f"  🚨🚨🚨 [추세 이탈 이상 감지!] 🚨🚨🚨")
+                    print_and_log(f"  코인: {coin}")
+                    print_and_log(f"  현재가: {current_closing_price_float:.2f} KRW")
+                    print_and_log(f"  이동 평균({ma_window}개): {moving_average:.2f} KRW")
+                    print_and_log(f"  추세 이탈률: {deviation_from_ma:.2f}% (임계치 ±{deviation_threshold}%)")
+                    record_anomaly(coin, DETECTOR_TREND, current_timestamp, closing_price=current_closing_price_float, moving_average=moving_average, deviation_percent=deviation_from_ma, threshold=deviation_threshold)
+                    print_and_log(f"  🚨🚨🚨🚨🚨🚨🚨🚨🚨🚨🚨🚨🚨🚨")
+                    anomalies_detected_this_cycle = True
             else:
-                print_and_log(f"  {coin}: 이동 평균 계산을 위한 유효한 최근 가격 데이터가 충분하지 않습니다.")
-
-        except ValueError:
-            print_and_log(f"  {coin}: 가격 데이터 '{current_closing_price}'를 숫자로 변환할 수 없습니다. (데이터 형식 오류)")
+                print_and_log(f"  {coin}: 이동 평균 계산을 위한 데이터의 평균이 0입니다. (이상)")
+        else:
+            print_and_log(f"  {coin}: 이동 평균 계산을 위한 유효한 최근 가격 데이터가 충분하지 않습니다.")
             
     if not anomalies_detected_this_cycle:
         print_and_log("\n  => 현재 시점에서 특별한 이상 징후는 감지되지 않았습니다.")
     
     print_and_log("------------------------------------")
 
+# 코인 상태 반환 (대상 코인이 아니면 처음 승격될 때 생성하고, 스캐너에 쌓인 이력으로 링 버퍼/이동 통계를 채움)
+def get_coin_state(coin_symbol):
+    state = global_coin_states.get(coin_symbol)
+    if state is None:
+        state = CoinState(coin_symbol, IN_MEMORY_HISTORY_LENGTH, MOVING_AVERAGE_WINDOW, TRADE_TAPE_CAPACITY)
+        for timestamp, closing_price, fluctate_rate_24H, units_traded_24H in zip(*global_market_scanner.history(coin_symbol)):
+            state.append_ticker(timestamp, closing_price, fluctate_rate_24H, units_traded_24H)
+        global_coin_states[coin_symbol] = state
+    return state
+
+# 전체 시장 스캔: 티커 응답의 모든 심볼에 24H 변동률/추세 이탈 검사를 행렬 연산으로 한 번에 적용
+# 대상 코인(TARGET_COINS)은 analyze_and_notify_anomaly가 따로 분석하므로 제외하고,
+# 나머지 중 점수가 높은 상위 top_k개를 이상 징후로 기록한 뒤 정밀 탐지 대상으로 반환합니다.
+# 스캔 결과(ScanResult)도 함께 반환하며, 대상 코인의 정밀 탐지 주기를 정하는 데 쓰입니다.
+def scan_market(scanner, ticker_data, current_epoch, fluctuation_threshold, deviation_threshold, target_coins, top_k, current_timestamp):
+    scanner.update(ticker_data, current_epoch)
+    result = scanner.scan(fluctuation_threshold, deviation_threshold)
+    promoted = scanner.top_flagged(result, top_k, exclude=target_coins)
+
+    print_and_log(f"\n--- [{current_timestamp}] 전체 시장 스캔 결과 ---")
+    print_and_log(f"  스캔 심볼 수: {len(result.symbols)}, 이상 징후 심볼 수: {int(result.flagged.sum())}, 정밀 탐지 승격: {len(promoted)}개")
+    for i in promoted:
+        coin = result.symbols[i]
+        fluctuate_rate = float(result.fluctuate_rate[i])
+        deviation_percent = float(result.deviation_percent[i])
+        print_and_log(f"  {coin}: 점수 {result.score[i]:.2f}, 24H 변동률 {fluctuate_rate:.2f}%, 추세 이탈률 {deviation_percent:.2f}%")
+        if abs(fluctuate_rate) >= fluctuation_threshold:
+            record_anomaly(coin, DETECTOR_FLUCTUATION, current_timestamp, fluctuate_rate=fluctuate_rate, threshold=fluctuation_threshold, source='scan')
+        if abs(deviation_percent) >= deviation_threshold:
+            record_anomaly(coin, DETECTOR_TREND, current_timestamp, closing_price=float(result.closing_price[i]),
+                           moving_average=float(result.moving_average[i]), deviation_percent=deviation_percent,
+                           threshold=deviation_threshold, source='scan')
+    print_and_log("------------------------------------")
+    return [result.symbols[i] for i in promoted], result
+
+# 체결 내역 응답을 받아 한 번만 파싱하는 함수 (주기마다 코인당 1회)
+# 반환된 TradeSnapshot은 코인별 체결 테이프(TradeTape)에 새 체결만 추가하는 데 쓰입니다. 요청/응답에 문제가 있으면 None.
+def load_trade_snapshot(coin_symbol, trade_history_future):
+    try:
+        trade_response = trade_history_future.result()
+
+        if trade_response.status_code != 200:
+            print_and_log(f"  {coin_symbol}: 체결 내역 API 요청 실패. 상태 코드: {trade_response.status_code}")
+            print_and_log(f"  에러 메시지: {trade_response.text}")
+            return None
+
+        trade_data = trade_response.json()
+        if not ('data' in trade_data and isinstance(trade_data['data'], list)):
+            print_and_log(f"  {coin_symbol}: 체결 내역 데이터가 없거나 리스트 형태가 아닙니다.")
+            return None
+
+        trade_snapshot, parse_errors = TradeSnapshot.from_api(trade_data['data'])
+        for trade, e in parse_errors:
+            print_and_log(f"  {coin_symbol} 체결 내역 데이터 파싱 오류: {e} (데이터: {trade})")
+        return trade_snapshot
+
+    except requests.exceptions.RequestException as e:
+        print_and_log(f"  [오류] {coin_symbol} 체결 내역 API 요청 중 네트워크 예외 발생: {e}", level="ERROR")
+    except Exception as e:
+        print_and_log(f"  [오류] {coin_symbol} 체결 내역 처리 중 예상치 못한 오류: {e}", level="ERROR")
+        print_and_log(f"  상세: {traceback.format_exc()}", level="ERROR")
+    return None
+
 # 자전거래 탐지 함수 (Public API 기반)
-def detect_wash_trading(coin_symbol, time_window_seconds, price_tolerance_percent, quantity_tolerance_percent, lookback_count, current_timestamp):
+# trade_tape: 이번 주기의 새 체결까지 반영된 코인별 체결 테이프 (이번 주기 체결 내역을 못 받았으면 None)
+# 새로 들어온 체결과 그 앞의 시간 창(time_window_seconds) 이내 체결만 검사하고,
+# 새 체결이 포함된 쌍만 보고하므로 이전 주기에 알린 쌍을 다시 알리지 않습니다.
+def detect_wash_trading(coin_symbol, trade_tape, time_window_seconds, price_tolerance_percent, quantity_tolerance_percent, current_timestamp):
     wash_trade_detected = False
     
-    TRADE_HISTORY_ENDPOINT = f"/transaction_history/{coin_symbol}_KRW"
-    TRADE_HISTORY_URL = BASE_URL + TRADE_HISTORY_ENDPOINT
-    
     print_and_log(f"\n--- [{current_timestamp}] {coin_symbol} 자전거래 탐지 시도 ---")
 
-    try:
-        trade_response = requests.get(TRADE_HISTORY_URL, params={'count': lookback_count}, headers={})
-        
-        if trade_response.status_code == 200:
-            trade_data = trade_response.json()
-            
-            if 'data' in trade_data and isinstance(trade_data['data'], list):
-                trades_processed = []
-                for trade in trade_data['data']:
-                    try:
-                        # 1. transaction_date 파싱 시도 (밀리초 포함, 없으면 밀리초 없이 재시도)
-                        try:
-                            trade_datetime = datetime.strptime(trade['transaction_date'], '%Y-%m-%d %H:%M:%S.%f')
-                        except ValueError:
-                            trade_datetime = datetime.strptime(trade['transaction_date'], '%Y-%m-%d %H:%M:%S')
-
-                        units_traded_float = float(trade['units_traded'])
-                        price_float = float(trade['price'])
-                        
-                        trades_processed.append({
-                            'datetime_obj': trade_datetime,
-                            'type': trade['type'],
-                            'units_traded_float': units_traded_float,
-                            'price_float': price_float,
-                            'transaction_date': trade['transaction_date']
-                        })
-                    except (ValueError, KeyError) as e:
-                        print_and_log(f"  {coin_symbol} 체결 내역 데이터 파싱 오류 (자전거래): {e} (데이터: {trade})")
-                        continue
-                
-                trades_processed.sort(key=lambda x: x['datetime_obj'])
-
-                for i in range(len(trades_processed)):
-                    trade1 = trades_processed[i]
-                    for j in range(i + 1, len(trades_processed)):
-                        trade2 = trades_processed[j]
-
-                        time_diff = (trade2['datetime_obj'] - trade1['datetime_obj']).total_seconds()
-                        if time_diff > time_window_seconds:
-                            break 
-                        
-                        if (trade1['type'] == 'bid' and trade2['type'] == 'ask') or \
-                           (trade1['type'] == 'ask' and trade2['type'] == 'bid'):
-                            
-                            if trade1['price_float'] == 0: continue 
-                            price_diff_percent = abs((trade1['price_float'] - trade2['price_float']) / trade1['price_float']) * 100
-                            
-                            if price_diff_percent <= price_tolerance_percent:
-                                if trade1['units_traded_float'] == 0: continue
-                                quantity_diff_percent = abs((trade1['units_traded_float'] - trade2['units_traded_float']) / trade1['units_traded_float']) * 100
-                                if quantity_diff_percent <= quantity_tolerance_percent:
-                                    
-                                    print_and_log(f"  ⚡⚡⚡ [자전거래 의심 감지!] ⚡⚡⚡")
-                                    print_and_log(f"  코인: {coin_symbol}")
-                                    print_and_log(f"  거래 1 ({trade1['type']}): 시각={trade1['transaction_date']}, 가격={trade1['price_float']:.4f}, 수량={trade1['units_traded_float']:.4f}")
-                                    print_and_log(f"  거래 2 ({trade2['type']}): 시각={trade2['transaction_date']}, 가격={trade2['price_float']:.4f}, 수량={trade2['units_traded_float']:.4f}")
-                                    print_and_log(f"  시간 차이: {time_diff:.2f}초 (임계치 {time_window_seconds}초)")
-                                    print_and_log(f"  가격 차이: {price_diff_percent:.2f}% (임계치 {price_tolerance_percent}%)")
-                                    print_and_log(f"  수량 차이: {quantity_diff_percent:.2f}% (임계치 {quantity_tolerance_percent}%)")
-                                    print_and_log(f"  경고: {coin_symbol} 마켓에서 짧은 시간 내 유사 가격/수량의 매수/매도 패턴이 감지되었습니다!", is_anomaly=True)
-                                    print_and_log(f"  ⚡⚡⚡⚡⚡⚡⚡⚡⚡⚡⚡⚡⚡⚡⚡⚡⚡⚡⚡⚡⚡")
-                                    wash_trade_detected = True
+    if trade_tape is None:
+        print_and_log(f"  {coin_symbol}: 체결 내역 데이터가 없어 자전거래 탐지를 건너뜁니다.")
+        print_and_log("------------------------------------")
+        return False
 
-            else:
-                print_and_log(f"  {coin_symbol}: 체결 내역 데이터가 없거나 리스트 형태가 아닙니다.")
+    if trade_tape.new_trade_count == 0:
+        print_and_log(f"  {coin_symbol}: 지난 주기 이후 새 체결이 없어 자전거래 탐지를 건너뜁니다.")
+        print_and_log("------------------------------------")
+        return False
 
-        else:
-            print_and_log(f"  {coin_symbol}: 체결 내역 API 요청 실패. 상태 코드: {trade_response.status_code}")
-            print_and_log(f"  에러 메시지: {trade_response.text}")
+    try:
+        trade_snapshot, new_start = trade_tape.recent_with_margin(time_window_seconds * 1000)
+        wash_pairs = find_wash_trade_pairs(trade_snapshot, time_window_seconds, price_tolerance_percent, quantity_tolerance_percent)
+
+        for k in range(len(wash_pairs.first)):
+            if wash_pairs.second[k] < new_start:
+                continue # 이전 주기 체결끼리의 쌍은 이미 보고됨
+            i = int(wash_pairs.first[k])
+            j = int(wash_pairs.second[k])
+            side_i = 'bid' if trade_snapshot.sides[i] == SIDE_BID else 'ask'
+            side_j = 'bid' if trade_snapshot.sides[j] == SIDE_BID else 'ask'
+            
+            print_and_log(f"  ⚡⚡⚡ [자전거래 의심 감지!] ⚡⚡⚡")
+            print_and_log(f"  코인: {coin_symbol}")
+            print_and_log(f"  거래 1 ({side_i}): 시각={format_epoch_ms(int(trade_snapshot.epoch_ms[i]))}, 가격={trade_snapshot.prices[i]:.4f}, 수량={trade_snapshot.quantities[i]:.4f}")
+            print_and_log(f"  거래 2 ({side_j}): 시각={format_epoch_ms(int(trade_snapshot.epoch_ms[j]))}, 가격={trade_snapshot.prices[j]:.4f}, 수량={trade_snapshot.quantities[j]:.4f}")
+            print_and_log(f"  시간 차이: {wash_pairs.time_diff_seconds[k]:.2f}초 (임계치 {time_window_seconds}초)")
+            print_and_log(f"  가격 차이: {wash_pairs.price_diff_percent[k]:.2f}% (임계치 {price_tolerance_percent}%)")
+            print_and_log(f"  수량 차이: {wash_pairs.quantity_diff_percent[k]:.2f}% (임계치 {quantity_tolerance_percent}%)")
+            record_anomaly(
+                coin_symbol, DETECTOR_WASH_TRADE, current_timestamp,
+                first_trade_ms=int(trade_snapshot.epoch_ms[i]), second_trade_ms=int(trade_snapshot.epoch_ms[j]),
+                first_price=float(trade_snapshot.prices[i]), second_price=float(trade_snapshot.prices[j]),
+                first_quantity=float(trade_snapshot.quantities[i]), second_quantity=float(trade_snapshot.quantities[j]),
+                time_diff_seconds=float(wash_pairs.time_diff_seconds[k]),
+                price_diff_percent=float(wash_pairs.price_diff_percent[k]),
+                quantity_diff_percent=float(wash_pairs.quantity_diff_percent[k])
+            )
+            print_and_log(f"  ⚡⚡⚡⚡⚡⚡⚡⚡⚡⚡⚡⚡⚡⚡⚡⚡⚡⚡⚡⚡⚡")
+            wash_trade_detected = True
 
-    except requests.exceptions.RequestException as e:
-        print_and_log(f"  [오류] {coin_symbol} 체결 내역 API 요청 중 네트워크 예외 발생: {e}")
     except Exception as e:
-        print_and_log(f"  [오류] {coin_symbol} 자전거래 탐지 중 예상치 못한 오류: {e}")
-        print_and_log(f"  상세: {traceback.format_exc()}")
+        print_and_log(f"  [오류] {coin_symbol} 자전거래 탐지 중 예상치 못한 오류: {e}", level="ERROR")
+        print_and_log(f"  상세: {traceback.format_exc()}", level="ERROR")
         
     if not wash_trade_detected:
         print_and_log(f"  {coin_symbol}: 자전거래 의심 패턴 감지되지 않음.")
     print_and_log("------------------------------------")
     return wash_trade_detected
 
+# 호가창 응답을 받아 한 번만 파싱하는 함수 (호가창 작업마다 코인당 1회)
+# 반환된 OrderBookSnapshot은 매물벽 탐지와 깊이 지표 계산에 함께 쓰입니다. 요청/응답에 문제가 있으면 None.
+def load_order_book_snapshot(coin_symbol, order_book_future):
+    try:
+        order_book_response = order_book_future.result()
+
+        if order_book_response.status_code != 200:
+            print_and_log(f"  {coin_symbol}: 호가창 API 요청 실패. 상태 코드: {order_book_response.status_code}")
+            print_and_log(f"  에러 메시지: {order_book_response.text}")
+            return None
+
+        order_book_data = order_book_response.json()
+        if not ('data' in order_book_data and isinstance(order_book_data['data'], dict)):
+            print_and_log(f"  {coin_symbol}: 호가창 데이터가 없거나 예상과 다릅니다.")
+            return None
+
+        order_book, parse_errors = OrderBookSnapshot.from_api(order_book_data['data'])
+        for side, level, e in parse_errors:
+            print_and_log(f"  {coin_symbol} {'매도' if side == 'ask' else '매수'} 호가 데이터 파싱 오류: {e} (데이터: {level})")
+        return order_book
+
+    except requests.exceptions.RequestException as e:
+        print_and_log(f"  [오류] {coin_symbol} 호가창 API 요청 중 네트워크 예외 발생: {e}", level="ERROR")
+    except Exception as e:
+        print_and_log(f"  [오류] {coin_symbol} 호가창 처리 중 예상치 못한 오류: {e}", level="ERROR")
+        print_and_log(f"  상세: {traceback.format_exc()}", level="ERROR")
+    return None
+
 # 호가창 매물벽 탐지 함수 (스푸핑 탐지를 위해 감지된 벽 리스트도 반환)
-def detect_order_book_wall_anomaly(coin_symbol, current_closing_price, current_units_traded_24H, price_distance_percent, volume_multiplier, lookback_count, current_timestamp):
+# order_book: 파싱된 호가창 스냅샷 (order_book.OrderBookSnapshot, 받지 못했으면 None)
+# 매물벽 조건은 OrderBookSnapshot.find_walls가 쪽별로 적용합니다 (파싱은 스냅샷을 만들 때 한 번만).
+def detect_order_book_wall_anomaly(coin_symbol, order_book, current_closing_price, current_units_traded_24H, price_distance_percent, volume_multiplier, current_timestamp):
     order_book_anomaly_detected = False
-    detected_walls_this_cycle = [] # 현재 주기에서 감지된 대규모 벽 목록
-    
-    ORDER_BOOK_ENDPOINT = f"/orderbook/{coin_symbol}_KRW"
-    ORDER_BOOK_URL = BASE_URL + ORDER_BOOK_ENDPOINT
+    detected_walls_this_cycle = [] # 현재 호가창에서 감지된 대규모 벽 목록
     
     print_and_log(f"\n--- [{current_timestamp}] {coin_symbol} 호가창 매물벽 탐지 시도 ---")
 
-    if current_closing_price == 'N/A' or current_units_traded_24H == 'N/A':
-        print_and_log(f"  {coin_symbol}: 현재가 또는 24시간 거래량 데이터 부족. 매물벽 탐지 건너뜀.")
+    if current_closing_price == 'N/A' or current_units_traded_24H == 'N/A' or order_book is None:
+        print_and_log(f"  {coin_symbol}: 현재가, 24시간 거래량 또는 호가창 데이터 부족. 매물벽 탐지 건너뜀.")
         print_and_log("------------------------------------")
         return False, [] # 빈 리스트 반환
 
@@ -315,81 +546,27 @@ def detect_order_book_wall_anomaly(coin_symbol, current_closing_price, current_u
         min_base_volume_for_wall = 100 
         threshold_volume_for_wall = max(min_base_volume_for_wall, current_units_traded_24H_float * 0.001) * volume_multiplier
 
-        order_book_response = requests.get(ORDER_BOOK_URL, params={'count': lookback_count}, headers={})
-        
-        if order_book_response.status_code == 200:
-            order_book_data = order_book_response.json()
-            
-            if 'data' in order_book_data:
-                # 매도 호가 (asks) 분석
-                for ask in order_book_data['data']['asks']:
-                    try:
-                        ask_price = float(ask['price'])
-                        ask_qty = float(ask['quantity'])
-                        
-                        if current_closing_price_float == 0: continue 
-                        price_deviation = abs((ask_price - current_closing_price_float) / current_closing_price_float) * 100
-                        
-                        if price_deviation >= price_distance_percent and ask_qty >= threshold_volume_for_wall:
-                            print_and_log(f"  🧱⬆️ [호가창 매물벽 감지 - 매도벽!] 🧱⬆️")
-                            print_and_log(f"  코인: {coin_symbol}")
-                            print_and_log(f"  종류: 매도 (Ask)")
-                            print_and_log(f"  호가: {ask_price:.2f} KRW")
-                            print_and_log(f"  수량: {ask_qty:.4f} {coin_symbol} (임계치 {threshold_volume_for_wall:.4f} {coin_symbol})")
-                            print_and_log(f"  현재가 대비 이탈률: {price_deviation:.2f}% (임계치 {price_distance_percent}%)")
-                            print_and_log(f"  경고: {coin_symbol} 매도 호가창에 비정상적인 대규모 매물벽이 감지되었습니다!", is_anomaly=True)
-                            print_and_log(f"  🧱🧱🧱🧱🧱🧱🧱🧱🧱🧱🧱🧱🧱🧱🧱🧱🧱")
-                            order_book_anomaly_detected = True
-                            detected_walls_this_cycle.append({
-                                'price': ask_price,
-                                'quantity': ask_qty,
-                                'type': 'ask',
-                                'timestamp': current_timestamp # 벽이 감지된 시간
-                            })
-                    except (ValueError, KeyError) as e:
-                        print_and_log(f"  {coin_symbol} 매도 호가 데이터 파싱 오류: {e} (데이터: {ask})")
-                        continue
-
-                # 매수 호가 (bids) 분석
-                for bid in order_book_data['data']['bids']:
-                    try:
-                        bid_price = float(bid['price'])
-                        bid_qty = float(bid['quantity'])
-                        
-                        if current_closing_price_float == 0: continue
-                        price_deviation = abs((bid_price - current_closing_price_float) / current_closing_price_float) * 100
-                        
-                        if price_deviation >= price_distance_percent and bid_qty >= threshold_volume_for_wall:
-                            print_and_log(f"  🧱⬇️ [호가창 매물벽 감지 - 매수벽!] 🧱⬇️")
-                            print_and_log(f"  코인: {coin_symbol}")
-                            print_and_log(f"  종류: 매수 (Bid)")
-                            print_and_log(f"  호가: {bid_price:.2f} KRW")
-                            print_and_log(f"  수량: {bid_qty:.4f} {coin_symbol} (임계치 {threshold_volume_for_wall:.4f} {coin_symbol})")
-                            print_and_log(f"  현재가 대비 이탈률: {price_deviation:.2f}% (임계치 {price_distance_percent}%)")
-                            print_and_log(f"  경고: {coin_symbol} 매수 호가창에 비정상적인 대규모 매물벽이 감지되었습니다!", is_anomaly=True)
-                            print_and_log(f"  🧱🧱🧱🧱🧱🧱🧱🧱🧱🧱🧱🧱🧱🧱🧱🧱🧱")
-                            order_book_anomaly_detected = True
-                            detected_walls_this_cycle.append({
-                                'price': bid_price,
-                                'quantity': bid_qty,
-                                'type': 'bid',
-                                'timestamp': current_timestamp # 벽이 감지된 시간
-                            })
-                    except (ValueError, KeyError) as e:
-                        print_and_log(f"  {coin_symbol} 매수 호가 데이터 파싱 오류: {e} (데이터: {bid})")
-                        continue
-
-            else: # <--- 이 부분이 예전 코드에서 723번 줄 근처에 해당할 수 있는 else 입니다.
-                print_and_log(f"  {coin_symbol}: 호가창 데이터가 없거나 예상과 다릅니다.")
-
-        else:
-            print_and_log(f"  {coin_symbol}: 호가창 API 요청 실패. 상태 코드: {order_book_response.status_code}")
-            print_and_log(f"  에러 메시지: {order_book_response.text}")
+        for side, side_icon, side_label in (('ask', '⬆️', '매도벽'), ('bid', '⬇️', '매수벽')):
+            wall_indices = order_book.find_walls(side, current_closing_price_float, price_distance_percent, threshold_volume_for_wall)
+            if len(wall_indices) == 0:
+                continue
+            prices, quantities = order_book.side(side)
+            deviations = order_book.deviation_percent(side, current_closing_price_float)
+            print_and_log(f"  🧱{side_icon} [호가창 매물벽 감지 - {side_label} {len(wall_indices)}개!] (수량 임계치 {threshold_volume_for_wall:.4f} {coin_symbol}, 이탈률 임계치 {price_distance_percent}%)")
+            for index in wall_indices:
+                wall_price, wall_qty, price_deviation = float(prices[index]), float(quantities[index]), float(deviations[index])
+                print_and_log(f"  {coin_symbol} {side_label}: 호가 {wall_price:.2f} KRW, 수량 {wall_qty:.4f} {coin_symbol}, 현재가 대비 이탈률 {price_deviation:.2f}%")
+                record_anomaly(coin_symbol, DETECTOR_ORDER_WALL, current_timestamp, side=side, price=wall_price, quantity=wall_qty, threshold_quantity=threshold_volume_for_wall, price_deviation_percent=price_deviation)
+                detected_walls_this_cycle.append({
+                    'price': wall_price,
+                    'quantity': wall_qty,
+                    'type': side,
+                    'timestamp': current_timestamp # 벽이 감지된 시간
+                })
+            order_book_anomaly_detected = True
 
-    except requests.exceptions.RequestException as e:
-        print_and_log(f"  [오류] {coin_symbol} 호가창 API 요청 중 네트워크 예외 발생: {e}")
     except Exception as e:
-        print_and_log(f"  [오류] {coin_symbol} 호가창 매물벽 탐지 중 예상치 못한 오류: {e}")
+        print_and_log(f"  [오류] {coin_symbol} 호가창 매물벽 탐지 중 예상치 못한 오류: {e}", level="ERROR")
         
     if not order_book_anomaly_detected:
         print_and_log(f"  {coin_symbol}: 호가창 매물벽 패턴 감지되지 않음.")
@@ -397,119 +574,90 @@ def detect_order_book_wall_anomaly(coin_symbol, current_closing_price, current_u
     return order_book_anomaly_detected, detected_walls_this_cycle # 감지된 벽 리스트 반환
 
 # 펌프 앤 덤프 탐지 함수 (주로 펌프 단계에 집중)
-def detect_pump_and_dump_anomaly(coin_symbol, df_full, pump_price_change_percent, pump_volume_multiplier_from_avg_24H, pump_detection_window_seconds, api_call_interval, current_timestamp):
+# coin_buffer: 해당 코인의 시세 링 버퍼 (market_state.CoinRingBuffer)
+# trade_tape: 코인별 체결 테이프 (자전거래 탐지와 공유, 이번 주기 체결 내역을 못 받았으면 None)
+# pump_windows: (창 길이 초, 가격 상승률 임계치 %) 목록
+# 창마다 '최신 시각 - 창 길이' 시점의 가격을 시각 기준 이진 탐색으로 찾으므로, 주기가 늦거나 빠져도 창 길이가 정확합니다.
+# 모든 창의 시작 가격과 체결량은 한 번의 조회로 함께 계산합니다.
+def detect_pump_and_dump_anomaly(coin_symbol, coin_buffer, trade_tape, pump_windows, pump_volume_multiplier_from_avg_24H, current_timestamp):
     pump_detected = False
     
     print_and_log(f"\n--- [{current_timestamp}] {coin_symbol} 펌프 앤 덤프 탐지 시도 ---")
 
-    num_points_for_pump_window = int(pump_detection_window_seconds / api_call_interval) + 1
-    
-    if len(df_full) < num_points_for_pump_window:
-        print_and_log(f"  데이터 부족: 펌프 탐지를 위해 최소 {num_points_for_pump_window}개의 데이터가 필요합니다. 현재 {len(df_full)}개.")
-        print_and_log("  펌프 앤 덤프 탐지 건너뜀.")
-        print_and_log("------------------------------------")
-        return False
+    window_seconds = np.array([window for window, _ in pump_windows], dtype=np.float64)
+    price_thresholds = np.array([threshold for _, threshold in pump_windows], dtype=np.float64)
+    latest_epoch = coin_buffer.latest('timestamp')
+    last_price = coin_buffer.latest('closing_price')
 
-    recent_prices_df = df_full.tail(num_points_for_pump_window)
-    
-    latest_df_timestamp = recent_prices_df['Timestamp (KST)'].iloc[-1]
-    
-    first_price_str = recent_prices_df[f"{coin_symbol}_closing_price"].iloc[0]
-    last_price_str = recent_prices_df[f"{coin_symbol}_closing_price"].iloc[-1]
-    
-    if first_price_str == 'N/A' or last_price_str == 'N/A' or pd.isna(first_price_str) or pd.isna(last_price_str):
+    if np.isnan(latest_epoch) or np.isnan(last_price):
         print_and_log(f"  {coin_symbol}: 펌프 탐지를 위한 가격 데이터 부족 (N/A).")
         print_and_log("------------------------------------")
         return False
 
-    try:
-        first_price = float(first_price_str)
-        last_price = float(last_price_str)
-        
-        if first_price == 0:
-            print_and_log(f"  {coin_symbol}: 시작 가격이 0입니다. 가격 상승률 계산 불가.")
-            print_and_log("------------------------------------")
-            return False
+    # 각 창 시작 시점의 가격 (그보다 오래된 데이터가 없으면 NaN = 이력 부족)
+    first_prices = coin_buffer.values_at('closing_price', latest_epoch - window_seconds)
+    usable = ~np.isnan(first_prices) & (first_prices != 0)
+    if not usable.any():
+        print_and_log(f"  데이터 부족: 가장 짧은 펌프 탐지 창({int(window_seconds.min())}초)보다 오래된 가격 데이터가 없습니다. 현재 {len(coin_buffer)}개.")
+        print_and_log("  펌프 앤 덤프 탐지 건너뜀.")
+        print_and_log("------------------------------------")
+        return False
 
-        price_increase_percent = ((last_price - first_price) / first_price) * 100
+    price_increase_percent = np.full(len(window_seconds), np.nan)
+    price_increase_percent[usable] = (last_price - first_prices[usable]) / first_prices[usable] * 100
+    price_candidates = usable & (price_increase_percent >= price_thresholds)
 
-        if price_increase_percent < pump_price_change_percent:
-            print_and_log(f"  {coin_symbol}: 가격 상승률 ({price_increase_percent:.2f}%)이 임계치({pump_price_change_percent}%) 미만입니다.")
-            print_and_log("------------------------------------")
-            return False
+    for i in range(len(window_seconds)):
+        if not usable[i]:
+            print_and_log(f"  {coin_symbol} {int(window_seconds[i])}초 창: 이력 부족.")
+        elif not price_candidates[i]:
+            print_and_log(f"  {coin_symbol} {int(window_seconds[i])}초 창: 가격 상승률 ({price_increase_percent[i]:.2f}%)이 임계치({price_thresholds[i]}%) 미만입니다.")
 
-    except ValueError as e:
-        print_and_log(f"  {coin_symbol}: 펌프 탐지 가격 데이터 변환 오류: {e}")
+    if not price_candidates.any():
+        print_and_log(f"  {coin_symbol}: 펌프 앤 덤프 의심 패턴 감지되지 않음.")
         print_and_log("------------------------------------")
         return False
 
-    TRADE_HISTORY_ENDPOINT = f"/transaction_history/{coin_symbol}_KRW"
-    TRADE_HISTORY_URL = BASE_URL + TRADE_HISTORY_ENDPOINT
+    if trade_tape is None:
+        print_and_log(f"  {coin_symbol}: 체결 내역 데이터가 없어 펌프 탐지를 건너뜁니다.")
+        print_and_log("------------------------------------")
+        return False
 
     try:
-        trade_response = requests.get(TRADE_HISTORY_URL, params={'count': RECENT_TRADES_LOOKBACK_COUNT}, headers={})
-        
-        if trade_response.status_code == 200:
-            trade_data = trade_response.json()
-            
-            if 'data' in trade_data and isinstance(trade_data['data'], list):
-                trades_raw = trade_data['data']
-                
-                recent_window_volume = 0.0
-                time_cutoff = datetime.strptime(current_timestamp, '%Y-%m-%d %H:%M:%S') - timedelta(seconds=pump_detection_window_seconds)
-
-                for trade in trades_raw:
-                    try:
-                        # 1. transaction_date 파싱 시도 (밀리초 포함, 없으면 밀리초 없이 재시도)
-                        try:
-                            trade_datetime = datetime.strptime(trade['transaction_date'], '%Y-%m-%d %H:%M:%S.%f')
-                        except ValueError:
-                            trade_datetime = datetime.strptime(trade['transaction_date'], '%Y-%m-%d %H:%M:%S')
-
-                        if trade_datetime >= time_cutoff:
-                            recent_window_volume += float(trade['units_traded'])
-                    except (ValueError, KeyError) as e:
-                        print_and_log(f"  {coin_symbol} 체결 내역 데이터 파싱 오류 (펌프탐지): {e} (데이터: {trade})")
-                        continue
-                
-                current_units_traded_24H = df_full[f"{coin_symbol}_units_traded_24H"].iloc[-1]
-                if current_units_traded_24H == 'N/A' or pd.isna(current_units_traded_24H) or float(current_units_traded_24H) == 0:
-                    print_and_log(f"  {coin_symbol}: 24시간 거래량 데이터 부족 또는 0. 펌프 탐지 불가.")
-                    print_and_log("------------------------------------")
-                    return False
-
-                avg_volume_per_second_24H = float(current_units_traded_24H) / (24 * 3600)
-                expected_volume_in_window = avg_volume_per_second_24H * pump_detection_window_seconds
-                pump_volume_threshold = expected_volume_in_window * pump_volume_multiplier_from_avg_24H
-
-                if recent_window_volume >= pump_volume_threshold:
-                    print_and_log(f"  🚀📉 [펌프 앤 덤프 의심 감지!] 🚀📉")
-                    print_and_log(f"  코인: {coin_symbol}")
-                    print_and_log(f"  기간: 지난 {pump_detection_window_seconds}초")
-                    print_and_log(f"  가격 상승률: {price_increase_percent:.2f}% (임계치 {pump_price_change_percent}%)")
-                    print_and_log(f"  거래량: {recent_window_volume:.4f} {coin_symbol} (임계치 {pump_volume_threshold:.4f} {coin_symbol})")
-                    print_and_log(f"  경고: {coin_symbol}에서 짧은 시간 내 가격 급등 및 비정상적 거래량 폭증 패턴이 감지되었습니다!", is_anomaly=True)
-                    print_and_log(f"  🚀📉🚀📉🚀📉🚀📉🚀📉🚀📉🚀📉🚀📉🚀")
-                    pump_detected = True
-                else:
-                    print_and_log(f"  {coin_symbol}: 거래량({recent_window_volume:.4f})이 펌프 임계치({pump_volume_threshold:.4f}) 미만입니다.")
-                    print_and_log("------------------------------------")
-
-            else:
-                print_and_log(f"  {coin_symbol}: 체결 내역 데이터가 없거나 리스트 형태가 아닙니다. (펌프 탐지)")
-                print_and_log("------------------------------------")
-
-        else:
-            print_and_log(f"  {coin_symbol}: 체결 내역 API 요청 실패. 상태 코드: {trade_response.status_code} (펌프 탐지)")
-            print_and_log(f"  에러 메시지: {trade_response.text}")
+        current_units_traded_24H = coin_buffer.latest('units_traded_24H')
+        if np.isnan(current_units_traded_24H) or current_units_traded_24H == 0:
+            print_and_log(f"  {coin_symbol}: 24시간 거래량 데이터 부족 또는 0. 펌프 탐지 불가.")
             print_and_log("------------------------------------")
+            return False
+
+        # 창별 체결 수량 합계 (테이프는 시간순 정렬되어 있으므로 누적 합 + 이진 탐색으로 모든 창을 한 번에 계산)
+        # 테이프에는 이전 주기 체결도 중복 없이 남아 있어, 한 번의 응답(최근 N개)보다 창 전체를 더 잘 덮습니다.
+        window_volumes = trade_tape.volumes_since(((latest_epoch - window_seconds) * 1000).astype(np.int64))
+
+        avg_volume_per_second_24H = float(current_units_traded_24H) / (24 * 3600)
+        volume_thresholds = avg_volume_per_second_24H * window_seconds * pump_volume_multiplier_from_avg_24H
+        triggered = price_candidates & (window_volumes >= volume_thresholds)
+
+        for i in np.flatnonzero(price_candidates & ~triggered):
+            print_and_log(f"  {coin_symbol} {int(window_seconds[i])}초 창: 거래량({window_volumes[i]:.4f})이 펌프 임계치({volume_thresholds[i]:.4f}) 미만입니다.")
+
+        if triggered.any():
+            # 임계치 대비 상승 폭이 가장 큰 창을 대표로 기록하고, 함께 걸린 창 목록을 근거로 남김
+            triggered_indices = np.flatnonzero(triggered)
+            best = int(triggered_indices[np.argmax(price_increase_percent[triggered_indices] / price_thresholds[triggered_indices])])
+            print_and_log(f"  🚀📉 [펌프 앤 덤프 의심 감지!] 🚀📉")
+            for i in triggered_indices:
+                print_and_log(f"  {coin_symbol} 지난 {int(window_seconds[i])}초: 가격 상승률 {price_increase_percent[i]:.2f}% (임계치 {price_thresholds[i]}%), "
+                              f"거래량 {window_volumes[i]:.4f} {coin_symbol} (임계치 {volume_thresholds[i]:.4f} {coin_symbol})")
+            record_anomaly(coin_symbol, DETECTOR_PUMP_DUMP, current_timestamp, window_seconds=int(window_seconds[best]),
+                           price_increase_percent=float(price_increase_percent[best]), window_volume=float(window_volumes[best]),
+                           volume_threshold=float(volume_thresholds[best]),
+                           triggered_windows=[int(window_seconds[i]) for i in triggered_indices])
+            print_and_log(f"  🚀📉🚀📉🚀📉🚀📉🚀📉🚀📉🚀📉🚀📉🚀")
+            pump_detected = True
 
-    except requests.exceptions.RequestException as e:
-        print_and_log(f"  [오류] {coin_symbol} 체결 내역 API 요청 중 네트워크 예외 발생 (펌프탐지): {e}")
-        print_and_log("------------------------------------")
     except Exception as e:
-        print_and_log(f"  [오류] {coin_symbol} 펌프 앤 덤프 탐지 중 예상치 못한 오류: {e}")
-        print_and_log("------------------------------------")
+        print_and_log(f"  [오류] {coin_symbol} 펌프 앤 덤프 탐지 중 예상치 못한 오류: {e}", level="ERROR")
         
     if not pump_detected:
         print_and_log(f"  {coin_symbol}: 펌프 앤 덤프 의심 패턴 감지되지 않음.")
@@ -517,223 +665,695 @@ def detect_pump_and_dump_anomaly(coin_symbol, df_full, pump_price_change_percent
     return pump_detected
 
 
+# 코인별 호가창 벽 추적기 반환 (처음 필요할 때 생성하고, 공유 데이터 파일에 저장된 상태가 있으면 이어 감)
+def get_wall_tracker(coin_symbol):
+    tracker = global_wall_trackers.get(coin_symbol)
+    if tracker is None:
+        tracker = WallTracker.from_list(global_saved_wall_state.pop(coin_symbol, []), WALL_PRICE_TOLERANCE_PERCENT,
+                                        WALL_TRACKER_RETENTION_SECONDS, now=time.time(),
+                                        quantity_tolerance_percent=WALL_QUANTITY_TOLERANCE_PERCENT)
+        global_wall_trackers[coin_symbol] = tracker
+    return tracker
+
+# 스푸핑 탐지 함수
+# pulled_walls: 벽 추적기가 이번 호가창 조회에서 사라졌다고 판단한 벽들 (wall_tracker.TrackedWall)
+# 사라진 벽 중 가격이 그 벽 쪽으로 움직이지 않았거나, 같은 가격대에서 repeat_pull_count번 이상 세웠다 거둔 벽을 스푸핑으로 의심합니다.
+def detect_spoofing(coin_symbol, pulled_walls, current_closing_price, price_distance_percent, repeat_pull_count, current_timestamp):
+    spoofing_detected = False
+    current_closing_price_float = to_float(current_closing_price)
+    if np.isnan(current_closing_price_float):
+        if pulled_walls:
+            print_and_log(f"  {coin_symbol}: 현재가 데이터가 없어 스푸핑 탐지를 건너뜁니다. (사라진 벽 {len(pulled_walls)}개)")
+        return False
+    for wall in pulled_walls:
+        # 벽이 사라졌고, 가격이 그 벽을 향해 유의미하게 움직이지 않았는지 확인
+        # 즉, 매도벽이 사라졌는데 가격이 올라가지 않았거나, 매수벽이 사라졌는데 가격이 내려가지 않았다면
+        spoofing_condition_met = False
+
+        if wall.side == 'ask': # 매도벽 (위에서 눌러주는 역할)
+            # 매도벽이 사라졌는데 현재가가 그 벽 가격보다 "현저히 아래에" 머물러 있다면 의심
+            # (가격이 그 벽을 뚫지 못하고 벽이 사라진 경우)
+            if current_closing_price_float < wall.price * (1 - price_distance_percent / 100 * 0.2): # 원래 벽 거리의 20% 이상 벗어나지 않았다면
+                spoofing_condition_met = True
+        elif wall.side == 'bid': # 매수벽 (아래에서 받쳐주는 역할)
+            # 매수벽이 사라졌는데 현재가가 그 벽 가격보다 "현저히 위에" 머물러 있다면 의심
+            # (가격이 그 벽 아래로 내려가지 못하고 벽이 사라진 경우)
+            if current_closing_price_float > wall.price * (1 + price_distance_percent / 100 * 0.2): # 원래 벽 거리의 20% 이상 벗어나지 않았다면
+                spoofing_condition_met = True
+        repeated = wall.pulls >= repeat_pull_count # 같은 가격대에서 반복해서 세웠다 거둔 벽
+
+        if spoofing_condition_met or repeated:
+            print_and_log(f"  👻 [스푸핑 의심 감지!{' (반복)' if repeated else ''}] 👻")
+            print_and_log(f"  코인: {coin_symbol}")
+            print_and_log(f"  사라진 {wall.side} 벽: 가격={wall.price:.2f}, 수량={wall.quantity:.4f} (최대 {wall.max_quantity:.4f})")
+            print_and_log(f"  벽 감지 시각: {wall.first_seen_timestamp} (유지 {wall.lifetime_seconds():.0f}초, 철회 {wall.pulls}회 / 설치 {wall.placements}회)")
+            print_and_log(f"  현재가: {current_closing_price_float:.2f} KRW")
+            record_anomaly(coin_symbol, DETECTOR_SPOOFING, current_timestamp, side=wall.side, wall_price=wall.price,
+                           wall_quantity=wall.quantity, closing_price=current_closing_price_float,
+                           max_quantity=wall.max_quantity, lifetime_seconds=wall.lifetime_seconds(),
+                           pull_count=wall.pulls, placement_count=wall.placements, repeated=repeated)
+            print_and_log(f"  👻👻👻👻👻👻👻👻👻👻👻👻👻👻👻👻👻👻👻👻👻")
+            spoofing_detected = True
+    return spoofing_detected
+
+
+# --- 작업 스케줄링 ---
+# 작업 종류 (스케줄러 통계도 이 단위로 집계됩니다)
+JOB_TICKER = "ticker" # 전체 시세 수집 + 24H 변동률/추세 분석 + 전체 시장 스캔 (요청 1회)
+JOB_TRADES = "trades" # 코인별 체결 내역 수집 + 자전거래/펌프 앤 덤프 탐지 (요청 1회)
+JOB_ORDER_BOOK = "orderbook" # 코인별 호가창 수집 + 매물벽/스푸핑 탐지 (요청 1회)
+DETAIL_JOB_KINDS = (JOB_TRADES, JOB_ORDER_BOOK)
+TICKER_JOB_KEY = ("ALL_KRW", JOB_TICKER)
+
+# 스캔 점수(임계치 대비 비율)로 코인별 정밀 탐지 주기를 정하는 함수
+# 점수 0이면 DETAIL_MAX_INTERVAL_SECONDS, 1 이상(이상 징후)이면 DETAIL_MIN_INTERVAL_SECONDS, 그 사이는 선형으로 줄어듭니다.
+def detail_interval_for(score):
+    if score is None or np.isnan(score):
+        return DETAIL_MAX_INTERVAL_SECONDS
+    activity = min(max(float(score), 0.0), 1.0)
+    return DETAIL_MAX_INTERVAL_SECONDS - (DETAIL_MAX_INTERVAL_SECONDS - DETAIL_MIN_INTERVAL_SECONDS) * activity
+
+# 정밀 탐지 대상 코인(detail_coins)의 체결 내역/호가창 작업을 예약하고 주기를 갱신하는 함수
+# 대상에서 빠진 코인(승격이 끝난 코인)의 작업은 제거합니다.
+def sync_detail_jobs(scheduler, detail_coins, scores):
+    for coin_symbol in detail_coins:
+        interval = detail_interval_for(scores.get(coin_symbol))
+        for kind in DETAIL_JOB_KINDS:
+            scheduler.schedule((coin_symbol, kind), kind, interval)
+    active = set(detail_coins)
+    for coin_symbol in list(global_coin_states):
+        if coin_symbol in active:
+            continue
+        for kind in DETAIL_JOB_KINDS:
+            if (coin_symbol, kind) in scheduler:
+                scheduler.remove((coin_symbol, kind))
+                global_wall_trackers.pop(coin_symbol, None) # 다시 승격되면 벽 추적을 새로 시작
+
+# 전체 시세 요청 + 파싱. 응답이 예상과 다르면 None (네트워크 오류는 requests 예외로 전달)
+# 반환값: 티커 응답 JSON 전체 ({'status': ..., 'data': {심볼: {...}, 'date': ...}})
+def fetch_ticker_data():
+    with stage_timer('ticker_fetch'):
+        ticker_response = http_client.get(TICKER_ENDPOINT, reserved=True) # 토큰은 티커 작업을 허용할 때(admit_due_jobs) 받음
+
+    if ticker_response.status_code != 200:
+        print_and_log(f"  티커 API 요청 실패. 상태 코드: {ticker_response.status_code}")
+        return None
+    with stage_timer('ticker_parse'):
+        ticker_data = ticker_response.json()
+
+    if not ('data' in ticker_data and isinstance(ticker_data['data'], dict)):
+        print_and_log(f"  티커 응답의 'data' 필드가 예상과 다릅니다. 원본 응답 구조 확인 필요.")
+        return None
+
+    # 이더리움 데이터의 원본 API 응답 확인을 위한 로깅 (이전 요청으로 인해 추가됨)
+    if 'ETH' in ticker_data['data']:
+        # print_and_log(f"  [디버그] ETH 원본 API 데이터: {json.dumps(ticker_data['data']['ETH'], indent=2)}") # 너무 길면 주석 처리
+        pass
+    else:
+        print_and_log(f"  [디버그] ETH가 티커 응답 'data'에 없습니다.")
+    return ticker_data
+
+# 티커 작업: 전체 시세를 받아 이력/이력 저장소/링 버퍼를 갱신하고, 24H 변동률/추세 분석과 전체 시장 스캔을 실행
+# 반환값: (정밀 탐지 대상 코인 목록, 코인별 스캔 점수). 티커 응답이 예상과 다르면 None
+def run_ticker_job(history_store, current_epoch, current_time_kst):
+    ticker_data = fetch_ticker_data()
+    if ticker_data is None:
+        return None
+
+    history_rows = []
+    all_target_coins_found = True
+
+    for ticker_symbol in TARGET_COINS:
+        coin_info = ticker_data['data'].get(ticker_symbol)
+
+        current_data_point = {
+            "timestamp": current_time_kst,
+            "closing_price": "N/A",
+            "fluctate_rate_24H": "N/A",
+            "units_traded_24H": "N/A",
+            "version": snapshot_publisher.next_version # 웹 UI 증분 조회용 (이 점이 처음 실릴 스냅샷 version)
+        }
+
+        if coin_info and coin_info is not None: # 'None' 값도 필터링
+            closing_price = coin_info.get('closing_price', 'N/A')
+            fluctate_rate_24H = coin_info.get('fluctate_rate_24H', 'N/A')
+            units_traded_24H = coin_info.get('units_traded_24H', 'N/A')
+
+            # 전역 데이터 이력에 추가 및 최신 요약 업데이트
+            current_data_point["closing_price"] = closing_price
+            current_data_point["fluctate_rate_24H"] = fluctate_rate_24H
+            current_data_point["units_traded_24H"] = units_traded_24H
+        else:
+            all_target_coins_found = False
+        history_rows.append((ticker_symbol, current_data_point["closing_price"], current_data_point["fluctate_rate_24H"], current_data_point["units_traded_24H"]))
+        global_current_summary[ticker_symbol] = current_data_point # 최신 요약 업데이트 (N/A 값 포함)
+
+        # 분석용 링 버퍼/이동 통계에 현재 데이터 포인트 추가 (문자열 -> 숫자 변환은 여기서 한 번만 수행)
+        global_coin_states[ticker_symbol].append_ticker(
+            current_epoch,
+            current_data_point["closing_price"],
+            current_data_point["fluctate_rate_24H"],
+            current_data_point["units_traded_24H"]
+        )
+
+        # 전역 코인 데이터 이력에 현재 데이터 포인트 추가
+        global_coin_data_history[ticker_symbol].append(current_data_point)
+        # 이력 길이 유지
+        if len(global_coin_data_history[ticker_symbol]) > DATA_HISTORY_LENGTH:
+            global_coin_data_history[ticker_symbol].pop(0)
+
+    # 1.1. 이력 저장소(오늘 날짜 파티션)에 현재가 데이터 저장
+    try:
+        with stage_timer('history_append'):
+            history_store.append(current_epoch, history_rows)
+        print_and_log(f"  현재가 데이터 이력 저장소에 저장 완료.")
+        if not all_target_coins_found:
+            print_and_log("  (경고: 일부 대상 코인 현재가 데이터가 이번 응답에 없었습니다. 로그 확인 요망)")
+
+    except IOError as e:
+        print_and_log(f"  [오류] 이력 저장소 쓰기 오류 발생: {e}", level="ERROR")
+
+    # 1.2. 전체 시장 스캔 (모든 심볼을 한꺼번에 검사). 스캔 점수는 대상 코인의 정밀 탐지 주기에도 쓰이므로
+    #      SCAN_MODE_ENABLED가 꺼져 있어도 스캔하고, 승격(상위 심볼을 정밀 탐지 대상에 추가)만 하지 않습니다.
+    promoted_coins = []
+    scores = {}
+    try:
+        with stage_timer('market_scan'):
+            # 이전에 승격되어 상태가 만들어진 코인들도 링 버퍼/이동 통계를 계속 이어 갑니다.
+            for coin_symbol, state in global_coin_states.items():
+                if coin_symbol in TARGET_COINS:
+                    continue
+                coin_info = ticker_data['data'].get(coin_symbol)
+                coin_info = coin_info if isinstance(coin_info, dict) else {}
+                state.append_ticker(current_epoch, coin_info.get('closing_price', 'N/A'), coin_info.get('fluctate_rate_24H', 'N/A'), coin_info.get('units_traded_24H', 'N/A'))
+
+            promoted_coins, scan_result = scan_market(global_market_scanner, ticker_data['data'], current_epoch, FLUCTUATION_THRESHOLD_PERCENT, DEVIATION_THRESHOLD_PERCENT, TARGET_COINS, SCAN_TOP_K if SCAN_MODE_ENABLED else 0, current_time_kst)
+            for coin_symbol in promoted_coins:
+                get_coin_state(coin_symbol)
+            scores = dict(zip(scan_result.symbols, scan_result.score))
+    except Exception as e:
+        print_and_log(f"  [오류] 전체 시장 스캔 중 예상치 못한 오류: {e}", level="ERROR")
+        print_and_log(f"  상세: {traceback.format_exc()}", level="ERROR")
+        promoted_coins = []
+
+    # 호가창 탐지에 쓸 최신 현재가와 24H 거래량 (대상 코인 + 상태가 있는 승격 코인)
+    for coin_symbol in global_coin_states:
+        coin_info = ticker_data['data'].get(coin_symbol)
+        coin_info = coin_info if isinstance(coin_info, dict) else {}
+        global_latest_ticker[coin_symbol] = {
+            'closing_price': coin_info.get('closing_price', 'N/A'),
+            'units_traded_24H': coin_info.get('units_traded_24H', 'N/A')
+        }
+
+    # 2. 메모리 링 버퍼의 데이터로 24H 변동률 및 추세 분석 (이력 저장소를 다시 읽지 않음)
+    try:
+        with stage_timer('trend_analysis'):
+            analyze_and_notify_anomaly(global_coin_states, FLUCTUATION_THRESHOLD_PERCENT, DEVIATION_THRESHOLD_PERCENT, TARGET_COINS, current_time_kst, MOVING_AVERAGE_WINDOW)
+    except Exception as e:
+        print_and_log(f"  [오류] 현재가/추세 분석 중 예상치 못한 오류: {e}", level="ERROR")
+        print_and_log(f"  상세: {traceback.format_exc()}", level="ERROR")
+
+    return TARGET_COINS + promoted_coins, scores
+
+# 체결 내역 작업: 응답을 한 번만 파싱해 체결 테이프에 새 체결만 추가한 뒤 자전거래/펌프 앤 덤프 탐지 실행
+# (trades_fetch 단계 시간에는 동시 요청의 응답을 기다린 시간과 파싱 시간이 함께 들어감)
+def run_trades_job(coin_symbol, trade_history_future, current_time_kst):
+    with stage_timer('trades_fetch'):
+        trade_snapshot = load_trade_snapshot(coin_symbol, trade_history_future)
+    process_trade_snapshot(coin_symbol, trade_snapshot, current_time_kst)
+
+# 파싱된 체결 내역으로 자전거래/펌프 앤 덤프 탐지 실행 (trade_snapshot: 받지 못했으면 None)
+# 실시간 수집(run_trades_job)과 재생 엔진(replay.py)이 함께 사용합니다.
+def process_trade_snapshot(coin_symbol, trade_snapshot, current_time_kst):
+    state = global_coin_states[coin_symbol]
+    trade_tape = None
+    if trade_snapshot is not None:
+        state.trade_tape.ingest(trade_snapshot)
+        trade_tape = state.trade_tape
+    with stage_timer('wash_trading'):
+        detect_wash_trading(coin_symbol, trade_tape, WASH_TRADE_TIME_WINDOW_SECONDS, WASH_TRADE_PRICE_TOLERANCE_PERCENT, WASH_TRADE_QUANTITY_TOLERANCE_PERCENT, current_time_kst)
+    with stage_timer('pump_and_dump'):
+        detect_pump_and_dump_anomaly(
+            coin_symbol,
+            state.buffer,
+            trade_tape,
+            PUMP_DETECTION_WINDOWS,
+            PUMP_VOLUME_MULTIPLIER_FROM_AVG_24H,
+            current_time_kst
+        )
+
+# 호가창 작업: 매물벽 탐지 후, 벽 추적기로 사라진 벽을 찾아 스푸핑 탐지
+# order_book_future: 현재가가 없어 요청하지 않았으면 None
+# (orderbook_fetch 단계 시간에는 동시 요청의 응답을 기다린 시간과 파싱 시간이 함께 들어감)
+def run_orderbook_job(coin_symbol, order_book_future, current_epoch, current_time_kst):
+    with stage_timer('orderbook_fetch'):
+        order_book = load_order_book_snapshot(coin_symbol, order_book_future) if order_book_future is not None else None
+    process_order_book(coin_symbol, order_book, current_epoch, current_time_kst)
+
+# 파싱된 호가창으로 매물벽/스푸핑 탐지 실행 (order_book: 받지 못했으면 None)
+# 실시간 수집(run_orderbook_job)과 재생 엔진(replay.py)이 함께 사용합니다.
+def process_order_book(coin_symbol, order_book, current_epoch, current_time_kst):
+    coin_data = global_latest_ticker.get(coin_symbol, {'closing_price': 'N/A', 'units_traded_24H': 'N/A'})
+    state = global_coin_states[coin_symbol]
+    # 최신 호가창과 깊이 지표는 코인 상태에 보관하여 다른 탐지에서도 다시 요청/파싱 없이 쓸 수 있게 함
+    state.order_book = order_book
+    state.order_book_features = None
+    with stage_timer('order_wall'):
+        if order_book is not None:
+            state.order_book_features = order_book.depth_features(ORDER_BOOK_DEPTH_PERCENT)
+            features = state.order_book_features
+            print_and_log(f"  {coin_symbol} 호가창 깊이: 스프레드 {features.spread_percent:.3f}%, {ORDER_BOOK_DEPTH_PERCENT}% 이내 매수 {features.bid_depth:.4f} / 매도 {features.ask_depth:.4f}, 불균형 {features.imbalance:+.2f}", level="DEBUG")
+        is_wall_anomaly, detected_walls_for_coin = detect_order_book_wall_anomaly(
+            coin_symbol,
+            order_book,
+            coin_data['closing_price'],
+            coin_data['units_traded_24H'],
+            ORDER_WALL_PRICE_DISTANCE_PERCENT,
+            ORDER_WALL_VOLUME_MULTIPLIER,
+            current_time_kst
+        )
+    if order_book is None or np.isnan(to_float(coin_data['closing_price'])):
+        return # 호가창이나 현재가가 없으면 벽 비교를 하지 않고 추적 중인 벽 상태를 유지 (벽이 모두 사라진 것으로 보지 않도록)
+    with stage_timer('spoofing'):
+        # 호가 범위 밖으로 밀려난 벽(가격 변동)은 철회로 세지 않도록 이번에 보인 호가 범위도 함께 넘김
+        _, pulled_walls = get_wall_tracker(coin_symbol).update(detected_walls_for_coin, current_epoch, order_book.price_ranges())
+        detect_spoofing(coin_symbol, pulled_walls, coin_data['closing_price'], ORDER_WALL_PRICE_DISTANCE_PERCENT,
+                        SPOOFING_REPEAT_PULL_COUNT, current_time_kst)
+
+# 전역 데이터를 공유 JSON 파일(및 메모리 매핑 스냅샷 영역)에 저장
+# 사용할 스냅샷 영역을 반환합니다. (이력에 영역에 없는 코인이 생기면 영역을 새로 만들어 반환, 호출하는 쪽은 반환값으로 교체)
+def publish_shared_data(snapshot_region):
+    if snapshot_region is not None and not set(global_coin_data_history).issubset(snapshot_region.coins):
+        # 웹 서버는 영역을 파일보다 먼저 읽으므로, 영역에 행이 없는 코인(승격 코인, 전체 KRW 감시)이 생기면 영역을 다시 만듦
+        snapshot_region.close()
+        snapshot_region = open_snapshot_region()
+    try:
+        published = snapshot_publisher.publish({
+            'history': global_coin_data_history,
+            'anomaly_events': [event.to_dict() for event in global_anomaly_events],
+            'current_summary': global_current_summary,
+            'wall_trackers': dict(global_saved_wall_state, **{coin: tracker.to_list() for coin, tracker in global_wall_trackers.items()}), # 스푸핑 데이터도 저장
+            'metrics': global_metrics_snapshot
+        })
+        if published:
+            if snapshot_region is not None:
+                snapshot_region.write(snapshot_publisher.version, global_coin_data_history, global_anomaly_events)
+            print_and_log(f"  공유 데이터 '{SHARED_DATA_FILE}'에 저장 완료. (version {snapshot_publisher.version})")
+        else:
+            print_and_log(f"  공유 데이터 변경 없음. 저장 생략. (version {snapshot_publisher.version})", level="DEBUG")
+    except Exception as e:
+        print_and_log(f"  [오류] 공유 데이터 '{SHARED_DATA_FILE}' 저장 실패: {e}", level="ERROR")
+    return snapshot_region
+
+# 스케줄러/클라이언트가 이미 세고 있는 누적 통계를 계측 레지스트리의 카운터/게이지로 옮긴 뒤 발행용 사본 반환
+# observation_cost: 계측 기록 하나의 비용(초, measure_observation_cost). 주면 계측 비용 / 루프 작업 시간 비율도 게이지로 남깁니다.
+def collect_metrics(scheduler, client, observation_cost=None):
+    for kind, stats in scheduler.stats.items():
+        global_metrics.set_counter('scheduler_job_runs_total', stats.runs, kind=kind)
+        global_metrics.set_counter('scheduler_deadline_misses_total', stats.missed, kind=kind)
+        global_metrics.set_counter('scheduler_deferrals_total', stats.deferred, kind=kind)
+    for group, stats in client.stats().items():
+        global_metrics.set_counter('http_requests_total', stats['requests'], endpoint=group)
+        global_metrics.set_counter('http_retries_total', stats['retries'], endpoint=group)
+        global_metrics.set_counter('http_errors_total', stats['failures'], endpoint=group)
+        global_metrics.set_counter('http_throttled_total', stats['throttled'], endpoint=group)
+        global_metrics.set_counter('http_short_circuited_total', stats['short_circuited'], endpoint=group)
+        global_metrics.set_gauge('circuit_breaker_open', int(stats['breaker_state'] != 'closed'), endpoint=group)
+    cycle = global_metrics.histogram('stage_seconds', stage='cycle')
+    if observation_cost is not None and cycle is not None and cycle.sum > 0:
+        global_metrics.set_gauge('instrumentation_overhead_ratio', global_metrics.observations * observation_cost / cycle.sum)
+    return global_metrics.to_dict()
+
+# 스케줄러 통계(작업 종류별 실행/마감 초과/지연), 요청 예산 사용량, 엔드포인트별 재시도/서킷 브레이커 통계 로그
+def log_scheduler_stats(scheduler, client):
+    print_and_log(f"\n--- 스케줄러 통계 (예약된 작업 {len(scheduler)}개) ---")
+    for line in scheduler.format_stats():
+        print_and_log(f"  {line}")
+    rate_limiter = client.rate_limiter
+    if rate_limiter is not None:
+        print_and_log(f"  요청 예산: 허용 {rate_limiter.granted}회, 대기 {rate_limiter.throttled}회, 대기 시간 합계 {rate_limiter.total_wait_seconds:.2f}초 (초당 {rate_limiter.rate}회)")
+    for line in client.format_stats():
+        print_and_log(f"  {line}")
+    recorder = client.recorder
+    if recorder is not None:
+        print_and_log(f"  응답 기록: {recorder.recorded}개 기록, {recorder.dropped}개 버림, 압축 {recorder.raw_bytes / 1e6:.1f}MB -> {recorder.compressed_bytes / 1e6:.1f}MB")
+    print_and_log("------------------------------------")
+
+# 단계별 소요 시간 요약(횟수, 평균, p95 근사, 최대)과 주기 초과 수, 계측 비용 비율 로그
+def log_stage_stats():
+    print_and_log(f"\n--- 단계별 소요 시간 (주기 {global_metrics.counter('cycles_total')}회, 티커 주기 초과 {global_metrics.counter('cycle_overruns_total')}회) ---")
+    for labels, histogram in global_metrics.histograms('stage_seconds'):
+        print_and_log(f"  {labels['stage']}: {histogram.count}회, 평균 {histogram.sum / histogram.count * 1000:.2f}ms, "
+                      f"p95 <= {histogram.quantile(0.95) * 1000:.1f}ms, 최대 {histogram.max * 1000:.1f}ms")
+    overhead_ratio = global_metrics.gauge('instrumentation_overhead_ratio')
+    if overhead_ratio is not None:
+        print_and_log(f"  계측 비용 추정: 루프 작업 시간의 {overhead_ratio * 100:.3f}%")
+    print_and_log("------------------------------------")
+
+
+# 웹 서버가 잠금 없이 읽을 메모리 매핑 스냅샷 영역 열기 (만들 수 없으면 None을 반환하고 JSON 파일만 사용)
+# 대상 코인과 지금까지 이력이 쌓인 코인(승격 코인, 작업 프로세스가 맡은 전체 KRW 코인)을 모두 담을 크기로 만듭니다.
+def open_snapshot_region():
+    coins = list(TARGET_COINS) + sorted(set(global_coin_data_history) - set(TARGET_COINS))
+    try:
+        snapshot_region = SnapshotRegionWriter(SNAPSHOT_REGION_FILE, coins, DATA_HISTORY_LENGTH, ANOMALY_LOG_MAX_LENGTH)
+        print_and_log(f"공유 스냅샷 영역: {os.path.abspath(SNAPSHOT_REGION_FILE)} (코인 {len(coins)}개)")
+        return snapshot_region
+    except (OSError, ValueError) as e:
+        print_and_log(f"[오류] 공유 스냅샷 영역 '{SNAPSHOT_REGION_FILE}' 생성 실패: {e}. JSON 파일만 사용합니다.", level="ERROR")
+        # 이전 영역 파일이 남아 있으면 웹 서버가 그 영역(일부 코인만 담긴)을 계속 읽으므로 지움
+        try:
+            os.remove(SNAPSHOT_REGION_FILE)
+        except OSError:
+            pass
+        return None
+
+# 예정 시각이 된 작업 중 지금 남은 요청 예산으로 보낼 수 있는 만큼만 골라 반환 (예정 시각, 우선순위 순)
+# 허용한 작업마다 요청 토큰을 하나씩 바로 받아 두므로, 허용한 작업 수가 실제로 보낼 첫 요청 수와 같습니다.
+# (작업의 첫 요청은 받아 둔 토큰으로 보내고(reserved=True), 요청을 보내지 않게 된 작업의 토큰은 돌려줍니다.)
+# 나머지는 토큰이 생길 때까지 미룸 (지연은 스케줄러 통계에 남음).
+# limit: 한 번에 꺼낼 최대 작업 수 (넘는 작업은 미루지 않고 큐에 남겨 다음 반복에서 실행)
+def admit_due_jobs(scheduler, rate_limiter, limit=None):
+    admitted_jobs = []
+    for job in scheduler.pop_due(limit=limit):
+        if rate_limiter is None or rate_limiter.try_acquire():
+            admitted_jobs.append(job)
+        else:
+            scheduler.defer(job, rate_limiter.wait_time())
+    return admitted_jobs
+
+# 코인별 체결 내역/호가창 요청을 한꺼번에 동시 발송한 뒤 차례로 분석
+# 스케줄러에서 이미 빠진 코인(티커 작업에서 대상에서 빠진 코인)의 작업은 건너뛰며, 실제로 실행한 작업 목록을 반환합니다.
+# 작업마다 admit_due_jobs에서 받아 둔 요청 토큰은 요청에 쓰거나, 요청을 보내지 않으면 돌려줍니다.
+def run_detail_jobs(scheduler, detail_jobs, current_epoch, current_time_kst):
+    admitted_count = len(detail_jobs)
+    detail_jobs = [job for job in detail_jobs if job.key in scheduler]
+    http_client.refund_reservation(admitted_count - len(detail_jobs))
+    fetch_batch = http_client.start_batch() # 이번에 실행할 코인별 동시 요청 묶음
+    try:
+        futures = []
+        for job in detail_jobs:
+            coin_symbol = job.key[0]
+            scheduler.complete(job, scheduler.clock())
+            if job.kind == JOB_TRADES:
+                future = fetch_batch.submit(f"/transaction_history/{coin_symbol}_KRW", {'count': RECENT_TRADES_LOOKBACK_COUNT}, reserved=True)
+            elif global_latest_ticker.get(coin_symbol, {}).get('closing_price', 'N/A') != 'N/A':
+                future = fetch_batch.submit(f"/orderbook/{coin_symbol}_KRW", {'count': ORDER_BOOK_COUNT}, reserved=True)
+            else:
+                future = None
+                http_client.refund_reservation() # 현재가가 없어 호가창 요청을 보내지 않음
+            futures.append(future)
+
+        with stage_timer('detail_jobs'):
+            for job, future in zip(detail_jobs, futures):
+                if job.kind == JOB_TRADES:
+                    run_trades_job(job.key[0], future, current_time_kst)
+                else:
+                    run_orderbook_job(job.key[0], future, current_epoch, current_time_kst)
+    except Exception:
+        fetch_batch.cancel_pending()
+        raise
+    return detail_jobs
+
+# 반복 하나의 작업 시간을 기록 (티커 주기를 넘으면 주기 초과로 집계: 다음 티커가 밀리기 시작함)
+def record_cycle_time(cycle_started):
+    cycle_seconds = time.perf_counter() - cycle_started
+    global_metrics.observe('stage_seconds', cycle_seconds, stage='cycle')
+    global_metrics.increment('cycles_total')
+    if cycle_seconds > TICKER_INTERVAL_SECONDS:
+        global_metrics.increment('cycle_overruns_total')
+        print_and_log(f"  [경고] 이번 반복 작업 시간 {cycle_seconds:.2f}초가 티커 주기 {TICKER_INTERVAL_SECONDS}초를 넘었습니다.", level="WARNING")
+
+
 # --- 메인 데이터 수집 및 분석 루프 ---
+# 고정 주기로 모든 탐지를 차례로 도는 대신, (코인, 작업 종류)별 다음 실행 시각을 우선순위 큐로 관리합니다.
+# 예정 시각이 된 작업만 요청 예산(토큰 버킷) 안에서 실행하고, 다음 작업 시각까지 잠듭니다.
 def data_collection_loop():
-    global global_last_detected_large_walls # 전역 변수임을 명시
-    
-    write_csv_header_if_not_exists(CSV_FILE_PATH, TARGET_COINS)
+    global global_metrics_snapshot
+    history_store = open_history_store(HISTORY_STORE_DIR, LEGACY_CSV_FILE_PATH)
+
+    # 이력 저장소는 기록 전용입니다. 시작 시 한 번만 최근 파티션을 읽어 링 버퍼를 채웁니다.
+    loaded_ticks = load_recent_history(history_store, global_coin_states, IN_MEMORY_HISTORY_LENGTH)
+    if loaded_ticks > 0:
+        print_and_log(f"이력 저장소 '{HISTORY_STORE_DIR}'에서 최근 {loaded_ticks}개 시각을 메모리 이력으로 불러왔습니다.")
 
     print_and_log("--- 이상거래 탐지 시스템 가동 시작 (데이터 수집 및 분석 전용 + 스푸핑 탐지) ---")
     print_and_log(f"대상 코인: {', '.join(TARGET_COINS)}")
-    print_and_log(f"감시 주기: {API_CALL_INTERVAL_SECONDS}초")
+    print_and_log(f"티커 주기: {TICKER_INTERVAL_SECONDS}초, 체결 내역/호가창 주기: {DETAIL_MIN_INTERVAL_SECONDS}~{DETAIL_MAX_INTERVAL_SECONDS}초 (변동성에 따라)")
+    print_and_log(f"요청 예산: 초당 {API_REQUEST_RATE_LIMIT_PER_SECOND}회 (최대 {API_REQUEST_BURST}회 연속)")
     print_and_log(f"공유 데이터 파일: {os.path.abspath(SHARED_DATA_FILE)}")
+
+    snapshot_region = open_snapshot_region()
+    # 계측 기록 하나의 비용 (계측 비용 / 루프 작업 시간 비율 추정에 사용)
+    observation_cost = measure_observation_cost()
+    print_and_log(f"단계별 계측 비용: 기록 하나당 {observation_cost * 1e6:.1f}us")
     print_and_log("-" * 50)
 
+    scheduler = JobScheduler(SCHEDULER_LATENESS_TOLERANCE_SECONDS)
+    scheduler.schedule(TICKER_JOB_KEY, JOB_TICKER, TICKER_INTERVAL_SECONDS, priority=0) # 같은 시각이면 티커가 먼저
+    # 대상 코인의 정밀 탐지는 첫 티커(현재가)를 받은 뒤 시작
+    for coin_symbol in TARGET_COINS:
+        for kind in DETAIL_JOB_KINDS:
+            scheduler.schedule((coin_symbol, kind), kind, DETAIL_MAX_INTERVAL_SECONDS, due=scheduler.clock() + TICKER_INTERVAL_SECONDS / 2)
+    last_stats_logged_at = scheduler.clock()
+
     while True:
-        current_time_kst = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime())
-        print_and_log(f"\n--- [{current_time_kst}] 데이터 수집 및 분석 시도 ---")
-        
-        current_prices_and_volumes = {} # 호가창 및 펌프 탐지에 필요한 현재가와 24H 거래량 저장을 위함
-        current_detected_large_walls_this_cycle = {coin: [] for coin in TARGET_COINS} # 현재 주기에서 감지된 큰 벽들
-        
-        try: # <<<<<<<<<< 이 'try' 블록이 이번 루프 전체를 감싸고 있습니다.
-            ticker_response = requests.get(TICKER_REQUEST_URL, headers={})
-
-            if ticker_response.status_code == 200:
-                ticker_data = ticker_response.json()
-
-                if 'data' in ticker_data and isinstance(ticker_data['data'], dict):
-                    # 이더리움 데이터의 원본 API 응답 확인을 위한 로깅 (이전 요청으로 인해 추가됨)
-                    if 'ETH' in ticker_data['data']:
-                        # print_and_log(f"  [디버그] ETH 원본 API 데이터: {json.dumps(ticker_data['data']['ETH'], indent=2)}") # 너무 길면 주석 처리
-                        pass
-                    else:
-                        print_and_log(f"  [디버그] ETH가 티커 응답 'data'에 없습니다.")
-
-                    row_data = [current_time_kst]
-                    all_target_coins_found = True
-
-                    for ticker_symbol in TARGET_COINS:
-                        coin_info = ticker_data['data'].get(ticker_symbol)
-                        
-                        current_data_point = {
-                            "timestamp": current_time_kst,
-                            "closing_price": "N/A",
-                            "fluctate_rate_24H": "N/A",
-                            "units_traded_24H": "N/A"
-                        }
-
-                        if coin_info and coin_info is not None: # 'None' 값도 필터링
-                            closing_price = coin_info.get('closing_price', 'N/A')
-                            fluctate_rate_24H = coin_info.get('fluctate_rate_24H', 'N/A')
-                            units_traded_24H = coin_info.get('units_traded_24H', 'N/A')
-                            
-                            row_data.extend([closing_price, fluctate_rate_24H, units_traded_24H])
-                            current_prices_and_volumes[ticker_symbol] = {
-                                'closing_price': closing_price,
-                                'units_traded_24H': units_traded_24H
-                            }
-                            # 전역 데이터 이력에 추가 및 최신 요약 업데이트
-                            current_data_point["closing_price"] = closing_price
-                            current_data_point["fluctate_rate_24H"] = fluctate_rate_24H
-                            current_data_point["units_traded_24H"] = units_traded_24H
-                            global_current_summary[ticker_symbol] = current_data_point # 최신 요약 업데이트
-                        else:
-                            row_data.extend(['N/A', 'N/A', 'N/A'])
-                            all_target_coins_found = False
-                            current_prices_and_volumes[ticker_symbol] = {
-                                'closing_price': 'N/A',
-                                'units_traded_24H': 'N/A'
-                            }
-                            global_current_summary[ticker_symbol] = current_data_point # 최신 요약 업데이트 (N/A 값 포함)
-
-                        # 전역 코인 데이터 이력에 현재 데이터 포인트 추가
-                        global_coin_data_history[ticker_symbol].append(current_data_point)
-                        # 이력 길이 유지
-                        if len(global_coin_data_history[ticker_symbol]) > DATA_HISTORY_LENGTH:
-                            global_coin_data_history[ticker_symbol].pop(0)
-
-                    # 1.1. CSV 파일에 현재가 데이터 저장
-                    try:
-                        with open(CSV_FILE_PATH, 'a', encoding='utf-8') as f:
-                            f.write(",".join(map(str, row_data)) + "\n")
-                        print_and_log(f"  현재가 데이터 CSV에 저장 완료.")
-                        if not all_target_coins_found:
-                            print_and_log("  (경고: 일부 대상 코인 현재가 데이터가 이번 응답에 없었습니다. 로그 확인 요망)")
-
-                    except IOError as e:
-                        print_and_log(f"  [오류] CSV 파일 쓰기 오류 발생: {e}")
-                    
-                    # 2. 저장된 데이터 불러와서 24H 변동률 및 추세 분석
-                    df_full = pd.DataFrame() # 빈 DataFrame으로 초기화
+        admitted_jobs = admit_due_jobs(scheduler, http_client.rate_limiter)
+        ticker_job = next((job for job in admitted_jobs if job.kind == JOB_TICKER), None)
+        detail_jobs = [job for job in admitted_jobs if job.kind != JOB_TICKER]
+
+        if ticker_job is not None or detail_jobs:
+            cycle_started = time.perf_counter()
+            current_epoch = time.time()
+            current_time_kst = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(current_epoch))
+            print_and_log(f"\n--- [{current_time_kst}] 데이터 수집 및 분석 시도 (티커 {'포함' if ticker_job else '없음'}, 정밀 탐지 작업 {len(detail_jobs)}개) ---")
+
+            try:
+                # 1. 티커 작업 (정밀 탐지 대상과 주기를 정하므로 가장 먼저)
+                if ticker_job is not None:
+                    scheduler.complete(ticker_job, scheduler.clock())
                     try:
-                        df_full = pd.read_csv(CSV_FILE_PATH, parse_dates=["Timestamp (KST)"])
-                        
-                        if not df_full.empty:
-                            analyze_and_notify_anomaly(df_full, FLUCTUATION_THRESHOLD_PERCENT, DEVIATION_THRESHOLD_PERCENT, TARGET_COINS, current_time_kst, MOVING_AVERAGE_WINDOW)
-                        else:
-                            print_and_log(f"  CSV 파일 '{CSV_FILE_PATH}'이 비어 있어 현재가/추세 분석을 건너뜠습니다.")
-
-                    except FileNotFoundError:
-                        print_and_log(f"  [오류] CSV 파일 '{CSV_FILE_PATH}'을(를) 찾을 수 없어 현재가/추세 분석을 건너킵니다.")
-                    except pd.errors.EmptyDataError:
-                        print_and_log(f"  [오류] CSV 파일 '{CSV_FILE_PATH}'이 비어 있어 현재가/추세 분석을 건너뜜.")
-                    except Exception as e:
-                        print_and_log(f"  [오류] CSV 데이터 읽기 또는 현재가/추세 분석 중 예상치 못한 오류: {e}")
-                        print_and_log(f"  상세: {traceback.format_exc()}")
-                    
-                    # 3. 각 코인별 자전거래 탐지 실행
-                    for coin_symbol in TARGET_COINS:
-                        detect_wash_trading(coin_symbol, WASH_TRADE_TIME_WINDOW_SECONDS, WASH_TRADE_PRICE_TOLERANCE_PERCENT, WASH_TRADE_QUANTITY_TOLERANCE_PERCENT, RECENT_TRADES_LOOKBACK_COUNT, current_time_kst)
-
-                    # --- 호가창 매물벽 탐지 및 스푸핑 감지를 위한 데이터 수집 ---
-                    current_run_detected_walls = {coin: [] for coin in TARGET_COINS} # 이번 주기에서 탐지된 벽들을 임시 저장
-                    for coin_symbol in TARGET_COINS:
-                        coin_data = current_prices_and_volumes.get(coin_symbol, {'closing_price': 'N/A', 'units_traded_24H': 'N/A'})
-                        
-                        # detect_order_book_wall_anomaly 함수가 이제 두 번째 반환값(detected_walls_for_coin)을 추가로 줍니다.
-                        is_wall_anomaly, detected_walls_for_coin = detect_order_book_wall_anomaly(
-                            coin_symbol, 
-                            coin_data['closing_price'], 
-                            coin_data['units_traded_24H'], 
-                            ORDER_WALL_PRICE_DISTANCE_PERCENT, 
-                            ORDER_WALL_VOLUME_MULTIPLIER, 
-                            ORDER_BOOK_COUNT,
-                            current_time_kst
-                        )
-                        current_run_detected_walls[coin_symbol] = detected_walls_for_coin
-
-                        # --- 스푸핑 탐지 로직 (여기서 실제 비교 및 알림) ---
-                        # 직전 주기에서 감지된 벽들과 현재 주기에서 감지된 벽들을 비교하여 사라진 벽을 찾습니다.
-                        for last_wall in global_last_detected_large_walls[coin_symbol]:
-                            is_still_present = False
-                            # 현재 주기에서 last_wall과 유사한 벽이 있는지 확인
-                            for current_wall in detected_walls_for_coin:
-                                # 가격 및 수량에 작은 오차를 허용하여 동일한 벽으로 간주
-                                if (last_wall['type'] == current_wall['type'] and
-                                    # 가격 차이가 0.01% 이내
-                                    abs((last_wall['price'] - current_wall['price']) / last_wall['price']) * 100 < 0.01 and 
-                                    # 수량 차이가 0.01% 이내
-                                    abs((last_wall['quantity'] - current_wall['quantity']) / last_wall['quantity']) * 100 < 0.01): 
-                                    is_still_present = True
-                                    break
-                            
-                            if not is_still_present:
-                                # 벽이 사라졌고, 가격이 그 벽을 향해 유의미하게 움직이지 않았는지 확인
-                                # 즉, 매도벽이 사라졌는데 가격이 올라가지 않았거나, 매수벽이 사라졌는데 가격이 내려가지 않았다면
-                                current_closing_price_float = float(current_prices_and_volumes[coin_symbol]['closing_price'])
-                                spoofing_condition_met = False
-
-                                if last_wall['type'] == 'ask': # 매도벽 (위에서 눌러주는 역할)
-                                    # 매도벽이 사라졌는데 현재가가 그 벽 가격보다 "현저히 아래에" 머물러 있다면 의심
-                                    # (가격이 그 벽을 뚫지 못하고 벽이 사라진 경우)
-                                    # 즉, 벽이 사라졌음에도 불구하고 가격이 그 벽을 넘어 올라가지 못하고 한참 아래에 있다면 스푸핑 의심
-                                    if current_closing_price_float < last_wall['price'] * (1 - ORDER_WALL_PRICE_DISTANCE_PERCENT / 100 * 0.2): # 원래 벽 거리의 20% 이상 벗어나지 않았다면
-                                        spoofing_condition_met = True
-                                elif last_wall['type'] == 'bid': # 매수벽 (아래에서 받쳐주는 역할)
-                                    # 매수벽이 사라졌는데 현재가가 그 벽 가격보다 "현저히 위에" 머물러 있다면 의심
-                                    # (가격이 그 벽 아래로 내려가지 못하고 벽이 사라진 경우)
-                                    # 즉, 벽이 사라졌음에도 불구하고 가격이 그 벽을 넘어 내려가지 못하고 한참 위에 있다면 스푸핑 의심
-                                    if current_closing_price_float > last_wall['price'] * (1 + ORDER_WALL_PRICE_DISTANCE_PERCENT / 100 * 0.2): # 원래 벽 거리의 20% 이상 벗어나지 않았다면
-                                        spoofing_condition_met = True
-                                
-                                if spoofing_condition_met:
-                                    print_and_log(f"  👻 [스푸핑 의심 감지!] 👻")
-                                    print_and_log(f"  코인: {coin_symbol}")
-                                    print_and_log(f"  사라진 {last_wall['type']} 벽: 가격={last_wall['price']:.2f}, 수량={last_wall['quantity']:.4f}")
-                                    print_and_log(f"  벽 감지 시각: {last_wall['timestamp']}")
-                                    print_and_log(f"  현재가: {current_closing_price_float:.2f} KRW")
-                                    print_and_log(f"  경고: {coin_symbol} 호가창에 나타났던 대규모 벽이 가격 이동 없이 사라졌습니다! (스푸핑 의심)", is_anomaly=True)
-                                    print_and_log(f"  👻👻👻👻👻👻👻👻👻👻👻👻👻👻👻👻👻👻👻👻👻")
-                        
-                    # 다음 반복을 위해 현재 주기에서 감지된 벽을 '직전 주기 벽'으로 저장
-                    global_last_detected_large_walls = current_run_detected_walls.copy()
-                
-                # 5. 각 코인별 펌프 앤 덤프 탐지 실행 (새로 추가)
-                if not df_full.empty: # CSV 데이터가 있어야만 펌프 탐지 가능
-                    for coin_symbol in TARGET_COINS:
-                        detect_pump_and_dump_anomaly(
-                            coin_symbol, 
-                            df_full, 
-                            PUMP_PRICE_INCREASE_PERCENT, 
-                            PUMP_VOLUME_MULTIPLIER_FROM_AVG_24H, 
-                            PUMP_DETECTION_WINDOW_SECONDS, 
-                            API_CALL_INTERVAL_SECONDS, 
-                            current_time_kst
-                        )
-                else:
-                    print_and_log(f"  CSV 파일에 데이터가 없어 펌프 앤 덤프 탐지를 건너킵니다.")
-
-            else: # <<<<<<<<<< 이 'else'가 문제가 되는 723번 줄일 가능성이 있습니다 (만약 들여쓰기가 이상해졌다면).
-                # 이 'else'는 'if ticker_response.status_code == 200:' 에 대한 'else'가 아니라,
-                # 'if 'data' in ticker_data and isinstance(ticker_data['data'], dict):' 에 대한 'else' 입니다.
-                print_and_log(f"  티커 응답의 'data' 필드가 예상과 다릅니다. 원본 응답 구조 확인 필요.")
-
-            # --- 중요: 전역 데이터를 공유 JSON 파일에 저장 ---
-            try: # <<<<<<<<<< 이 'try' 블록은 바로 위에 있는 큰 'if' 블록 내부에 있습니다.
-                with open(SHARED_DATA_FILE, 'w', encoding='utf-8') as f:
-                    json.dump({
-                        'history': global_coin_data_history,
-                        'anomaly_logs': global_anomaly_logs,
-                        'current_summary': global_current_summary,
-                        'last_detected_large_walls': global_last_detected_large_walls # 스푸핑 데이터도 저장
-                    }, f, ensure_ascii=False, indent=2)
-                print_and_log(f"  공유 데이터 '{SHARED_DATA_FILE}'에 저장 완료.")
+                        with stage_timer('ticker_job'):
+                            ticker_result = run_ticker_job(history_store, current_epoch, current_time_kst)
+                            if ticker_result is not None:
+                                detail_coins, scores = ticker_result
+                                sync_detail_jobs(scheduler, detail_coins, scores)
+                    except requests.exceptions.RequestException as e:
+                        print_and_log(f"  [오류] 티커 API 요청 중 네트워크 예외 발생: {e}", level="ERROR")
+                        print_and_log("  네트워크 연결 상태를 확인하거나 잠시 후 다시 시도합니다.")
+
+                # 2. 코인별 체결 내역/호가창 요청을 한꺼번에 동시 발송한 뒤 차례로 분석
+                run_detail_jobs(scheduler, detail_jobs, current_epoch, current_time_kst)
+
+                # --- 중요: 전역 데이터를 공유 JSON 파일에 저장 ---
+                # 계측 사본은 티커 작업을 실행한 반복에서만 새로 만듦 (이번 반복의 cycle/publish 시간은 다음 사본에 실림)
+                if ticker_job is not None:
+                    global_metrics_snapshot = collect_metrics(scheduler, http_client, observation_cost)
+                with stage_timer('publish'):
+                    snapshot_region = publish_shared_data(snapshot_region)
+
+                record_cycle_time(cycle_started)
+
             except Exception as e:
-                print_and_log(f"  [오류] 공유 데이터 '{SHARED_DATA_FILE}' 저장 실패: {e}")
+                print_and_log(f"  [치명적 오류] 예상치 못한 오류 발생. 프로그램 종료: {e}", level="ERROR")
+                print_and_log(f"  상세: {traceback.format_exc()}", level="ERROR")
+                break # 이 break는 while True 루프를 빠져나오게 합니다.
+
+        if scheduler.clock() - last_stats_logged_at >= SCHEDULER_STATS_LOG_INTERVAL_SECONDS:
+            log_scheduler_stats(scheduler, http_client)
+            log_stage_stats()
+            last_stats_logged_at = scheduler.clock()
+
+        # 다음 작업 예정 시각까지 대기 (루프 안에서 매 반복마다)
+        next_due = scheduler.next_due()
+        delay = TICKER_INTERVAL_SECONDS if next_due is None else next_due - scheduler.clock()
+        if delay > 0:
+            time.sleep(min(delay, TICKER_INTERVAL_SECONDS))
+
+
+# --- 코인 분할(다중 프로세스) 모드 ---
+# 조정 프로세스는 티커 요청, 이력 저장소 기록, 전체 시장 스캔, 공유 데이터 발행만 하고,
+# 코인별 추세 분석과 체결 내역/호가창 탐지는 심볼 해시로 나눈 작업 프로세스(coin_shards.py)가 각자 실행합니다.
+
+# 작업 프로세스 결과 하나를 전역 데이터에 합침 (시세 점/요약, 이상 징후 이벤트, 벽 추적 상태)
+def merge_shard_result(result):
+    for coin_symbol, data_point in result.points:
+        data_point['version'] = snapshot_publisher.next_version # 웹 UI 증분 조회용 (이 점이 처음 실릴 스냅샷 version)
+        global_current_summary[coin_symbol] = data_point
+        history = global_coin_data_history.setdefault(coin_symbol, [])
+        history.append(data_point)
+        if len(history) > DATA_HISTORY_LENGTH:
+            history.pop(0)
+    for coin_symbol, detector, epoch, evidence in result.events:
+        append_anomaly_event(coin_symbol, detector, epoch, evidence)
+    global_saved_wall_state.update(result.walls)
+
+# 분할 모드의 티커 작업: 전체 시세를 받아 이력 저장소 기록과 전체 시장 스캔을 한 뒤, 작업 프로세스별 티커(ShardTick)를 보냄
+# assigned: 이미 작업 프로세스에 상태가 있는 코인 집합 (처음 보내는 코인은 스캐너 이력을 함께 보내고 여기에 추가)
+# 반환값: 티커를 보냈으면 True, 응답이 예상과 달라 건너뛰었으면 False
+def run_sharded_ticker_job(pool, history_store, assigned, current_epoch, current_time_kst):
+    ticker_data = fetch_ticker_data()
+    if ticker_data is None:
+        return False
+    market = {symbol: coin_info for symbol, coin_info in ticker_data['data'].items() if isinstance(coin_info, dict)}
+    target_coins = sorted(market) if SHARD_WATCH_ALL_KRW else list(TARGET_COINS)
 
-        except requests.exceptions.RequestException as e: # <<<<<<<<<< 이 'except'는 가장 바깥쪽 'try'의 예외 처리입니다.
-            print_and_log(f"  [오류] API 요청 중 네트워크 예외 발생: {e}")
-            print_and_log("  네트워크 연결 상태를 확인하거나 잠시 후 다시 시도합니다.")
-        except Exception as e: # <<<<<<<<<< 이 'except'도 가장 바깥쪽 'try'의 예외 처리입니다.
-            print_and_log(f"  [치명적 오류] 예상치 못한 오류 발생. 프로그램 종료: {e}")
-            print_and_log(f"  상세: {traceback.format_exc()}")
-            break # 이 break는 while True 루프를 빠져나오게 합니다.
+    history_rows = []
+    for coin_symbol in target_coins:
+        coin_info = market.get(coin_symbol, {})
+        history_rows.append((coin_symbol, coin_info.get('closing_price', 'N/A'), coin_info.get('fluctate_rate_24H', 'N/A'), coin_info.get('units_traded_24H', 'N/A')))
+    try:
+        with stage_timer('history_append'):
+            history_store.append(current_epoch, history_rows)
+    except IOError as e:
+        print_and_log(f"  [오류] 이력 저장소 쓰기 오류 발생: {e}", level="ERROR")
 
-    # 이 time.sleep은 while True 루프의 마지막에, 가장 바깥쪽 'try-except' 블록의 외부(동일한 들여쓰기 레벨)에 위치해야 합니다.
-    time.sleep(API_CALL_INTERVAL_SECONDS)
+    # 전체 감시 모드에서는 모든 심볼이 대상이므로 승격하지 않고 점수(정밀 탐지 주기)만 씀
+    promoted_coins = []
+    scores = {}
+    try:
+        with stage_timer('market_scan'):
+            top_k = 0 if SHARD_WATCH_ALL_KRW or not SCAN_MODE_ENABLED else SCAN_TOP_K
+            promoted_coins, scan_result = scan_market(global_market_scanner, ticker_data['data'], current_epoch, FLUCTUATION_THRESHOLD_PERCENT, DEVIATION_THRESHOLD_PERCENT, target_coins, top_k, current_time_kst)
+            scores = dict(zip(scan_result.symbols, scan_result.score))
+    except Exception as e:
+        print_and_log(f"  [오류] 전체 시장 스캔 중 예상치 못한 오류: {e}", level="ERROR")
+        print_and_log(f"  상세: {traceback.format_exc()}", level="ERROR")
+        promoted_coins = []
+
+    with stage_timer('shard_dispatch'):
+        detail_coins = target_coins + promoted_coins
+        shard_ticks = [ShardTick(current_epoch, current_time_kst, {}, [], [], {}, {}) for _ in range(pool.shard_count)]
+        for coin_symbol in set(detail_coins) - assigned:
+            shard_ticks[pool.shard_of(coin_symbol)].backfill[coin_symbol] = global_market_scanner.history(coin_symbol)
+            assigned.add(coin_symbol)
+        for coin_symbol in assigned:
+            coin_info = market.get(coin_symbol, {})
+            shard_ticks[pool.shard_of(coin_symbol)].tickers[coin_symbol] = (coin_info.get('closing_price', 'N/A'), coin_info.get('fluctate_rate_24H', 'N/A'), coin_info.get('units_traded_24H', 'N/A'))
+        for coin_symbol in target_coins:
+            shard_ticks[pool.shard_of(coin_symbol)].target_coins.append(coin_symbol)
+        for coin_symbol in detail_coins:
+            shard_tick = shard_ticks[pool.shard_of(coin_symbol)]
+            shard_tick.detail_coins.append(coin_symbol)
+            if coin_symbol in scores:
+                shard_tick.scores[coin_symbol] = float(scores[coin_symbol])
+        for shard, shard_tick in enumerate(shard_ticks):
+            pool.send(shard, shard_tick)
+    return True
+
+# 코인 분할 모드의 메인 루프 (shard_count개의 작업 프로세스)
+# 요청 예산은 조정 프로세스의 티커 요청 몫을 뺀 나머지를 작업 프로세스가 똑같이 나눠 가집니다.
+# duration_seconds: 주면 그 시간만큼만 실행하고 처리량 통계를 반환 (벤치마크용, 없으면 오류가 날 때까지 실행)
+# 작업 프로세스를 띄우지 못하면 None
+def sharded_collection_loop(shard_count, duration_seconds=None):
+    global global_metrics_snapshot
+    history_store = open_history_store(HISTORY_STORE_DIR, LEGACY_CSV_FILE_PATH)
+    pool = ShardPool(shard_count)
+    worker_rate = max(API_REQUEST_RATE_LIMIT_PER_SECOND - 1.0 / TICKER_INTERVAL_SECONDS, 0.1) / shard_count
+    worker_burst = max(1, API_REQUEST_BURST // shard_count)
+    config = {name: value for name, value in globals().items() if name.isupper()}
+
+    print_and_log("--- 이상거래 탐지 시스템 가동 시작 (코인 분할 모드) ---")
+    print_and_log(f"작업 프로세스: {shard_count}개, 대상 코인: {'전체 KRW 심볼' if SHARD_WATCH_ALL_KRW else ', '.join(TARGET_COINS)}")
+    print_and_log(f"티커 주기: {TICKER_INTERVAL_SECONDS}초, 체결 내역/호가창 주기: {DETAIL_MIN_INTERVAL_SECONDS}~{DETAIL_MAX_INTERVAL_SECONDS}초 (변동성에 따라)")
+    print_and_log(f"요청 예산: 초당 {API_REQUEST_RATE_LIMIT_PER_SECOND}회 중 작업 프로세스마다 초당 {worker_rate:.2f}회 (최대 {worker_burst}회 연속)")
+    print_and_log(f"공유 데이터 파일: {os.path.abspath(SHARED_DATA_FILE)}")
+
+    assigned = set(TARGET_COINS) # 작업 프로세스가 시작할 때 이력 저장소에서 불러오는 코인
+    try:
+        pool.start([{
+            'config': config,
+            'log_file': SHARD_LOG_FILE_FORMAT.format(shard=shard),
+            'rate': worker_rate,
+            'burst': worker_burst,
+            'recording_dir': os.path.join(RESPONSE_RECORDING_DIR, f"shard{shard}"),
+            'initial_coins': [coin for coin in TARGET_COINS if pool.shard_of(coin) == shard],
+            'saved_walls': {coin: walls for coin, walls in global_saved_wall_state.items() if pool.shard_of(coin) == shard},
+        } for shard in range(shard_count)])
+    except RuntimeError as e:
+        print_and_log(f"[치명적 오류] {e}. 프로그램 종료", level="ERROR")
+        pool.stop()
+        return None
+
+    snapshot_region = open_snapshot_region()
+    observation_cost = measure_observation_cost()
+    print_and_log("-" * 50)
+
+    scheduler = JobScheduler(SCHEDULER_LATENESS_TOLERANCE_SECONDS)
+    scheduler.schedule(TICKER_JOB_KEY, JOB_TICKER, TICKER_INTERVAL_SECONDS, priority=0)
+    shard_metrics = {} # 작업 프로세스 번호 -> 마지막으로 받은 계측 사본
+    shard_totals = {shard: [0, 0] for shard in range(shard_count)} # 작업 프로세스 번호 -> [처리한 티커 수, 실행한 정밀 탐지 작업 수]
+    totals = {'ticks': 0, 'shard_ticks': 0, 'jobs': 0, 'events': 0}
+    started_at = last_stats_logged_at = last_published_at = scheduler.clock()
+    unpublished = False
+
+    try:
+        while duration_seconds is None or scheduler.clock() - started_at < duration_seconds:
+            dead = pool.dead_workers()
+            if dead:
+                print_and_log(f"  [치명적 오류] 작업 프로세스 {dead}가 종료되었습니다. 작업 프로세스 로그를 확인하세요. 프로그램 종료", level="ERROR")
+                break
+
+            ticker_job = next((job for job in admit_due_jobs(scheduler, http_client.rate_limiter) if job.kind == JOB_TICKER), None)
+            if ticker_job is not None:
+                cycle_started = time.perf_counter()
+                current_epoch = time.time()
+                current_time_kst = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(current_epoch))
+                print_and_log(f"\n--- [{current_time_kst}] 티커 수집 및 작업 프로세스 {shard_count}개로 분배 ---")
+                scheduler.complete(ticker_job, scheduler.clock())
+                try:
+                    with stage_timer('ticker_job'):
+                        if run_sharded_ticker_job(pool, history_store, assigned, current_epoch, current_time_kst):
+                            totals['ticks'] += 1
+                except requests.exceptions.RequestException as e:
+                    print_and_log(f"  [오류] 티커 API 요청 중 네트워크 예외 발생: {e}", level="ERROR")
+                    print_and_log("  네트워크 연결 상태를 확인하거나 잠시 후 다시 시도합니다.")
+                global_metrics_snapshot = merge_metrics_snapshots(collect_metrics(scheduler, http_client, observation_cost), shard_metrics, skip_names=('anomalies_total',))
+                record_cycle_time(cycle_started)
+                unpublished = True
+
+            # 다음 티커 시각(또는 발행 시각)까지 작업 프로세스 결과를 기다리며 받은 만큼 합침
+            next_due = scheduler.next_due()
+            wait_until = TICKER_INTERVAL_SECONDS + scheduler.clock() if next_due is None else next_due
+            if unpublished:
+                wait_until = min(wait_until, last_published_at + SHARD_PUBLISH_INTERVAL_SECONDS)
+            for result in pool.receive(min(wait_until - scheduler.clock(), TICKER_INTERVAL_SECONDS)):
+                merge_shard_result(result)
+                if result.metrics is not None:
+                    shard_metrics[result.shard] = result.metrics
+                shard_totals[result.shard][0] += result.ticks
+                shard_totals[result.shard][1] += result.jobs
+                totals['shard_ticks'] += result.ticks
+                totals['jobs'] += result.jobs
+                totals['events'] += len(result.events)
+                unpublished = True
+
+            if unpublished and scheduler.clock() - last_published_at >= SHARD_PUBLISH_INTERVAL_SECONDS:
+                with stage_timer('publish'):
+                    snapshot_region = publish_shared_data(snapshot_region)
+                last_published_at = scheduler.clock()
+                unpublished = False
+
+            if scheduler.clock() - last_stats_logged_at >= SCHEDULER_STATS_LOG_INTERVAL_SECONDS:
+                log_scheduler_stats(scheduler, http_client)
+                log_stage_stats()
+                for shard, (ticks, jobs) in sorted(shard_totals.items()):
+                    print_and_log(f"  작업 프로세스 {shard}: 티커 {ticks}회 반영, 정밀 탐지 작업 {jobs}개 실행")
+                last_stats_logged_at = scheduler.clock()
+    except Exception as e:
+        print_and_log(f"  [치명적 오류] 예상치 못한 오류 발생. 프로그램 종료: {e}", level="ERROR")
+        print_and_log(f"  상세: {traceback.format_exc()}", level="ERROR")
+    finally:
+        pool.stop()
+    totals['elapsed'] = scheduler.clock() - started_at
+    return totals
 
 # --- 메인 실행 흐름 ---
 if __name__ == "__main__":
-    # main 함수가 없으므로 직접 data_collection_loop를 호출
-    data_collection_loop()
+    # main 함수가 없으므로 공유 데이터를 불러온 뒤 직접 data_collection_loop를 호출
+    # (SHARD_WORKER_COUNT가 1 이상이면 코인 분할 모드로 실행)
+    load_shared_data(SHARED_DATA_FILE)
+    if SHARD_WORKER_COUNT > 0:
+        sharded_collection_loop(SHARD_WORKER_COUNT)
+    else:
+        data_collection_loop()
@@ -0,0 +1,90 @@
+# anomaly_events.py
+# 파트너, 이 모듈은 탐지된 이상 징후를 문자열 대신 구조화된 이벤트로 보관하기 위한 정의를 담고 있습니다.
+# 탐지 함수는 코인/탐지 종류/시각/수치 근거만 기록하고, 사람이 읽는 문장은
+# 로그 파일이나 웹 UI가 실제로 필요로 할 때 한 번만 만들어집니다.
+
+import time
+from dataclasses import dataclass, field
+
+# 탐지 종류 (웹 UI의 색상 구분, 필터링에 사용)
+DETECTOR_FLUCTUATION = 'fluctuation' # 24H 변동률 이상
+DETECTOR_TREND = 'trend' # 이동 평균 추세 이탈
+DETECTOR_WASH_TRADE = 'wash_trade' # 자전거래 의심
+DETECTOR_ORDER_WALL = 'order_wall' # 호가창 매물벽
+DETECTOR_PUMP_DUMP = 'pump_dump' # 펌프 앤 덤프 의심
+DETECTOR_SPOOFING = 'spoofing' # 스푸핑 의심
+
+_SIDE_NAMES = {'ask': '매도', 'bid': '매수'}
+
+# 탐지 종류별 알림 문장 (evidence의 값으로 채워짐)
+_MESSAGE_TEMPLATES = {
+    DETECTOR_FLUCTUATION: "[!!! 24H 변동률 이상 감지 !!!] {coin}: 24시간 변동률 = {fluctuate_rate:.2f}% (임계치 {threshold}%)",
+    DETECTOR_TREND: "경고: {coin}의 현재가가 이동 평균선에서 크게 벗어났습니다! (이탈률 {deviation_percent:.2f}%)",
+    DETECTOR_WASH_TRADE: "경고: {coin} 마켓에서 짧은 시간 내 유사 가격/수량의 매수/매도 패턴이 감지되었습니다!",
+    DETECTOR_ORDER_WALL: "경고: {coin} {side_name} 호가창에 비정상적인 대규모 매물벽이 감지되었습니다!",
+    DETECTOR_PUMP_DUMP: "경고: {coin}에서 짧은 시간 내 가격 급등 및 비정상적 거래량 폭증 패턴이 감지되었습니다!",
+    DETECTOR_SPOOFING: "경고: {coin} 호가창에 나타났던 대규모 벽이 가격 이동 없이 사라졌습니다! (스푸핑 의심)",
+}
+
+
+# 이상 징후 이벤트 한 건
+#   coin: 코인 심볼, detector: 탐지 종류(DETECTOR_*), timestamp: 감지 시각 (epoch 초)
+#   evidence: 수치 근거 (예: {'fluctuate_rate': 6.1, 'threshold': 5.0}), 호가벽은 'side'('ask'/'bid') 포함
+#   seq: 수집기가 부여하는 일련번호 (0이면 미지정)
+#   version: 이 이벤트가 처음 실린 공유 스냅샷 version (웹 UI의 증분 조회 기준, 0이면 미지정)
+@dataclass(slots=True)
+class AnomalyEvent:
+    coin: str
+    detector: str
+    timestamp: float
+    evidence: dict = field(default_factory=dict)
+    seq: int = 0
+    version: int = 0
+    _message: str = field(default=None, repr=False, compare=False) # 처음 필요할 때 만든 문장을 캐시
+
+    # 사람이 읽는 알림 문장 (처음 호출될 때 한 번만 만듦)
+    def message(self):
+        if self._message is None:
+            template = _MESSAGE_TEMPLATES.get(self.detector)
+            try:
+                side_name = _SIDE_NAMES.get(self.evidence.get('side'), '')
+                self._message = template.format(coin=self.coin, side_name=side_name, **self.evidence)
+            except (AttributeError, KeyError, ValueError):
+                self._message = f"경고: {self.coin} {self.detector} 이상 징후 감지 ({self.evidence})"
+        return self._message
+
+    # 웹 UI용 로그 형식: "YYYY-MM-DD HH:MM:SS - 문장"
+    def format(self):
+        return f"{format_event_time(self.timestamp)} - {self.message()}"
+
+    # 로그 파일 출력 형식 (기존 로그와 같은 들여쓰기). 비동기 로그 기록기가 쓰기 직전에 호출합니다.
+    def __str__(self):
+        return "  " + self.message()
+
+    # JSON 직렬화용 딕셔너리
+    def to_dict(self):
+        return {
+            'seq': self.seq,
+            'version': self.version,
+            'coin': self.coin,
+            'detector': self.detector,
+            'timestamp': self.timestamp,
+            'time': format_event_time(self.timestamp),
+            'message': self.message(),
+            'evidence': self.evidence,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            coin=data['coin'],
+            detector=data['detector'],
+            timestamp=float(data['timestamp']),
+            evidence=dict(data.get('evidence') or {}),
+            seq=int(data.get('seq', 0)),
+            version=int(data.get('version', 0)),
+        )
+
+
+def format_event_time(timestamp):
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(timestamp))
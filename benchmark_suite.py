@@ -0,0 +1,985 @@
+# benchmark_suite.py
+# 파트너, 이 스크립트는 이상거래 탐지 시스템의 성능 측정용 벤치마크 모음입니다.
+# 실제 빗썸 API 대신 로컬 모의(mock) 서버와 합성 데이터를 사용하므로 네트워크 없이 실행할 수 있습니다.
+#
+# 사용법:
+#   python benchmark_suite.py fetch            # 순차 요청 vs 동시 요청 주기 시간 비교
+#   python benchmark_suite.py wash             # 자전거래 쌍 탐색: 기존 이중 루프 vs 벡터화 (결과 동일성 검증 포함)
+#   python benchmark_suite.py logging          # 주기당 로그 출력 시간: 동기 print_and_log vs 비동기 로그 기록기
+#   python benchmark_suite.py scan             # 전체 시장 스캔: 심볼 수별 주기당 처리 시간 (코인별 이동 통계와 결과 동일성 검증 포함)
+#   python benchmark_suite.py serve            # /data 엔드포인트 처리량: 매 요청 파일 파싱 vs 응답 캐시 + ETag (동시 폴링 클라이언트)
+#   python benchmark_suite.py orderbook        # 호가창 매물벽 탐지: 기존 호가별 루프 vs 한 번 파싱한 스냅샷 + 깊이 지표 (결과 동일성 검증 포함)
+#   python benchmark_suite.py recorder         # 원본 응답 기록이 주기 시간에 주는 영향 + 압축률 (기록 파일 재확인 포함)
+#   python benchmark_suite.py metrics          # 단계별 계측(span, HTTP 요청 히스토그램)이 주기 시간에 주는 영향 (1% 기준 판정)
+#   python benchmark_suite.py shards           # 코인 분할 모드: 작업 프로세스 수별 정밀 탐지 작업 처리량 (전체 감시, 별도 프로세스 모의 서버)
+#   python benchmark_suite.py detectors        # 탐지 함수별 호출 시간/메모리 (크기별, 결과 JSON 저장 + 기준 결과와 비교)
+
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import requests
+
+import anomaly_detection_system as ads
+from bithumb_client import BithumbClient
+from log_writer import AsyncLogWriter
+from market_scanner import MarketScanner
+from market_state import CoinState, RollingStats
+from metrics import MetricsRegistry, measure_observation_cost
+from order_book import OrderBookSnapshot
+from response_recorder import ResponseRecorder, iter_recordings
+from trade_tape import TradeSnapshot, TradeTape, find_wash_trade_pairs
+from wall_tracker import WallTracker
+
+
+# --- 로컬 모의 빗썸 서버 ---
+
+# 모든 요청에 latency_seconds만큼 지연을 준 뒤 빗썸과 같은 형태의 JSON을 돌려주는 핸들러
+class MockBithumbHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # keep-alive 지원
+    latency_seconds = 0.02
+    coins = []
+
+    def do_GET(self):
+        time.sleep(self.latency_seconds)
+        path = self.path.split('?', 1)[0]
+        if path.endswith('/ticker/ALL_KRW'):
+            data = {coin: {'closing_price': '1000', 'fluctate_rate_24H': '0.5', 'units_traded_24H': '12345.6'} for coin in self.coins}
+        elif '/transaction_history/' in path:
+            data = [{'transaction_date': '2026-01-01 00:00:00', 'type': 'bid' if i % 2 else 'ask',
+                     'units_traded': '1.0', 'price': str(1000 + i), 'total': '1000'} for i in range(50)]
+        elif '/orderbook/' in path:
+            data = {'asks': [{'price': str(1001 + i), 'quantity': '3.0'} for i in range(10)],
+                    'bids': [{'price': str(999 - i), 'quantity': '3.0'} for i in range(10)]}
+        else:
+            self.send_error(404)
+            return
+        body = json.dumps({'status': '0000', 'data': data}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass # 요청마다 콘솔에 찍히지 않도록 무시
+
+
+# 백그라운드 스레드에서 모의 서버를 띄우고 (server, base_url)을 반환
+def start_mock_server(coins, latency_seconds):
+    handler = type('Handler', (MockBithumbHandler,), {'coins': coins, 'latency_seconds': latency_seconds})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/public"
+
+
+# --- fetch: 한 주기 HTTP 요청 시간 ---
+
+# 기존 방식: 티커 1회 + 코인마다 체결 내역(자전거래), 호가창, 체결 내역(펌프)을 순서대로 bare requests.get으로 요청
+def run_sequential_cycle(base_url, coins):
+    requests.get(base_url + "/ticker/ALL_KRW", timeout=10).json()
+    for coin in coins:
+        requests.get(base_url + f"/transaction_history/{coin}_KRW", params={'count': 50}, timeout=10).json()
+    for coin in coins:
+        requests.get(base_url + f"/orderbook/{coin}_KRW", params={'count': 10}, timeout=10).json()
+    for coin in coins:
+        requests.get(base_url + f"/transaction_history/{coin}_KRW", params={'count': 50}, timeout=10).json()
+
+
+# 새 방식: 티커 1회 후 코인별 요청을 공용 커넥션 풀로 동시에 발송 (같은 요청은 한 번만)
+def run_concurrent_cycle(client, coins):
+    client.get("/ticker/ALL_KRW").json()
+    batch = client.start_batch()
+    futures = []
+    for coin in coins:
+        futures.append(batch.submit(f"/transaction_history/{coin}_KRW", {'count': 50}))
+        futures.append(batch.submit(f"/orderbook/{coin}_KRW", {'count': 10}))
+        futures.append(batch.submit(f"/transaction_history/{coin}_KRW", {'count': 50}))
+    for future in futures:
+        future.result().json()
+
+
+def bench_fetch(args):
+    print(f"모의 서버 지연 {args.latency_ms}ms, 동시 요청 {args.concurrency}개, 반복 {args.repeat}회")
+    print(f"{'코인 수':>8} {'순차(초)':>10} {'동시(초)':>10} {'배속':>6}")
+    for coin_count in args.coins:
+        coins = [f"C{i:03d}" for i in range(coin_count)]
+        server, base_url = start_mock_server(coins, args.latency_ms / 1000)
+        client = BithumbClient(base_url, args.concurrency, (3.05, 10))
+        try:
+            run_concurrent_cycle(client, coins) # 커넥션 풀 워밍업
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                run_sequential_cycle(base_url, coins)
+            sequential = (time.perf_counter() - start) / args.repeat
+
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                run_concurrent_cycle(client, coins)
+            concurrent = (time.perf_counter() - start) / args.repeat
+        finally:
+            client.close()
+            server.shutdown()
+        print(f"{coin_count:>8} {sequential:>10.3f} {concurrent:>10.3f} {sequential / concurrent:>5.1f}x")
+
+
+# --- recorder: 원본 응답 기록의 비용 ---
+
+# 같은 모의 서버에 기록기 없는 클라이언트와 있는 클라이언트로 동시 요청 주기를 번갈아 돌려 평균 주기 시간을 비교하고,
+# 탐지 루프 쪽 비용인 record() 호출 시간과 압축률을 함께 출력합니다. 끝나면 기록 파일을 스트림 리더로 다시 읽어 확인합니다.
+def bench_recorder(args):
+    coins = [f"C{i:03d}" for i in range(args.coins)]
+    server, base_url = start_mock_server(coins, args.latency_ms / 1000)
+    with tempfile.TemporaryDirectory() as directory:
+        recorder = ResponseRecorder(directory)
+        plain_client = BithumbClient(base_url, args.concurrency, (3.05, 10))
+        recording_client = BithumbClient(base_url, args.concurrency, (3.05, 10), recorder=recorder)
+        try:
+            run_concurrent_cycle(plain_client, coins) # 커넥션 풀 워밍업
+            run_concurrent_cycle(recording_client, coins)
+            plain_times, recording_times = [], []
+            for _ in range(args.repeat):
+                for client, times in ((plain_client, plain_times), (recording_client, recording_times)):
+                    start = time.perf_counter()
+                    run_concurrent_cycle(client, coins)
+                    times.append(time.perf_counter() - start)
+        finally:
+            plain_client.close()
+            recording_client.close()
+            server.shutdown()
+
+        # 탐지 루프 쪽 비용: 호가창 크기 본문 하나를 큐에 넣는 시간 (큐가 넘치지 않도록 나누어 측정)
+        body = json.dumps({'status': '0000', 'data': generate_order_book(30)}).encode('utf-8')
+        record_seconds = 0.0
+        for _ in range(args.record_calls // 1000):
+            start = time.perf_counter()
+            for _ in range(1000):
+                recorder.record("/orderbook/C000_KRW", {'count': 30}, time.time(), 0.01, 200, body)
+            record_seconds += time.perf_counter() - start
+            while recorder._queue.qsize() > 0:
+                time.sleep(0.01)
+        recorder.close()
+        read_back = sum(1 for _ in iter_recordings(directory))
+
+    plain, recording = np.median(plain_times), np.median(recording_times)
+    print(f"코인 {args.coins}개, 모의 서버 지연 {args.latency_ms}ms, 동시 요청 {args.concurrency}개, 반복 {args.repeat}회 (중앙값)")
+    print(f"  주기 시간: 기록 없음 {plain * 1000:.2f}ms, 기록 {recording * 1000:.2f}ms ({(recording / plain - 1) * 100:+.1f}%)")
+    print(f"  record() 호출: {record_seconds / max(args.record_calls // 1000 * 1000, 1) * 1e6:.2f}us/회 (본문 {len(body)}바이트)")
+    print(f"  기록 {recorder.recorded}개 (버림 {recorder.dropped}개), 압축 {recorder.raw_bytes / 1e6:.2f}MB -> {recorder.compressed_bytes / 1e6:.2f}MB "
+          f"({recorder.raw_bytes / max(recorder.compressed_bytes, 1):.1f}배)")
+    print(f"  재확인: 기록 파일에서 {read_back}개 읽음 ({'일치' if read_back == recorder.recorded else '불일치!'})")
+
+
+# --- metrics: 단계별 계측의 비용 ---
+
+# 계측을 끈 상태를 흉내 내는 레지스트리 (span은 아무것도 재지 않음)
+class NullMetricsRegistry:
+    observations = 0
+
+    def span(self, name, **labels):
+        return contextlib.nullcontext()
+
+    def observe(self, name, value, **labels):
+        pass
+
+    def increment(self, name, amount=1, **labels):
+        pass
+
+
+# 수집 루프의 정밀 탐지 반복 하나: 코인별 체결 내역/호가창을 동시에 받아 실제 작업 함수(run_trades_job/run_orderbook_job)로 탐지
+def run_detail_cycle(coins, epoch):
+    timestamp = datetime.fromtimestamp(epoch).strftime('%Y-%m-%d %H:%M:%S')
+    batch = ads.http_client.start_batch()
+    futures = [(coin, batch.submit(f"/transaction_history/{coin}_KRW", {'count': 50}), batch.submit(f"/orderbook/{coin}_KRW", {'count': 10}))
+               for coin in coins]
+    for coin, trades_future, order_book_future in futures:
+        ads.run_trades_job(coin, trades_future, timestamp)
+        ads.run_orderbook_job(coin, order_book_future, epoch, timestamp)
+
+
+# 같은 모의 서버로 계측 없는 반복과 계측하는 반복(단계 span + HTTP 요청 히스토그램)을 번갈아 돌려 주기 시간을 비교하고,
+# 기록 하나의 비용 x 주기당 기록 수로 계측 비용 비율을 추정합니다. (주기 시간 차이는 네트워크 지연의 흔들림에 묻히기 쉬워 판정은 추정치로 함)
+def bench_metrics(args):
+    coins = [f"C{i:03d}" for i in range(args.coins)]
+    server, base_url = start_mock_server(coins, args.latency_ms / 1000)
+    registry = MetricsRegistry()
+    null_registry = NullMetricsRegistry()
+    plain_client = BithumbClient(base_url, args.concurrency, (3.05, 10))
+    instrumented_client = BithumbClient(base_url, args.concurrency, (3.05, 10), metrics=registry)
+
+    original = (ads.global_metrics, ads.http_client, ads.print_and_log)
+    ads.print_and_log = lambda message, file_path=None, level="INFO": None
+    for coin in coins:
+        ads.global_coin_states[coin] = CoinState(coin, ads.IN_MEMORY_HISTORY_LENGTH, ads.MOVING_AVERAGE_WINDOW, ads.TRADE_TAPE_CAPACITY)
+        ads.global_latest_ticker[coin] = {'closing_price': '1000', 'units_traded_24H': '12345.6'}
+    plain_times, instrumented_times = [], []
+    try:
+        epoch = time.time()
+        for metrics, client, times in ((null_registry, plain_client, None), (registry, instrumented_client, None)) * 2 + \
+                                      ((null_registry, plain_client, plain_times), (registry, instrumented_client, instrumented_times)) * args.repeat:
+            ads.global_metrics, ads.http_client = metrics, client
+            epoch += 5
+            start = time.perf_counter()
+            with ads.stage_timer('cycle'):
+                run_detail_cycle(coins, epoch)
+            if times is not None: # 처음 두 쌍은 커넥션 풀 워밍업
+                times.append(time.perf_counter() - start)
+    finally:
+        ads.global_metrics, ads.http_client, ads.print_and_log = original
+        plain_client.close()
+        instrumented_client.close()
+        server.shutdown()
+
+    observation_cost = measure_observation_cost()
+    observations_per_cycle = registry.observations / (args.repeat + 2)
+    plain, instrumented = np.median(plain_times), np.median(instrumented_times)
+    overhead_ratio = observations_per_cycle * observation_cost / instrumented
+    print(f"코인 {args.coins}개 (체결 내역 + 호가창), 모의 서버 지연 {args.latency_ms}ms, 동시 요청 {args.concurrency}개, 반복 {args.repeat}회 (중앙값)")
+    print(f"  주기 시간: 계측 없음 {plain * 1000:.2f}ms, 계측 {instrumented * 1000:.2f}ms ({(instrumented / plain - 1) * 100:+.2f}%, 네트워크 지연 흔들림 포함)")
+    print(f"  기록 하나 {observation_cost * 1e6:.2f}us x 주기당 {observations_per_cycle:.0f}개 = {observations_per_cycle * observation_cost * 1e6:.0f}us "
+          f"-> 주기 시간의 {overhead_ratio * 100:.3f}%")
+    if overhead_ratio > args.max_overhead:
+        raise SystemExit(f"[실패] 계측 비용 {overhead_ratio * 100:.3f}%가 기준 {args.max_overhead * 100:.1f}%를 넘습니다.")
+    print(f"  [통과] 기준 {args.max_overhead * 100:.1f}% 이내")
+
+
+# --- shards: 코인 분할 모드 처리량 ---
+
+# 모의 서버를 별도 프로세스에서 실행 (서버 스레드가 조정 프로세스와 같은 GIL을 다투지 않도록)
+def _serve_mock_market(coins, latency_seconds, url_queue):
+    server, base_url = start_mock_server(coins, latency_seconds)
+    url_queue.put(base_url)
+    threading.Event().wait()
+
+
+# 전체 감시 모드(SHARD_WATCH_ALL_KRW)로 작업 프로세스 수별 정밀 탐지 작업 처리량 비교
+# 정밀 탐지 주기를 짧게 잡아 수요(코인 수 x 2 / 주기)가 처리 능력을 넘게 하고, 요청 예산은 병목이 되지 않게 크게 잡습니다.
+def bench_shards(args):
+    context = multiprocessing.get_context('spawn')
+    url_queue = context.Queue()
+    coins = [f"C{i:03d}" for i in range(args.coins)]
+    server_process = context.Process(target=_serve_mock_market, args=(coins, args.latency_ms / 1000, url_queue), daemon=True)
+    server_process.start()
+    base_url = url_queue.get(timeout=60)
+
+    demand = args.coins * len(ads.DETAIL_JOB_KINDS) / args.detail_interval
+    print(f"CPU 코어 {os.cpu_count()}개, 코인 {args.coins}개 전체 감시, 모의 서버 지연 {args.latency_ms}ms, 실행 {args.duration}초씩")
+    print(f"티커 주기 {args.interval}초, 정밀 탐지 주기 {args.detail_interval}초 (수요: 초당 {demand:.0f}개)")
+    if (os.cpu_count() or 1) < max(args.workers) + 1:
+        print(f"  (코어가 작업 프로세스 수 + 1보다 적으면 처리량이 작업 프로세스 수에 비례해 늘지 않습니다)")
+    print(f"{'작업 프로세스':>12} {'작업/초':>10} {'배속':>6} {'티커 반영':>10} {'이벤트':>8}")
+
+    overrides = {
+        'BASE_URL': base_url, 'SHARD_WATCH_ALL_KRW': True, 'CONSOLE_LOG_LEVEL': "ERROR",
+        'TICKER_INTERVAL_SECONDS': args.interval, 'DETAIL_MIN_INTERVAL_SECONDS': args.detail_interval, 'DETAIL_MAX_INTERVAL_SECONDS': args.detail_interval,
+        'API_REQUEST_RATE_LIMIT_PER_SECOND': 100000, 'API_REQUEST_BURST': 100000, 'SCHEDULER_STATS_LOG_INTERVAL_SECONDS': args.duration * 2,
+    }
+    saved_names = list(overrides) + ['http_client', 'global_metrics', 'global_market_scanner', 'global_coin_data_history', 'global_current_summary']
+    original = {name: getattr(ads, name) for name in saved_names}
+    original_cwd = os.getcwd()
+    baseline = None
+    try:
+        for worker_count in args.workers:
+            with tempfile.TemporaryDirectory() as run_dir:
+                os.chdir(run_dir)
+                for name, value in overrides.items():
+                    setattr(ads, name, value)
+                ads.global_metrics = MetricsRegistry()
+                ads.http_client = ads.make_http_client(ads.API_REQUEST_RATE_LIMIT_PER_SECOND, ads.API_REQUEST_BURST)
+                ads.global_market_scanner = MarketScanner(ads.IN_MEMORY_HISTORY_LENGTH, ads.MOVING_AVERAGE_WINDOW)
+                ads.global_coin_data_history = {coin: [] for coin in ads.TARGET_COINS}
+                ads.global_current_summary = {coin: {} for coin in ads.TARGET_COINS}
+                ads.global_anomaly_events.clear()
+                try:
+                    totals = ads.sharded_collection_loop(worker_count, duration_seconds=args.duration)
+                finally:
+                    ads.http_client.close()
+                    for writer in ads._log_writers.values():
+                        writer.close()
+                    ads._log_writers.clear()
+                    os.chdir(original_cwd)
+            if totals is None:
+                raise SystemExit(f"[실패] 작업 프로세스 {worker_count}개를 띄우지 못했습니다.")
+            jobs_per_second = totals['jobs'] / totals['elapsed']
+            baseline = baseline or jobs_per_second
+            print(f"{worker_count:>12} {jobs_per_second:>10.1f} {jobs_per_second / baseline:>5.2f}x "
+                  f"{totals['shard_ticks']:>5}/{totals['ticks'] * worker_count:<4} {totals['events']:>8}")
+    finally:
+        for name, value in original.items():
+            setattr(ads, name, value)
+        server_process.terminate()
+
+
+# --- 합성 데이터 생성기 ---
+
+# 빗썸 /transaction_history 'data' 형식의 합성 체결 내역 생성 (시간순)
+# wash_ratio 비율만큼 직전 체결과 반대 방향/유사 가격/동일 수량의 체결을 끼워 넣어 자전거래 쌍을 만듭니다.
+def generate_trade_history(count, seed=0, wash_ratio=0.05, mean_gap_ms=300, start_epoch=1767225600.0):
+    rng = random.Random(seed)
+    trades = []
+    now_ms = int(start_epoch * 1000)
+    price = 1000.0
+    for _ in range(count):
+        if trades and rng.random() < wash_ratio:
+            previous = trades[-1]
+            now_ms += rng.randint(0, 1500)
+            side = 'ask' if previous['type'] == 'bid' else 'bid'
+            trade_price = float(previous['price']) * (1 + rng.uniform(-0.0004, 0.0004))
+            quantity = previous['units_traded']
+        else:
+            now_ms += int(rng.expovariate(1 / mean_gap_ms))
+            price = max(0.1, price + rng.choice((-0.1, 0.0, 0.1)))
+            side = rng.choice(('bid', 'ask'))
+            trade_price = price if rng.random() > 0.001 else 0.0 # 드물게 가격 0 (예외 경로 확인용)
+            quantity = f"{rng.choice((0.0, 0.5, 1.0, 1.5, 2.0, 10.0)) + rng.randint(0, 3) * 0.0001:.4f}"
+        transaction_date = datetime.fromtimestamp(now_ms / 1000).strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
+        trades.append({'transaction_date': transaction_date, 'type': side, 'units_traded': quantity,
+                       'price': f"{trade_price:.4f}", 'total': '0'})
+    return trades
+
+
+# --- wash: 자전거래 쌍 탐색 ---
+
+# 기존 detect_wash_trading의 이중 루프 로직 (비교 기준용 참조 구현). (i, j) 쌍 목록을 반환합니다.
+def reference_wash_trade_pairs(trades_raw, time_window_seconds, price_tolerance_percent, quantity_tolerance_percent):
+    trades_processed = []
+    for trade in trades_raw:
+        try:
+            trade_datetime = datetime.strptime(trade['transaction_date'], '%Y-%m-%d %H:%M:%S.%f')
+        except ValueError:
+            trade_datetime = datetime.strptime(trade['transaction_date'], '%Y-%m-%d %H:%M:%S')
+        trades_processed.append({'datetime_obj': trade_datetime, 'type': trade['type'],
+                                 'units_traded_float': float(trade['units_traded']), 'price_float': float(trade['price'])})
+    trades_processed.sort(key=lambda x: x['datetime_obj'])
+
+    pairs = []
+    for i in range(len(trades_processed)):
+        trade1 = trades_processed[i]
+        for j in range(i + 1, len(trades_processed)):
+            trade2 = trades_processed[j]
+            time_diff = (trade2['datetime_obj'] - trade1['datetime_obj']).total_seconds()
+            if time_diff > time_window_seconds:
+                break
+            if (trade1['type'] == 'bid' and trade2['type'] == 'ask') or (trade1['type'] == 'ask' and trade2['type'] == 'bid'):
+                if trade1['price_float'] == 0: continue
+                price_diff_percent = abs((trade1['price_float'] - trade2['price_float']) / trade1['price_float']) * 100
+                if price_diff_percent <= price_tolerance_percent:
+                    if trade1['units_traded_float'] == 0: continue
+                    quantity_diff_percent = abs((trade1['units_traded_float'] - trade2['units_traded_float']) / trade1['units_traded_float']) * 100
+                    if quantity_diff_percent <= quantity_tolerance_percent:
+                        pairs.append((i, j))
+    return pairs
+
+
+def bench_wash(args):
+    thresholds = (args.window, args.price_tolerance, args.quantity_tolerance)
+    print(f"시간 창 {args.window}초, 가격 허용 {args.price_tolerance}%, 수량 허용 {args.quantity_tolerance}%")
+    print(f"{'체결 수':>8} {'쌍 수':>6} {'이중 루프(ms)':>14} {'벡터화(ms)':>11} {'배속':>7}")
+    for count in args.sizes:
+        trades_raw = generate_trade_history(count, seed=args.seed)
+
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            expected = reference_wash_trade_pairs(trades_raw, *thresholds)
+        reference_ms = (time.perf_counter() - start) / args.repeat * 1000
+
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            snapshot, _errors = TradeSnapshot.from_api(trades_raw)
+            pairs = find_wash_trade_pairs(snapshot, *thresholds)
+        vectorized_ms = (time.perf_counter() - start) / args.repeat * 1000
+
+        # 동일성 검증: 두 구현이 같은 순서로 같은 쌍을 찾아야 합니다.
+        actual = list(zip(pairs.first.tolist(), pairs.second.tolist()))
+        if actual != expected:
+            raise SystemExit(f"[실패] 체결 {count}개: 벡터화 결과({len(actual)}쌍)가 기존 로직({len(expected)}쌍)과 다릅니다.")
+        print(f"{count:>8} {len(actual):>6} {reference_ms:>14.2f} {vectorized_ms:>11.2f} {reference_ms / vectorized_ms:>6.1f}x")
+
+
+# --- logging: 주기당 로그 출력 시간 ---
+
+# 기존 print_and_log 방식: 메시지마다 콘솔 출력 + 로그 파일 열기/쓰기/flush/닫기
+def synchronous_print_and_log(message, file_path):
+    print(message)
+    with open(file_path, 'a', encoding='utf-8') as f:
+        f.write(message + "\n")
+        f.flush()
+
+
+def bench_logging(args):
+    message = "  BTC: 자전거래 의심 패턴 감지되지 않음." # 한 줄 길이가 비슷한 대표 메시지
+    with tempfile.TemporaryDirectory() as temp_dir, open(os.devnull, 'w') as devnull:
+        log_path = os.path.join(temp_dir, "bench.log")
+
+        # 콘솔 출력은 /dev/null로 보내 터미널 속도의 영향을 없앱니다.
+        with contextlib.redirect_stdout(devnull):
+            start = time.perf_counter()
+            for _ in range(args.cycles):
+                for _ in range(args.messages):
+                    synchronous_print_and_log(message, log_path)
+            synchronous = (time.perf_counter() - start) / args.cycles
+
+        writer = AsyncLogWriter(log_path, console_stream=devnull)
+        start = time.perf_counter()
+        for _ in range(args.cycles):
+            for _ in range(args.messages):
+                writer.write(message)
+        asynchronous = (time.perf_counter() - start) / args.cycles
+        writer.close()
+
+    print(f"주기당 메시지 {args.messages}개, {args.cycles}주기 평균")
+    print(f"  동기 print_and_log : {synchronous * 1000:8.3f} ms/주기")
+    print(f"  비동기 로그 기록기 : {asynchronous * 1000:8.3f} ms/주기 ({synchronous / asynchronous:.1f}x)")
+
+
+# --- scan: 전체 시장 스캔 ---
+
+# ALL_KRW 티커 응답의 'data'와 같은 형태의 합성 데이터를 주기마다 생성 (가격 랜덤 워크 + 가끔 급등락, 일부 심볼 누락)
+def generate_all_krw_tickers(symbol_count, cycles, seed=0):
+    rng = random.Random(seed)
+    symbols = [f"C{i:04d}" for i in range(symbol_count)]
+    prices = {symbol: rng.uniform(1, 1000000) for symbol in symbols}
+    for _ in range(cycles):
+        data = {}
+        for symbol in symbols:
+            if rng.random() < 0.01:
+                continue # 응답에서 빠진 심볼
+            prices[symbol] *= 1 + rng.gauss(0, 0.002) + (rng.choice([-0.03, 0.03]) if rng.random() < 0.005 else 0)
+            data[symbol] = {
+                'closing_price': f"{prices[symbol]:.4f}",
+                'fluctate_rate_24H': f"{rng.gauss(0, 3):.2f}",
+                'units_traded_24H': f"{rng.uniform(1000, 1000000):.4f}",
+            }
+        data['date'] = str(int(time.time() * 1000)) # 실제 응답처럼 심볼이 아닌 항목 포함
+        yield data
+
+
+def bench_scan(args):
+    print(f"{'심볼 수':>8} {'주기':>6} {'ms/주기':>10} {'최대 ms':>10} {'이상 심볼':>10} {'주기 대비':>10}")
+    for symbol_count in args.symbols:
+        scanner = MarketScanner(args.capacity, args.ma_window)
+        reference = {} # 심볼별 RollingStats (대상 코인 분석 경로와 같은 이동 평균)
+        timings = []
+        result = None
+        for cycle, data in enumerate(generate_all_krw_tickers(symbol_count, args.cycles, args.seed)):
+            start = time.perf_counter()
+            scanner.update(data, float(cycle))
+            result = scanner.scan(args.fluctuation_threshold, args.deviation_threshold)
+            MarketScanner.top_flagged(result, args.top_k)
+            timings.append(time.perf_counter() - start)
+
+            for symbol in scanner.symbols:
+                info = data.get(symbol)
+                reference.setdefault(symbol, RollingStats(args.ma_window)).update(info['closing_price'] if info else None)
+
+        # 마지막 주기의 이탈률을 코인별 이동 통계 결과와 비교
+        for i, symbol in enumerate(result.symbols):
+            expected = reference[symbol].deviation_percent()
+            actual = result.deviation_percent[i]
+            if not (np.isnan(expected) and np.isnan(actual)) and not np.isclose(expected, actual, rtol=1e-9, atol=1e-9):
+                raise SystemExit(f"[실패] {symbol}: 스캐너 이탈률 {actual} != 이동 통계 {expected}")
+
+        mean_ms = sum(timings) / len(timings) * 1000
+        print(f"{symbol_count:>8} {args.cycles:>6} {mean_ms:>10.3f} {max(timings) * 1000:>10.3f} "
+              f"{int(result.flagged.sum()):>10} {mean_ms / (args.interval * 1000) * 100:>9.3f}%")
+
+
+# --- serve: /data 엔드포인트 처리량 ---
+
+# 웹 UI가 받는 것과 같은 형태의 공유 데이터 (코인별 이력 60개 + 이상 징후 이벤트 100개)
+def generate_shared_data(coins, history_length=60, event_count=100, seed=0):
+    rng = random.Random(seed)
+    now = time.time()
+    history = {}
+    for coin in coins:
+        price = rng.uniform(100, 100000000)
+        points = []
+        for i in range(history_length):
+            price *= 1 + rng.gauss(0, 0.001)
+            points.append({
+                'timestamp': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(now - (history_length - i) * 5)),
+                'closing_price': f"{price:.2f}",
+                'fluctate_rate_24H': f"{rng.uniform(-10, 10):.2f}",
+                'units_traded_24H': f"{rng.uniform(1000, 1000000):.4f}",
+            })
+        history[coin] = points
+    events = [{
+        'seq': i + 1,
+        'coin': rng.choice(coins),
+        'detector': 'order_wall',
+        'timestamp': now - (event_count - i),
+        'time': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(now - (event_count - i))),
+        'message': "경고: 매도 호가창에 비정상적인 대규모 매물벽이 감지되었습니다!",
+        'evidence': {'side': 'ask', 'price': 1.0, 'quantity': 2.0},
+    } for i in range(event_count)]
+    return {
+        'version': 1,
+        'history': history,
+        'anomaly_events': events,
+        'current_summary': {coin: points[-1] for coin, points in history.items()},
+    }
+
+
+# 폴링 클라이언트 clients개가 duration초 동안 path를 반복 요청. 브라우저처럼 직전 ETag로 조건부 요청을 보냄
+def run_pollers(app, path, clients, duration):
+    counts = [0] * clients
+    stop_at = time.perf_counter() + duration
+    start_barrier = threading.Barrier(clients)
+
+    def poll(index):
+        client = app.test_client()
+        etag = None
+        start_barrier.wait()
+        while time.perf_counter() < stop_at:
+            headers = {'Accept-Encoding': 'gzip'}
+            if etag:
+                headers['If-None-Match'] = etag
+            response = client.get(path, headers=headers)
+            if response.status_code not in (200, 304):
+                raise RuntimeError(f"{path} 응답 코드 {response.status_code}")
+            etag = response.headers.get('ETag')
+            counts[index] += 1
+
+    threads = [threading.Thread(target=poll, args=(i,)) for i in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(counts) / (time.perf_counter() - start)
+
+
+def bench_serve(args):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        previous_dir = os.getcwd()
+        os.chdir(temp_dir)
+        try:
+            import serve_web
+            from flask import jsonify
+
+            with open(serve_web.SHARED_DATA_FILE, 'w', encoding='utf-8') as f:
+                json.dump(generate_shared_data(['BTC', 'ETH', 'DOGE']), f, ensure_ascii=False)
+
+            # 기존 방식: 요청마다 파일을 열어 json.load 후 jsonify로 다시 직렬화
+            def legacy_get_data():
+                with open(serve_web.SHARED_DATA_FILE, 'r', encoding='utf-8') as f:
+                    return jsonify(json.load(f))
+            serve_web.app.add_url_rule('/data_legacy', 'data_legacy', legacy_get_data)
+
+            legacy_rps = run_pollers(serve_web.app, '/data_legacy', args.clients, args.duration)
+            cached_rps = run_pollers(serve_web.app, '/data', args.clients, args.duration)
+        finally:
+            os.chdir(previous_dir)
+
+    print(f"동시 폴링 클라이언트 {args.clients}개, {args.duration}초 (Flask 테스트 클라이언트)")
+    print(f"  매 요청 파일 파싱 + jsonify : {legacy_rps:10.1f} req/s")
+    print(f"  응답 캐시 + ETag/gzip      : {cached_rps:10.1f} req/s ({cached_rps / legacy_rps:.1f}x)")
+
+
+# --- orderbook: 호가창 매물벽 탐지 ---
+
+# /orderbook 응답의 'data'와 같은 형태의 합성 호가창 (최우선 호가에서 멀어질수록 가격 간격 일정, 가끔 큰 수량의 벽)
+# walls_per_side > 0이면 쪽마다 그 수만큼의 호가를 고르게 골라 벽 수량(1000~5000)을 심습니다. (얕은 호가창에서도 벽이 있도록)
+def generate_order_book(depth, closing_price=100000.0, tick=10.0, wall_ratio=0.05, walls_per_side=0, seed=0):
+    rng = random.Random(seed)
+    planted = {int((k + 1) * depth / (walls_per_side + 1)) for k in range(walls_per_side)}
+    def level(i, price):
+        quantity = rng.uniform(0.1, 50) * (rng.uniform(20, 100) if rng.random() < wall_ratio else 1)
+        if i in planted:
+            quantity = rng.uniform(1000, 5000)
+        return {'price': f"{price:.1f}", 'quantity': f"{quantity:.4f}"}
+    return {
+        'timestamp': str(int(time.time() * 1000)),
+        'order_currency': 'BTC', 'payment_currency': 'KRW',
+        'asks': [level(i, closing_price + tick * (i + 1)) for i in range(depth)],
+        'bids': [level(i, closing_price - tick * (i + 1)) for i in range(depth)],
+    }
+
+
+# 로그 정규 분포 랜덤 워크 가격 배열 (volatility: 한 칸당 수익률 표준편차)
+# pump_length > 0이면 마지막 pump_length칸 동안 가격이 pump_percent %만큼 꾸준히 오르도록 더합니다.
+def generate_price_walk(length, start_price=1000.0, volatility=0.002, pump_length=0, pump_percent=0.0, seed=0):
+    rng = np.random.default_rng(seed)
+    returns = rng.normal(0, volatility, length)
+    if pump_length > 0:
+        returns[-pump_length:] += np.log1p(pump_percent / 100) / pump_length
+    return start_price * np.exp(np.cumsum(returns))
+
+
+# 호가창 조회 steps번 동안 감지될 벽 목록 생성 (WallTracker.update 입력 형식)
+# wall_count개 가격대에 벽을 세워 두고, 조회마다 pull_ratio 확률로 벽을 거뒀다가 다음 조회에 같은 가격대에 다시 세웁니다.
+# (세웠다 거두기를 반복하는 스푸핑 패턴) 벽 수량은 세울 때 정하고 서 있는 동안은 그대로 둡니다.
+def generate_wall_sequence(steps, wall_count, closing_price=100000.0, pull_ratio=0.2, seed=0):
+    rng = random.Random(seed)
+    walls = []
+    for i in range(wall_count):
+        side = 'ask' if i % 2 else 'bid'
+        distance = 0.01 * (i // 2 + 1) # 벽마다 1%씩 다른 가격대
+        price = closing_price * (1 + distance if side == 'ask' else 1 - distance)
+        walls.append((side, round(price, 1)))
+    sequence = []
+    pulled = set()
+    quantities = {}
+    for step in range(steps):
+        timestamp = datetime.fromtimestamp(1767225600 + step * 5).strftime('%Y-%m-%d %H:%M:%S')
+        pulled = {i for i in range(wall_count) if i not in pulled and rng.random() < pull_ratio}
+        for i in range(wall_count):
+            if i in pulled:
+                quantities.pop(i, None)
+            elif i not in quantities:
+                quantities[i] = rng.uniform(500, 5000)
+        sequence.append([{'price': price, 'quantity': quantities[i], 'type': side, 'timestamp': timestamp}
+                         for i, (side, price) in enumerate(walls) if i not in pulled])
+    return sequence
+
+
+# 기존 detect_order_book_wall_anomaly의 매도/매수 호가별 루프 (로그 출력 제외, 비교 기준용 참조 구현)
+# (쪽, 호가, 수량) 목록을 반환합니다.
+def reference_order_book_walls(order_book_data, closing_price, price_distance_percent, threshold_volume):
+    walls = []
+    for side, levels in (('ask', order_book_data['asks']), ('bid', order_book_data['bids'])):
+        for level in levels:
+            try:
+                price = float(level['price'])
+                quantity = float(level['quantity'])
+                if closing_price == 0: continue
+                price_deviation = abs((price - closing_price) / closing_price) * 100
+                if price_deviation >= price_distance_percent and quantity >= threshold_volume:
+                    walls.append((side, price, quantity))
+            except (ValueError, KeyError):
+                continue
+    return walls
+
+
+# 현재 구현: OrderBookSnapshot.from_api로 한 번 파싱한 뒤 쪽마다 find_walls (깊이 지표는 같은 스냅샷으로 따로 계산)
+# 호가 간격은 호가창 전체가 현재가에서 span_percent %까지 펼쳐지도록 잡고, 쪽마다 벽을 심어 모든 깊이에서 결과를 비교합니다.
+def bench_orderbook(args):
+    closing_price = 100000.0
+    print(f"이탈률 임계치 {args.price_distance}%, 수량 임계치 {args.threshold_volume}, 깊이 지표 범위 {args.depth_percent}%, "
+          f"호가창 폭 {args.span_percent}%, 쪽마다 심은 벽 {args.walls}개 (수집기 호가 수 {ads.ORDER_BOOK_COUNT}개, 빗썸 최대 30개 안팎)")
+    print(f"{'호가 수':>8} {'벽 수':>6} {'호가별 루프(us)':>16} {'현재(us)':>11} {'+깊이 지표(us)':>15} {'배속':>7} {'로그 줄(기존/현재)':>18}")
+    for depth in args.depths:
+        tick = closing_price * args.span_percent / 100 / depth
+        order_book_data = generate_order_book(depth, closing_price, tick=tick, walls_per_side=args.walls, seed=args.seed)
+        def run_reference():
+            return reference_order_book_walls(order_book_data, closing_price, args.price_distance, args.threshold_volume)
+        def run_current():
+            order_book, _errors = OrderBookSnapshot.from_api(order_book_data)
+            return order_book, {side: order_book.find_walls(side, closing_price, args.price_distance, args.threshold_volume) for side in ('ask', 'bid')}
+
+        # 기존/현재 구현을 args.rounds번 번갈아 재서 회당 평균의 중앙값 사용 (다른 프로세스로 인한 흔들림 완화, 첫 회는 워밍업 겸용)
+        reference_rounds, current_rounds, features_rounds = [], [], []
+        round_repeat = max(args.repeat // args.rounds, 1)
+        for _ in range(args.rounds):
+            for call, rounds in ((run_reference, reference_rounds), (run_current, current_rounds)):
+                start = time.perf_counter()
+                for _ in range(round_repeat):
+                    call()
+                rounds.append((time.perf_counter() - start) / round_repeat * 1e6)
+            order_book, wall_indices = run_current()
+            start = time.perf_counter()
+            for _ in range(round_repeat):
+                order_book.depth_features(args.depth_percent)
+            features_rounds.append((time.perf_counter() - start) / round_repeat * 1e6)
+        reference_us, current_us, features_us = np.median(reference_rounds), np.median(current_rounds), np.median(features_rounds)
+        expected = run_reference()
+
+        # 동일성 검증: 같은 벽을 같은 순서로 찾아야 합니다.
+        actual = []
+        for side in ('ask', 'bid'):
+            prices, quantities = order_book.side(side)
+            actual.extend((side, float(prices[i]), float(quantities[i])) for i in wall_indices[side])
+        if not expected:
+            raise SystemExit(f"[실패] 호가 {depth}개: 비교할 벽이 없습니다. (--walls, --span-percent 확인)")
+        if actual != expected:
+            raise SystemExit(f"[실패] 호가 {depth}개: 현재 구현 결과({len(actual)}개)가 기존 로직({len(expected)}개)과 다릅니다.")
+        # 로그 줄 수: 기존에는 벽마다 8줄, 현재는 벽마다 1줄 + 벽이 있는 쪽마다 요약 1줄 (시도/결과 줄은 공통이라 제외)
+        log_lines = f"{8 * len(actual)}/{len(actual) + sum(1 for side in wall_indices if len(wall_indices[side]))}"
+        print(f"{depth:>8} {len(actual):>6} {reference_us:>16.1f} {current_us:>11.1f} {features_us:>15.1f} {reference_us / current_us:>6.1f}x {log_lines:>18}")
+
+
+# --- detectors: 탐지 함수별 호출 시간/메모리 ---
+
+# 호출 하나의 시간(초)을 repeat번 재서 (중앙값, p95)를 반환 (처음 한 번은 워밍업으로 버림)
+def measure_call_seconds(call, repeat):
+    call()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        call()
+        samples.append(time.perf_counter() - start)
+    return float(np.median(samples)), float(np.percentile(samples, 95))
+
+
+# tracemalloc으로 호출 하나가 새로 할당한 최대 메모리(바이트) 측정
+def measure_call_peak_bytes(call):
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        baseline, _ = tracemalloc.get_traced_memory()
+        call()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return max(peak - baseline, 0)
+
+
+# 추세 분석: coins개 코인, 이동 평균 창 lookback (링 버퍼에 창의 두 배 길이 랜덤 워크를 미리 채움)
+def setup_analyze_call(coins, lookback, seed):
+    epoch = 1767225600.0
+    states = {}
+    for i in range(coins):
+        coin = f"C{i:03d}"
+        state = CoinState(coin, lookback * 2, lookback, 10)
+        for k, price in enumerate(generate_price_walk(lookback * 2, seed=seed + i)):
+            state.append_ticker(epoch + k * 5, price, (price / 1000 - 1) * 100, 100000.0)
+        states[coin] = state
+    timestamp = datetime.fromtimestamp(epoch + lookback * 10).strftime('%Y-%m-%d %H:%M:%S')
+    return lambda: ads.analyze_and_notify_anomaly(states, ads.FLUCTUATION_THRESHOLD_PERCENT, ads.DEVIATION_THRESHOLD_PERCENT,
+                                                  list(states), timestamp, lookback)
+
+
+# 자전거래: trades개 체결 테이프에 마지막 10%가 새 체결로 들어온 상태 (자전거래 쌍 5% 포함)
+def setup_wash_call(trades, seed):
+    snapshot, _ = TradeSnapshot.from_api(generate_trade_history(trades, seed=seed))
+    tape = TradeTape(trades)
+    old_count = trades - max(trades // 10, 1)
+    tape.ingest(TradeSnapshot(snapshot.epoch_ms[:old_count], snapshot.prices[:old_count], snapshot.quantities[:old_count],
+                              snapshot.sides[:old_count], snapshot.trade_ids[:old_count]))
+    tape.ingest(snapshot)
+    return lambda: ads.detect_wash_trading("BTC", tape, ads.WASH_TRADE_TIME_WINDOW_SECONDS, ads.WASH_TRADE_PRICE_TOLERANCE_PERCENT,
+                                           ads.WASH_TRADE_QUANTITY_TOLERANCE_PERCENT, "2026-01-01 00:00:00")
+
+
+# 호가창 매물벽: 쪽마다 depth개 호가 (벽 5%). 응답 파싱부터 매물벽 탐지까지
+def setup_orderbook_call(depth, seed):
+    order_book_data = generate_order_book(depth, seed=seed)
+    def call():
+        order_book, _ = OrderBookSnapshot.from_api(order_book_data)
+        ads.detect_order_book_wall_anomaly("BTC", order_book, 100000.0, 1000.0, ads.ORDER_WALL_PRICE_DISTANCE_PERCENT,
+                                           ads.ORDER_WALL_VOLUME_MULTIPLIER, "2026-01-01 00:00:00")
+    return call
+
+
+# 펌프 앤 덤프: lookback칸(5초 간격) 시세 이력의 마지막 15분에 6% 상승, 그 동안 체결 1000건 (모든 창이 거래량 계산까지 감)
+def setup_pump_call(lookback, seed):
+    epoch = 1767225600.0
+    pump_length = min(180, lookback - 1)
+    state = CoinState("BTC", lookback, 10, 1000)
+    for k, price in enumerate(generate_price_walk(lookback, volatility=0.0005, pump_length=pump_length, pump_percent=6.0, seed=seed)):
+        state.append_ticker(epoch + k * 5, price, 0.0, 100.0)
+    last_epoch = epoch + (lookback - 1) * 5
+    snapshot, _ = TradeSnapshot.from_api(generate_trade_history(1000, seed=seed, wash_ratio=0.0, mean_gap_ms=900, start_epoch=last_epoch - 900))
+    state.trade_tape.ingest(snapshot)
+    return lambda: ads.detect_pump_and_dump_anomaly("BTC", state.buffer, state.trade_tape, ads.PUMP_DETECTION_WINDOWS,
+                                                    ads.PUMP_VOLUME_MULTIPLIER_FROM_AVG_24H, "2026-01-01 00:00:00")
+
+
+# 스푸핑: 조회마다 wall_count개 가격대 중 20%를 거두고 다시 세우는 벽 목록을 차례로 벽 추적기에 넣고 사라진 벽을 검사
+def setup_spoofing_call(wall_count, seed):
+    sequence = generate_wall_sequence(100, wall_count, seed=seed)
+    tracker = WallTracker(ads.WALL_PRICE_TOLERANCE_PERCENT, ads.WALL_TRACKER_RETENTION_SECONDS, ads.WALL_QUANTITY_TOLERANCE_PERCENT)
+    step = [0]
+    def call():
+        i = step[0] % len(sequence)
+        step[0] += 1
+        _, pulled_walls = tracker.update(sequence[i], 1767225600.0 + step[0] * 5)
+        ads.detect_spoofing("BTC", pulled_walls, 100000.0, ads.ORDER_WALL_PRICE_DISTANCE_PERCENT,
+                            ads.SPOOFING_REPEAT_PULL_COUNT, sequence[i][0]['timestamp'] if sequence[i] else "2026-01-01 00:00:00")
+    return call
+
+
+# 측정 환경 정보 (결과 JSON에 함께 저장)
+def benchmark_environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'commit': commit,
+        'python': sys.version.split()[0],
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+    }
+
+
+# 결과 하나의 비교 키 (탐지 함수 + 크기)
+def benchmark_result_key(result):
+    return result['detector'] + ' ' + json.dumps(result['size'], sort_keys=True)
+
+
+def bench_detectors(args):
+    cases = []
+    for coins in args.coins:
+        for lookback in args.lookbacks:
+            cases.append(('analyze', {'coins': coins, 'lookback': lookback}, lambda coins=coins, lookback=lookback: setup_analyze_call(coins, lookback, args.seed)))
+    for trades in args.trades:
+        cases.append(('wash', {'trades': trades}, lambda trades=trades: setup_wash_call(trades, args.seed)))
+    for depth in args.depths:
+        cases.append(('orderbook', {'depth': depth}, lambda depth=depth: setup_orderbook_call(depth, args.seed)))
+    for lookback in args.lookbacks:
+        if lookback >= 2:
+            cases.append(('pump', {'lookback': lookback}, lambda lookback=lookback: setup_pump_call(lookback, args.seed)))
+    for walls in args.walls:
+        cases.append(('spoofing', {'walls': walls}, lambda walls=walls: setup_spoofing_call(walls, args.seed)))
+    if args.only:
+        cases = [case for case in cases if case[0] in args.only]
+
+    # 탐지 함수 자체의 비용만 재도록 로그 출력은 버림 (로그 비용은 logging 벤치마크에서 따로 측정)
+    original_print_and_log = ads.print_and_log
+    ads.print_and_log = lambda message, file_path=None, level="INFO": None
+    results = []
+    try:
+        print(f"{'탐지 함수':<10} {'크기':<28} {'중앙값(us)':>11} {'p95(us)':>10} {'최대 메모리(KB)':>15}")
+        for detector, size, setup in cases:
+            call = setup()
+            median_seconds, p95_seconds = measure_call_seconds(call, args.repeat)
+            peak_bytes = measure_call_peak_bytes(call)
+            ads.global_anomaly_events.clear()
+            result = {'detector': detector, 'size': size, 'repeat': args.repeat,
+                      'median_us': median_seconds * 1e6, 'p95_us': p95_seconds * 1e6, 'peak_kb': peak_bytes / 1024}
+            results.append(result)
+            size_text = ", ".join(f"{name}={value}" for name, value in size.items())
+            print(f"{detector:<10} {size_text:<28} {result['median_us']:>11.1f} {result['p95_us']:>10.1f} {result['peak_kb']:>15.1f}")
+    finally:
+        ads.print_and_log = original_print_and_log
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'environment': benchmark_environment(), 'results': results}, f, ensure_ascii=False, indent=2)
+        print(f"결과를 '{args.output}'에 저장했습니다.")
+
+    # 기준 결과와 비교: 중앙값이 max_regression배를 넘게 느려진 항목이 있으면 종료 코드 1
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = {benchmark_result_key(result): result for result in json.load(f).get('results', [])}
+        regressions = 0
+        print(f"\n기준 결과 '{args.baseline}'와 비교 (중앙값 {args.max_regression}배 초과 시 회귀)")
+        for result in results:
+            previous = baseline.get(benchmark_result_key(result))
+            if previous is None or previous['median_us'] <= 0:
+                continue
+            ratio = result['median_us'] / previous['median_us']
+            regressed = ratio > args.max_regression
+            regressions += regressed
+            print(f"  {'[회귀] ' if regressed else ''}{benchmark_result_key(result)}: {previous['median_us']:.1f}us -> {result['median_us']:.1f}us ({ratio:.2f}배)")
+        if regressions:
+            raise SystemExit(f"[실패] 성능 회귀 {regressions}건")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="이상거래 탐지 시스템 벤치마크")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    fetch_parser = subparsers.add_parser('fetch', help="순차 요청 vs 동시 요청 주기 시간 비교 (로컬 모의 서버)")
+    fetch_parser.add_argument('--coins', type=int, nargs='+', default=[3, 10, 30, 100])
+    fetch_parser.add_argument('--latency-ms', type=float, default=20.0)
+    fetch_parser.add_argument('--concurrency', type=int, default=8)
+    fetch_parser.add_argument('--repeat', type=int, default=3)
+    fetch_parser.set_defaults(func=bench_fetch)
+
+    wash_parser = subparsers.add_parser('wash', help="자전거래 쌍 탐색: 기존 이중 루프 vs 벡터화 (결과 동일성 검증 포함)")
+    wash_parser.add_argument('--sizes', type=int, nargs='+', default=[50, 1000, 10000])
+    wash_parser.add_argument('--window', type=float, default=2)
+    wash_parser.add_argument('--price-tolerance', type=float, default=0.05)
+    wash_parser.add_argument('--quantity-tolerance', type=float, default=0.1)
+    wash_parser.add_argument('--seed', type=int, default=0)
+    wash_parser.add_argument('--repeat', type=int, default=3)
+    wash_parser.set_defaults(func=bench_wash)
+
+    logging_parser = subparsers.add_parser('logging', help="주기당 로그 출력 시간: 동기 print_and_log vs 비동기 로그 기록기")
+    logging_parser.add_argument('--messages', type=int, default=60)
+    logging_parser.add_argument('--cycles', type=int, default=100)
+    logging_parser.set_defaults(func=bench_logging)
+
+    scan_parser = subparsers.add_parser('scan', help="전체 시장 스캔: 심볼 수별 주기당 처리 시간 (결과 동일성 검증 포함)")
+    scan_parser.add_argument('--symbols', type=int, nargs='+', default=[200, 500, 2000])
+    scan_parser.add_argument('--cycles', type=int, default=200)
+    scan_parser.add_argument('--capacity', type=int, default=720)
+    scan_parser.add_argument('--ma-window', type=int, default=10)
+    scan_parser.add_argument('--fluctuation-threshold', type=float, default=5.0)
+    scan_parser.add_argument('--deviation-threshold', type=float, default=1.0)
+    scan_parser.add_argument('--top-k', type=int, default=5)
+    scan_parser.add_argument('--interval', type=float, default=5.0, help="수집 주기 (초), 주기 대비 비율 계산용")
+    scan_parser.add_argument('--seed', type=int, default=0)
+    scan_parser.set_defaults(func=bench_scan)
+
+    serve_parser = subparsers.add_parser('serve', help="/data 엔드포인트 처리량: 매 요청 파일 파싱 vs 응답 캐시 + ETag")
+    serve_parser.add_argument('--clients', type=int, default=100)
+    serve_parser.add_argument('--duration', type=float, default=5.0)
+    serve_parser.set_defaults(func=bench_serve)
+
+    orderbook_parser = subparsers.add_parser('orderbook', help="호가창 매물벽 탐지: 기존 호가별 루프 vs 한 번 파싱한 스냅샷 + 깊이 지표 (결과 동일성 검증 포함)")
+    orderbook_parser.add_argument('--depths', type=int, nargs='+', default=[10, 20, 30])
+    orderbook_parser.add_argument('--price-distance', type=float, default=0.5)
+    orderbook_parser.add_argument('--threshold-volume', type=float, default=200.0)
+    orderbook_parser.add_argument('--depth-percent', type=float, default=1.0)
+    orderbook_parser.add_argument('--span-percent', type=float, default=2.0, help="가장 먼 호가의 현재가 대비 거리 (%)")
+    orderbook_parser.add_argument('--walls', type=int, default=3, help="쪽마다 심을 벽 수")
+    orderbook_parser.add_argument('--seed', type=int, default=0)
+    orderbook_parser.add_argument('--repeat', type=int, default=2000)
+    orderbook_parser.add_argument('--rounds', type=int, default=10)
+    orderbook_parser.set_defaults(func=bench_orderbook)
+
+    recorder_parser = subparsers.add_parser('recorder', help="원본 응답 기록: 기록 없음 vs 기록 주기 시간 + record() 비용과 압축률")
+    recorder_parser.add_argument('--coins', type=int, default=30)
+    recorder_parser.add_argument('--latency-ms', type=float, default=20.0)
+    recorder_parser.add_argument('--concurrency', type=int, default=8)
+    recorder_parser.add_argument('--repeat', type=int, default=20)
+    recorder_parser.add_argument('--record-calls', type=int, default=20000)
+    recorder_parser.set_defaults(func=bench_recorder)
+
+    metrics_parser = subparsers.add_parser('metrics', help="단계별 계측 비용: 계측 없음 vs 계측 주기 시간 + 기록 하나의 비용으로 추정한 비율")
+    metrics_parser.add_argument('--coins', type=int, default=30)
+    metrics_parser.add_argument('--latency-ms', type=float, default=20.0)
+    metrics_parser.add_argument('--concurrency', type=int, default=8)
+    metrics_parser.add_argument('--repeat', type=int, default=20)
+    metrics_parser.add_argument('--max-overhead', type=float, default=0.01, help="주기 시간 대비 계측 비용 비율 상한 (넘으면 종료 코드 1)")
+    metrics_parser.set_defaults(func=bench_metrics)
+
+    shards_parser = subparsers.add_parser('shards', help="코인 분할 모드: 작업 프로세스 수별 정밀 탐지 작업 처리량 (전체 감시 모드)")
+    shards_parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    shards_parser.add_argument('--coins', type=int, default=400)
+    shards_parser.add_argument('--latency-ms', type=float, default=5.0)
+    shards_parser.add_argument('--interval', type=float, default=1.0, help="티커 주기 (초)")
+    shards_parser.add_argument('--detail-interval', type=float, default=1.0, help="정밀 탐지 주기 (초)")
+    shards_parser.add_argument('--duration', type=float, default=15.0, help="작업 프로세스 수마다 실행할 시간 (초)")
+    shards_parser.set_defaults(func=bench_shards)
+
+    detectors_parser = subparsers.add_parser('detectors', help="탐지 함수별 호출 시간/메모리 (합성 데이터, 크기별) + 결과 JSON 저장/기준 비교")
+    detectors_parser.add_argument('--coins', type=int, nargs='+', default=[3, 30, 200], help="추세 분석 코인 수")
+    detectors_parser.add_argument('--lookbacks', type=int, nargs='+', default=[10, 60, 720], help="이동 평균 창 / 펌프 탐지 시세 이력 길이")
+    detectors_parser.add_argument('--trades', type=int, nargs='+', default=[50, 1000, 5000], help="자전거래 체결 테이프 길이")
+    detectors_parser.add_argument('--depths', type=int, nargs='+', default=[10, 30, 100, 500], help="호가창 쪽별 호가 수")
+    detectors_parser.add_argument('--walls', type=int, nargs='+', default=[5, 50, 200], help="스푸핑 추적 벽 가격대 수")
+    detectors_parser.add_argument('--only', nargs='+', choices=['analyze', 'wash', 'orderbook', 'pump', 'spoofing'], default=None)
+    detectors_parser.add_argument('--repeat', type=int, default=200)
+    detectors_parser.add_argument('--seed', type=int, default=0)
+    detectors_parser.add_argument('--output', default='detector_benchmark.json', help="결과 JSON 파일 (빈 문자열이면 저장 안 함)")
+    detectors_parser.add_argument('--baseline', default=None, help="비교할 이전 결과 JSON 파일")
+    detectors_parser.add_argument('--max-regression', type=float, default=1.25, help="중앙값이 이 배수를 넘게 느려지면 회귀로 판정")
+    detectors_parser.set_defaults(func=bench_detectors)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+# bithumb_client.py
+# 파트너, 이 모듈은 빗썸 Public API 호출을 담당하는 공용 HTTP 클라이언트입니다.
+# 하나의 keep-alive 커넥션 풀(requests.Session)을 모든 요청이 공유하고,
+# 스레드 풀을 이용해 코인별 요청(체결 내역, 호가창)을 동시에 보냅니다.
+# 모든 요청은 공용 토큰 버킷(요청 예산)을 거치고, 엔드포인트별 타임아웃, 지터가 들어간 지수 백오프 재시도,
+# 장애가 이어지는 엔드포인트를 잠시 건너뛰는 서킷 브레이커가 적용됩니다.
+
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+RETRYABLE_STATUS_CODES = (429, 500, 502, 503, 504) # 재시도할 HTTP 상태 코드 (429: 요청 과다)
+
+
+# 서킷 브레이커가 열려 있어 요청을 보내지 않았을 때 발생 (기존 네트워크 예외 처리에서 함께 잡히도록 RequestException 상속)
+class CircuitOpenError(requests.exceptions.RequestException):
+    pass
+
+
+# 요청 예산(토큰)을 제한 시간 안에 받지 못했을 때 발생
+class RateLimitTimeout(requests.exceptions.RequestException):
+    pass
+
+
+# 엔드포인트 그룹 이름 (경로의 첫 부분, 예: "/orderbook/BTC_KRW" -> "/orderbook")
+# 타임아웃, 서킷 브레이커, 통계는 코인이 아니라 이 그룹 단위로 관리합니다.
+def endpoint_group(endpoint):
+    return '/' + endpoint.lstrip('/').split('/', 1)[0]
+
+
+# 엔드포인트 그룹 하나의 서킷 브레이커
+# 연속 실패가 failure_threshold번이면 열림(open) 상태가 되어 cooldown초 동안 요청을 보내지 않고,
+# 그 뒤 요청 하나만 시험(half-open)으로 보내 성공하면 닫히고 실패하면 다시 cooldown초 동안 열립니다.
+class CircuitBreaker:
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, cooldown=30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.open_count = 0 # 열린 횟수
+        self._probe_in_flight = False
+
+    # 요청을 보내도 되는지 확인 (half-open 상태에서는 시험 요청 하나만 허용)
+    def allow(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if self._clock() - self.opened_at < self.cooldown:
+                    return False
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self._probe_in_flight = False
+
+    # 요청을 보내지 못하고 끝났을 때 (엔드포인트 장애가 아니므로 성공/실패로 세지 않고 half-open 시험 기회만 되돌림)
+    def release(self):
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.open_count += 1
+                self.state = self.OPEN
+                self.opened_at = self._clock()
+                self._probe_in_flight = False
+
+
+# 엔드포인트 그룹별 요청 통계
+class EndpointStats:
+    __slots__ = ('requests', 'responses', 'retries', 'failures', 'throttled', 'short_circuited',
+                 'limiter_wait_seconds', 'backoff_seconds', 'latency_seconds')
+
+    def __init__(self):
+        self.requests = 0 # get() 호출 수
+        self.responses = 0 # 최종적으로 응답을 돌려준 수
+        self.retries = 0 # 재시도 수
+        self.failures = 0 # 재시도 후에도 실패한 수 (예외 또는 재시도 대상 상태 코드)
+        self.throttled = 0 # 429 응답 수
+        self.short_circuited = 0 # 서킷 브레이커가 열려 보내지 않은 수
+        self.limiter_wait_seconds = 0.0 # 요청 예산을 기다린 시간 합계
+        self.backoff_seconds = 0.0 # 재시도 전 백오프로 쉰 시간 합계
+        self.latency_seconds = 0.0 # HTTP 요청 시간 합계 (재시도 포함)
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class BithumbClient:
+    # base_url: 예) "https://api.bithumb.com/public"
+    # max_concurrency: 동시에 진행할 최대 요청 수 (스레드 수 = 커넥션 풀 크기)
+    # timeout: requests에 그대로 넘기는 (연결, 읽기) 타임아웃 초 (endpoint_timeouts에 없는 엔드포인트에 적용)
+    # endpoint_timeouts: {엔드포인트 그룹: (연결, 읽기) 타임아웃} (예: {"/orderbook": (3.05, 3)})
+    # rate_limiter: 모든 요청(재시도 포함)이 토큰을 하나씩 쓰는 공용 요청 예산 (rate_limit.TokenBucket, None이면 제한 없음)
+    # limiter_max_wait: 토큰을 기다릴 최대 시간 (초, 넘으면 RateLimitTimeout)
+    # max_retries: 네트워크 오류/재시도 대상 상태 코드일 때 추가로 시도할 횟수
+    # backoff_base, backoff_max: 재시도 대기 시간은 0 ~ min(backoff_max, backoff_base * 2^시도)초 사이의 무작위 값 (Retry-After가 있으면 그 이상)
+    # breaker_failure_threshold, breaker_cooldown: 엔드포인트 그룹별 서킷 브레이커 설정
+    # recorder: 받은 모든 응답(재시도 포함)의 원본을 넘길 기록기 (response_recorder.ResponseRecorder, None이면 기록 안 함)
+    # metrics: 시도마다 HTTP 요청 시간을 'http_request_seconds{endpoint=그룹}' 히스토그램에 남길 레지스트리 (metrics.MetricsRegistry, None이면 안 남김)
+    def __init__(self, base_url, max_concurrency=8, timeout=(3.05, 5), endpoint_timeouts=None, rate_limiter=None,
+                 limiter_max_wait=5.0, max_retries=2, backoff_base=0.25, backoff_max=4.0,
+                 breaker_failure_threshold=5, breaker_cooldown=30.0, recorder=None, metrics=None):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.endpoint_timeouts = dict(endpoint_timeouts or {})
+        self.rate_limiter = rate_limiter
+        self.limiter_max_wait = limiter_max_wait
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker_failure_threshold = breaker_failure_threshold
+        self.breaker_cooldown = breaker_cooldown
+        self.recorder = recorder
+        self.metrics = metrics
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='bithumb-fetch')
+        self._stats = {} # 엔드포인트 그룹 -> EndpointStats
+        self._breakers = {} # 엔드포인트 그룹 -> CircuitBreaker
+        self._lock = threading.Lock()
+
+    def _group_state(self, group):
+        with self._lock:
+            stats = self._stats.get(group)
+            if stats is None:
+                stats = self._stats[group] = EndpointStats()
+                self._breakers[group] = CircuitBreaker(self.breaker_failure_threshold, self.breaker_cooldown)
+            return stats, self._breakers[group]
+
+    def _count(self, stats, name, amount=1):
+        with self._lock:
+            setattr(stats, name, getattr(stats, name) + amount)
+
+    # 재시도 전 대기 시간 (지터가 들어간 지수 백오프, 서버가 Retry-After를 주면 그 값 이상)
+    def _backoff_delay(self, attempt, response=None):
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        if response is not None:
+            try:
+                delay = max(delay, min(self.backoff_max, float(response.headers.get('Retry-After', 0))))
+            except ValueError:
+                pass
+        return delay
+
+    # 동기 GET 요청 (응답 객체 반환, 재시도 후에도 네트워크 오류면 requests 예외 발생)
+    # 재시도 대상 상태 코드(429, 5xx)는 재시도 후에도 그대로면 마지막 응답을 돌려줍니다.
+    # reserved: 호출하는 쪽이 첫 시도의 토큰을 이미 받아 두었으면 True (스케줄러가 작업을 허용할 때 받음, 재시도는 따로 받음)
+    def get(self, endpoint, params=None, timeout=None, reserved=False):
+        group = endpoint_group(endpoint)
+        stats, breaker = self._group_state(group)
+        self._count(stats, 'requests')
+        if not breaker.allow():
+            self._count(stats, 'short_circuited')
+            if reserved:
+                self.refund_reservation() # 보내지 않은 요청의 토큰은 돌려줌
+            raise CircuitOpenError(f"{group} 엔드포인트 서킷 브레이커 열림 (연속 실패 {breaker.consecutive_failures}회)")
+        timeout = timeout or self.endpoint_timeouts.get(group, self.timeout)
+
+        attempt = 0
+        while True:
+            if self.rate_limiter is not None and not (reserved and attempt == 0):
+                wait_started = time.monotonic()
+                acquired = self.rate_limiter.acquire(timeout=self.limiter_max_wait)
+                self._count(stats, 'limiter_wait_seconds', time.monotonic() - wait_started)
+                if not acquired:
+                    breaker.release()
+                    raise RateLimitTimeout(f"{group} 요청 예산 대기 시간 초과 ({self.limiter_max_wait}초)")
+
+            request_started = time.monotonic()
+            fetch_epoch = time.time()
+            response = None
+            try:
+                response = self.session.get(self.base_url + endpoint, params=params, timeout=timeout)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                latency = time.monotonic() - request_started
+                self._count(stats, 'latency_seconds', latency)
+                if self.metrics is not None:
+                    self.metrics.observe('http_request_seconds', latency, endpoint=group)
+                if attempt >= self.max_retries:
+                    self._count(stats, 'failures')
+                    breaker.record_failure()
+                    raise
+            except Exception:
+                # 재시도해도 나아지지 않는 요청 오류 (ChunkedEncodingError, TooManyRedirects, InvalidURL 등): 바로 실패로 집계
+                latency = time.monotonic() - request_started
+                self._count(stats, 'latency_seconds', latency)
+                if self.metrics is not None:
+                    self.metrics.observe('http_request_seconds', latency, endpoint=group)
+                self._count(stats, 'failures')
+                breaker.record_failure()
+                raise
+            else:
+                latency = time.monotonic() - request_started
+                self._count(stats, 'latency_seconds', latency)
+                if self.metrics is not None:
+                    self.metrics.observe('http_request_seconds', latency, endpoint=group)
+                if self.recorder is not None:
+                    self.recorder.record(endpoint, params, fetch_epoch, latency, response.status_code, response.content)
+                if response.status_code == 429:
+                    self._count(stats, 'throttled')
+                if response.status_code not in RETRYABLE_STATUS_CODES:
+                    self._count(stats, 'responses')
+                    breaker.record_success()
+                    return response
+                if attempt >= self.max_retries:
+                    self._count(stats, 'responses')
+                    self._count(stats, 'failures')
+                    breaker.record_failure()
+                    return response
+
+            delay = self._backoff_delay(attempt, response)
+            self._count(stats, 'retries')
+            self._count(stats, 'backoff_seconds', delay)
+            time.sleep(delay)
+            attempt += 1
+
+    # 엔드포인트 그룹별 통계 ({그룹: {카운터: 값, ..., 'breaker_state', 'breaker_open_count'}})
+    def stats(self):
+        with self._lock:
+            result = {}
+            for group, stats in self._stats.items():
+                breaker = self._breakers[group]
+                result[group] = dict(stats.to_dict(), breaker_state=breaker.state, breaker_open_count=breaker.open_count)
+            return result
+
+    # 통계 요약 문자열 (로그용)
+    def format_stats(self):
+        parts = []
+        for group, stats in sorted(self.stats().items()):
+            parts.append(f"{group}: 요청 {stats['requests']}회, 재시도 {stats['retries']}회, 실패 {stats['failures']}회, "
+                         f"429 {stats['throttled']}회, 차단 {stats['short_circuited']}회 (브레이커 {stats['breaker_state']}, 열림 {stats['breaker_open_count']}회), "
+                         f"예산 대기 {stats['limiter_wait_seconds']:.2f}초, 백오프 {stats['backoff_seconds']:.2f}초")
+        return parts
+
+    # 비동기 GET 요청. Future를 반환하며, future.result()가 응답을 돌려주거나 요청 중 발생한 예외를 다시 던집니다.
+    def submit(self, endpoint, params=None, timeout=None, reserved=False):
+        return self._executor.submit(self.get, endpoint, params, timeout, reserved)
+
+    # 미리 받아 둔 요청 토큰을 보내지 않게 되었을 때 돌려줌 (요청 예산이 없으면 아무것도 안 함)
+    def refund_reservation(self, count=1):
+        if self.rate_limiter is not None and count > 0:
+            self.rate_limiter.refund(count)
+
+    # 한 주기 동안 사용할 요청 묶음 생성 (같은 요청은 한 번만 보냄)
+    def start_batch(self):
+        return FetchBatch(self)
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self.session.close()
+
+
+# 한 수집 주기 안에서 보낸 요청들을 (엔드포인트, 파라미터) 기준으로 기억해 두는 묶음
+# 여러 탐지 함수가 같은 엔드포인트를 필요로 해도 실제 HTTP 요청은 한 번만 나갑니다.
+# reserved=True로 넣은 요청은 토큰을 미리 받아 둔 것으로 보고, 같은 요청이 겹치거나 보내기 전에 취소되면 토큰을 돌려줍니다.
+class FetchBatch:
+    def __init__(self, client):
+        self._client = client
+        self._futures = {}
+        self._reserved = set() # 토큰을 미리 받아 둔 요청 키
+
+    def submit(self, endpoint, params=None, reserved=False):
+        key = (endpoint, tuple(sorted((params or {}).items())))
+        future = self._futures.get(key)
+        if future is None:
+            future = self._client.submit(endpoint, params, reserved=reserved)
+            self._futures[key] = future
+            if reserved:
+                self._reserved.add(key)
+        elif reserved:
+            self._client.refund_reservation() # 이미 보낸 요청을 다시 쓰므로 새로 받은 토큰은 쓰지 않음
+        return future
+
+    # 아직 끝나지 않은 요청 취소 (주기 중간에 오류로 빠져나갈 때 사용)
+    def cancel_pending(self):
+        for key, future in self._futures.items():
+            if future.cancel() and key in self._reserved:
+                self._client.refund_reservation() # 보내기 전에 취소된 요청의 토큰은 돌려줌
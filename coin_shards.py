@@ -0,0 +1,257 @@
+# coin_shards.py
+# 파트너, 이 모듈은 수집기를 여러 프로세스로 나누어 실행하는 코인 분할(shard) 모드의 작업 프로세스와 프로세스 묶음(ShardPool)입니다.
+# 전체 시세(티커) 요청, 이력 저장소 기록, 전체 시장 스캔, 공유 데이터 발행은 조정 프로세스
+# (anomaly_detection_system.sharded_collection_loop) 하나가 맡고, 코인은 심볼의 crc32 값으로 작업 프로세스 N개에 고정 배정됩니다.
+# 작업 프로세스는 자기 몫 코인의 상태(링 버퍼/이동 통계, 체결 테이프, 벽 추적기)를 혼자 가지며,
+# 티커마다 받은 시세로 추세 분석을 하고 체결 내역/호가창 작업을 자기 스케줄러와 요청 예산(전체 예산을 나눈 몫)으로 실행합니다.
+# 결과는 이상 징후 이벤트, 웹 UI용 시세 점, 바뀐 벽 상태만 간단한 튜플로 돌려보내고, 조정 프로세스가 합쳐서 한 번에 발행합니다.
+
+import multiprocessing
+import os
+import queue
+import time
+import traceback
+import zlib
+from collections import deque, namedtuple
+
+from history_store import HistoryStore
+from log_writer import AsyncLogWriter
+from market_state import CoinState
+from metrics import MetricsRegistry
+from scheduler import JobScheduler
+
+_STOP = None # 작업 프로세스 종료 신호
+_MISSING_TICKER = ('N/A', 'N/A', 'N/A')
+
+# 조정 프로세스 -> 작업 프로세스: 티커 한 번
+#   epoch, time_kst: 티커 시각 (epoch 초, 'YYYY-MM-DD HH:MM:SS')
+#   tickers: 이 작업 프로세스 몫 심볼의 {심볼: (현재가, 24H 변동률, 24H 거래량)} (응답 값 그대로, 없으면 'N/A')
+#   target_coins: 추세 분석 대상, detail_coins: 체결 내역/호가창 정밀 탐지 대상, scores: 정밀 탐지 대상의 스캔 점수
+#   backfill: 처음 배정된 코인의 스캐너 이력 {심볼: (시각, 현재가, 24H 변동률, 24H 거래량) 배열}
+ShardTick = namedtuple('ShardTick', ['epoch', 'time_kst', 'tickers', 'target_coins', 'detail_coins', 'scores', 'backfill'])
+
+# 작업 프로세스 -> 조정 프로세스: 작업을 실행한 반복 하나의 결과
+#   ticks: 처리한 티커 수, jobs: 실행한 정밀 탐지 작업 수
+#   events: [(코인, 탐지기, epoch, 근거 딕셔너리)], points: [(코인, 웹 UI용 시세 점 딕셔너리)] (대상 코인(TARGET_COINS)만)
+#   walls: 이번에 호가창을 다시 본 코인의 벽 추적 상태 {코인: WallTracker.to_list()}
+#   metrics: 계측 사본 (스케줄러 통계 로그 주기마다, 나머지 반복은 None)
+ShardResult = namedtuple('ShardResult', ['shard', 'ticks', 'jobs', 'events', 'points', 'walls', 'metrics'])
+
+
+# 심볼 -> 작업 프로세스 번호 (프로세스 재시작이나 파이썬 해시 시드와 무관하게 항상 같은 값)
+def shard_index(symbol, shard_count):
+    return zlib.crc32(symbol.encode('utf-8')) % shard_count
+
+
+# 조정 프로세스가 쓰는 작업 프로세스 묶음
+# 조정 프로세스에는 요청/로그 스레드가 돌고 있으므로 fork 대신 spawn으로 깨끗한 프로세스를 띄웁니다.
+class ShardPool:
+    def __init__(self, shard_count):
+        if shard_count <= 0:
+            raise ValueError(f"작업 프로세스 수는 1 이상이어야 합니다: {shard_count}")
+        self.shard_count = shard_count
+        self._context = multiprocessing.get_context('spawn')
+        self._results = self._context.Queue()
+        self._inboxes = []
+        self._processes = []
+
+    def shard_of(self, symbol):
+        return shard_index(symbol, self.shard_count)
+
+    # settings_list: 작업 프로세스별 설정 딕셔너리 (run_shard_worker 참고)
+    # 모든 작업 프로세스가 이력 저장소를 읽고 준비를 마칠 때까지 기다림 (그 전에 조정 프로세스가 저장소에 쓴 티커를 두 번 반영하지 않도록)
+    def start(self, settings_list, ready_timeout=60.0):
+        for shard, settings in enumerate(settings_list):
+            inbox = self._context.Queue()
+            process = self._context.Process(target=run_shard_worker, args=(shard, inbox, self._results, settings),
+                                            name=f'coin-shard-{shard}', daemon=True)
+            process.start()
+            self._inboxes.append(inbox)
+            self._processes.append(process)
+        for _ in settings_list:
+            try:
+                self._results.get(timeout=ready_timeout)
+            except queue.Empty:
+                raise RuntimeError(f"작업 프로세스가 {ready_timeout}초 안에 준비되지 않았습니다. (종료된 작업 프로세스: {self.dead_workers()})")
+
+    def send(self, shard, tick):
+        self._inboxes[shard].put(tick)
+
+    # 결과가 하나 올 때까지 최대 timeout초 기다린 뒤, 그때까지 도착한 결과를 모두 반환
+    def receive(self, timeout):
+        results = []
+        try:
+            results.append(self._results.get(timeout=max(timeout, 0.0)) if timeout > 0 else self._results.get_nowait())
+            while True:
+                results.append(self._results.get_nowait())
+        except queue.Empty:
+            pass
+        return results
+
+    # 종료된 작업 프로세스 번호 목록 (작업 프로세스는 치명적 오류가 나면 로그를 남기고 종료함)
+    def dead_workers(self):
+        return [shard for shard, process in enumerate(self._processes) if not process.is_alive()]
+
+    def stop(self, timeout=5.0):
+        for inbox, process in zip(self._inboxes, self._processes):
+            if process.is_alive():
+                inbox.put(_STOP)
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+
+
+# 작업 프로세스 계측 사본들을 조정 프로세스 사본에 합침 (작업 프로세스 값에는 shard 레이블을 붙임)
+# skip_names: 조정 프로세스가 이미 세는 지표 (예: 이벤트를 합치며 세는 anomalies_total)
+def merge_metrics_snapshots(snapshot, shard_snapshots, skip_names=()):
+    merged = {kind: list(entries) for kind, entries in snapshot.items()}
+    for shard, shard_snapshot in sorted(shard_snapshots.items()):
+        for kind, entries in shard_snapshot.items():
+            merged.setdefault(kind, []).extend(dict(entry, labels=dict(entry['labels'], shard=str(shard)))
+                                               for entry in entries if entry['name'] not in skip_names)
+    return merged
+
+
+# 탐지 모듈의 전역 상태를 작업 프로세스용으로 초기화
+# 설정은 조정 프로세스의 값(settings['config'])을 그대로 적용하고, 로그는 작업 프로세스별 파일에 남깁니다.
+def _reset_worker_state(ads, settings):
+    for name, value in settings['config'].items():
+        setattr(ads, name, value)
+    ads.global_coin_states = {}
+    ads.global_latest_ticker = {}
+    ads.global_wall_trackers = {}
+    ads.global_saved_wall_state = dict(settings['saved_walls'])
+    ads.global_anomaly_events = deque() # 조정 프로세스로 보낼 때까지 모아 두는 이벤트
+    ads.global_metrics = MetricsRegistry()
+    ads._log_writers = {ads.LOG_FILE_PATH: AsyncLogWriter(
+        settings['log_file'],
+        console_level="ERROR",
+        flush_interval=ads.LOG_FLUSH_INTERVAL_SECONDS,
+        max_bytes=ads.LOG_MAX_BYTES,
+        rotate_interval_seconds=ads.LOG_ROTATE_INTERVAL_SECONDS,
+        backup_count=ads.LOG_BACKUP_COUNT
+    )}
+    ads.http_client = ads.make_http_client(settings['rate'], settings['burst'], settings['recording_dir'])
+
+    # 시작 시 배정된 코인은 이력 저장소의 최근 이력으로 링 버퍼를 채움 (저장소 기록은 조정 프로세스만 함)
+    for coin in settings['initial_coins']:
+        ads.global_coin_states[coin] = CoinState(coin, ads.IN_MEMORY_HISTORY_LENGTH, ads.MOVING_AVERAGE_WINDOW, ads.TRADE_TAPE_CAPACITY)
+    if ads.global_coin_states and os.path.isdir(ads.HISTORY_STORE_DIR):
+        loaded_ticks = ads.load_recent_history(HistoryStore(ads.HISTORY_STORE_DIR), ads.global_coin_states, ads.IN_MEMORY_HISTORY_LENGTH)
+        ads.print_and_log(f"이력 저장소에서 코인 {len(ads.global_coin_states)}개의 최근 {loaded_ticks}개 시각을 불러왔습니다.")
+
+
+# 티커 하나 반영: 새로 배정된 코인 상태 생성, 모든 코인 상태에 시세 추가, 추세 분석, 정밀 탐지 작업 갱신
+# 반환값: 웹 UI용 시세 점 [(코인, 점 딕셔너리)] (대상 코인(TARGET_COINS)만, version은 조정 프로세스가 붙임)
+def _apply_tick(ads, scheduler, tick):
+    states = ads.global_coin_states
+    # 스캐너 이력으로 채운 코인은 이번 티커까지 들어 있으므로 이번 티커를 다시 추가하지 않음 (get_coin_state와 같은 방식)
+    backfilled = set()
+    for coin, columns in tick.backfill.items():
+        if coin in states:
+            continue
+        state = CoinState(coin, ads.IN_MEMORY_HISTORY_LENGTH, ads.MOVING_AVERAGE_WINDOW, ads.TRADE_TAPE_CAPACITY)
+        for timestamp, closing_price, fluctate_rate_24H, units_traded_24H in zip(*columns):
+            state.append_ticker(timestamp, closing_price, fluctate_rate_24H, units_traded_24H)
+        states[coin] = state
+        backfilled.add(coin)
+    for coin in list(tick.target_coins) + list(tick.detail_coins):
+        if coin not in states:
+            states[coin] = CoinState(coin, ads.IN_MEMORY_HISTORY_LENGTH, ads.MOVING_AVERAGE_WINDOW, ads.TRADE_TAPE_CAPACITY)
+
+    points = []
+    summary_coins = set(ads.TARGET_COINS)
+    for coin, state in states.items():
+        closing_price, fluctate_rate_24H, units_traded_24H = tick.tickers.get(coin, _MISSING_TICKER)
+        if coin not in backfilled:
+            state.append_ticker(tick.epoch, closing_price, fluctate_rate_24H, units_traded_24H)
+        ads.global_latest_ticker[coin] = {'closing_price': closing_price, 'units_traded_24H': units_traded_24H}
+        if coin in summary_coins:
+            points.append((coin, {"timestamp": tick.time_kst, "closing_price": closing_price,
+                                  "fluctate_rate_24H": fluctate_rate_24H, "units_traded_24H": units_traded_24H}))
+
+    if tick.target_coins:
+        try:
+            with ads.stage_timer('trend_analysis'):
+                ads.analyze_and_notify_anomaly(states, ads.FLUCTUATION_THRESHOLD_PERCENT, ads.DEVIATION_THRESHOLD_PERCENT,
+                                               list(tick.target_coins), tick.time_kst, ads.MOVING_AVERAGE_WINDOW)
+        except Exception as e:
+            ads.print_and_log(f"  [오류] 현재가/추세 분석 중 예상치 못한 오류: {e}", level="ERROR")
+            ads.print_and_log(f"  상세: {traceback.format_exc()}", level="ERROR")
+    ads.sync_detail_jobs(scheduler, list(tick.detail_coins), tick.scores)
+    return points
+
+
+# 이번 반복에서 모인 이벤트와 바뀐 벽 상태를 결과로 묶음 (보낸 이벤트는 목록에서 비움)
+def _collect_result(ads, shard, ticks, jobs, points, metrics):
+    events = [(event.coin, event.detector, event.timestamp, event.evidence) for event in ads.global_anomaly_events]
+    ads.global_anomaly_events.clear()
+    walls = {}
+    for job in jobs:
+        tracker = ads.global_wall_trackers.get(job.key[0]) if job.kind == ads.JOB_ORDER_BOOK else None
+        if tracker is not None:
+            walls[job.key[0]] = tracker.to_list()
+    return ShardResult(shard, ticks, len(jobs), events, points, walls, metrics)
+
+
+# 작업 프로세스 본체
+# settings: {'config': 조정 프로세스의 대문자 설정 값, 'log_file': 로그 파일, 'rate'/'burst': 이 프로세스의 요청 예산,
+#            'recording_dir': 원본 응답 기록 디렉터리, 'initial_coins': 시작 시 배정된 코인, 'saved_walls': 복원할 벽 상태}
+def run_shard_worker(shard, inbox, results, settings):
+    # anomaly_detection_system이 이 모듈을 가져오므로 작업 프로세스 안에서만 가져옴 (순환 import 방지)
+    import anomaly_detection_system as ads
+    _reset_worker_state(ads, settings)
+    results.put(shard) # 준비 완료 (ShardPool.start가 기다림)
+    ads.print_and_log(f"--- 코인 분할 작업 프로세스 {shard} 시작 (요청 예산 초당 {settings['rate']:.2f}회) ---")
+    scheduler = JobScheduler(ads.SCHEDULER_LATENESS_TOLERANCE_SECONDS)
+    last_stats_logged_at = scheduler.clock()
+
+    try:
+        while True:
+            # 다음 정밀 탐지 작업 시각까지 티커를 기다림 (밀린 티커는 한꺼번에 꺼내 순서대로 반영)
+            next_due = scheduler.next_due()
+            timeout = ads.TICKER_INTERVAL_SECONDS if next_due is None else next_due - scheduler.clock()
+            messages = []
+            try:
+                messages.append(inbox.get(timeout=timeout) if timeout > 0 else inbox.get_nowait())
+                while True:
+                    messages.append(inbox.get_nowait())
+            except queue.Empty:
+                pass
+            stopping = _STOP in messages
+
+            cycle_started = time.perf_counter()
+            points = []
+            ticks = [message for message in messages if message is not _STOP]
+            for tick in ticks:
+                points.extend(_apply_tick(ads, scheduler, tick))
+
+            jobs = []
+            detail_jobs = ads.admit_due_jobs(scheduler, ads.http_client.rate_limiter, ads.SHARD_MAX_DETAIL_JOBS_PER_CYCLE)
+            if detail_jobs and not stopping:
+                current_epoch = time.time()
+                current_time_kst = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(current_epoch))
+                jobs = ads.run_detail_jobs(scheduler, detail_jobs, current_epoch, current_time_kst)
+
+            metrics = None
+            if scheduler.clock() - last_stats_logged_at >= ads.SCHEDULER_STATS_LOG_INTERVAL_SECONDS:
+                ads.log_scheduler_stats(scheduler, ads.http_client)
+                ads.log_stage_stats()
+                metrics = ads.collect_metrics(scheduler, ads.http_client)
+                last_stats_logged_at = scheduler.clock()
+            if ticks or jobs:
+                ads.record_cycle_time(cycle_started)
+                results.put(_collect_result(ads, shard, len(ticks), jobs, points, metrics))
+            if stopping:
+                break
+    except KeyboardInterrupt:
+        pass # 조정 프로세스가 함께 종료 처리
+    except Exception as e:
+        ads.print_and_log(f"  [치명적 오류] 작업 프로세스 {shard} 종료: {e}", level="ERROR")
+        ads.print_and_log(f"  상세: {traceback.format_exc()}", level="ERROR")
+        raise
+    finally:
+        ads.http_client.close()
+        for writer in ads._log_writers.values():
+            writer.close()
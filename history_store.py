@@ -0,0 +1,209 @@
+# history_store.py
+# 파트너, 이 모듈은 시세 이력을 날짜별 파일(파티션)로 나누어 보관하는 저장소입니다.
+# 코인 x 필드가 가로로 늘어나는 CSV 대신 (시각, 심볼, 현재가, 24H 변동률, 24H 거래량)의 긴(long) 형식 고정 크기 레코드를
+# 하루치 파일 끝에 이어 붙이기만 하므로, 감시 코인을 바꿔도 기존 데이터의 열 배치가 깨지지 않습니다.
+# 읽을 때는 필요한 날짜의 파일만 numpy memmap으로 열고 시각 열에 이진 탐색을 해서 원하는 구간만 복사합니다.
+#
+# 기존 CSV 변환 (한 번만 실행):
+#   python history_store.py migrate bithumb_ticker_data.csv history_store
+
+import argparse
+import csv
+import json
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+
+from market_state import to_float
+
+STORE_LAYOUT_VERSION = 1
+META_FILE_NAME = "meta.json"
+PARTITION_SUFFIX = ".ticks"
+
+# 레코드 하나 (36바이트). symbol_id는 meta.json의 심볼 목록 번호입니다. 값이 없으면 NaN.
+HISTORY_RECORD_DTYPE = np.dtype([
+    ('timestamp', '<f8'), # epoch 초
+    ('symbol_id', '<u4'),
+    ('closing_price', '<f8'),
+    ('fluctate_rate_24H', '<f8'),
+    ('units_traded_24H', '<f8'),
+])
+
+
+# epoch 초 -> 파티션 이름 (로컬 날짜, 예: '2026-01-01')
+def partition_name(epoch):
+    return time.strftime('%Y-%m-%d', time.localtime(epoch))
+
+
+class HistoryStore:
+    # root_dir: 파티션 파일과 meta.json을 둘 디렉터리 (없으면 생성)
+    def __init__(self, root_dir):
+        self.root_dir = root_dir
+        os.makedirs(root_dir, exist_ok=True)
+        self.symbols = [] # symbol_id -> 심볼
+        self._symbol_ids = {}
+        self._last_timestamp = None # 시각이 거꾸로 가지 않도록 마지막으로 기록한 시각
+        meta_path = os.path.join(root_dir, META_FILE_NAME)
+        if os.path.exists(meta_path):
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta.get('layout_version') != STORE_LAYOUT_VERSION:
+                raise ValueError(f"지원하지 않는 이력 저장소 형식입니다: {meta.get('layout_version')}")
+            self.symbols = list(meta.get('symbols', []))
+            self._symbol_ids = {symbol: i for i, symbol in enumerate(self.symbols)}
+
+    def _partition_path(self, name):
+        return os.path.join(self.root_dir, name + PARTITION_SUFFIX)
+
+    # 심볼 번호 (처음 보는 심볼이면 등록하고 meta.json을 원자적으로 다시 씀)
+    def symbol_id(self, symbol):
+        symbol_id = self._symbol_ids.get(symbol)
+        if symbol_id is None:
+            symbol_id = len(self.symbols)
+            self.symbols.append(symbol)
+            self._symbol_ids[symbol] = symbol_id
+            meta_path = os.path.join(self.root_dir, META_FILE_NAME)
+            temp_path = meta_path + ".tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump({'layout_version': STORE_LAYOUT_VERSION, 'symbols': self.symbols}, f, ensure_ascii=False)
+            os.replace(temp_path, meta_path)
+        return symbol_id
+
+    # 저장된 파티션 이름 목록 (날짜 오름차순)
+    def partitions(self):
+        return sorted(name[:-len(PARTITION_SUFFIX)] for name in os.listdir(self.root_dir) if name.endswith(PARTITION_SUFFIX))
+
+    # 한 시각의 여러 심볼 값을 해당 날짜 파티션 끝에 추가
+    # rows: [(심볼, 현재가, 24H 변동률, 24H 거래량), ...] (값은 숫자 또는 'N/A' 같은 문자열)
+    def append(self, timestamp, rows):
+        if self._last_timestamp is not None:
+            timestamp = max(timestamp, self._last_timestamp)
+        self._last_timestamp = timestamp
+        rows = list(rows)
+        records = np.empty(len(rows), dtype=HISTORY_RECORD_DTYPE)
+        for i, (symbol, closing_price, fluctate_rate_24H, units_traded_24H) in enumerate(rows):
+            records[i] = (timestamp, self.symbol_id(symbol), to_float(closing_price), to_float(fluctate_rate_24H), to_float(units_traded_24H))
+        self._write(partition_name(timestamp), records)
+
+    def _write(self, name, records):
+        with open(self._partition_path(name), 'ab') as f:
+            f.write(records.tobytes())
+
+    # 파티션 하나를 읽기 전용 memmap으로 열기 (기록 중 잘린 마지막 레코드는 제외)
+    def _open_partition(self, name):
+        path = self._partition_path(name)
+        count = os.path.getsize(path) // HISTORY_RECORD_DTYPE.itemsize
+        if count == 0:
+            return np.empty(0, dtype=HISTORY_RECORD_DTYPE)
+        return np.memmap(path, dtype=HISTORY_RECORD_DTYPE, mode='r', shape=(count,))
+
+    # [start_epoch, end_epoch) 구간의 레코드 (시각순 구조화 배열 복사본)
+    # 구간과 겹치는 날짜의 파티션만 열고, 파티션 안에서는 시각 열 이진 탐색으로 필요한 부분만 읽습니다.
+    # symbols를 주면 해당 심볼만 남깁니다.
+    def read_range(self, start_epoch=None, end_epoch=None, symbols=None):
+        first = partition_name(start_epoch) if start_epoch is not None else None
+        last = partition_name(end_epoch) if end_epoch is not None else None
+        parts = []
+        for name in self.partitions():
+            if (first is not None and name < first) or (last is not None and name > last):
+                continue
+            records = self._open_partition(name)
+            timestamps = records['timestamp']
+            lo = int(np.searchsorted(timestamps, start_epoch, side='left')) if start_epoch is not None else 0
+            hi = int(np.searchsorted(timestamps, end_epoch, side='left')) if end_epoch is not None else len(records)
+            if hi > lo:
+                parts.append(np.array(records[lo:hi]))
+        result = np.concatenate(parts) if parts else np.empty(0, dtype=HISTORY_RECORD_DTYPE)
+        return self._filter_symbols(result, symbols)
+
+    # 가장 최근 max_ticks개 시각의 레코드 (시각순). 최신 파티션부터 필요한 만큼만 거꾸로 읽습니다.
+    def read_tail(self, max_ticks, symbols=None):
+        parts = []
+        distinct = 0
+        for name in reversed(self.partitions()):
+            records = self._open_partition(name)
+            if len(records) == 0:
+                continue
+            parts.append(records)
+            distinct += len(np.unique(records['timestamp']))
+            if distinct >= max_ticks:
+                break
+        if not parts:
+            return np.empty(0, dtype=HISTORY_RECORD_DTYPE)
+        result = np.concatenate(parts[::-1])
+        tick_times = np.unique(result['timestamp'])
+        if len(tick_times) > max_ticks:
+            result = result[np.searchsorted(result['timestamp'], tick_times[-max_ticks], side='left'):]
+        return self._filter_symbols(np.array(result), symbols)
+
+    def _filter_symbols(self, records, symbols):
+        if symbols is None or len(records) == 0:
+            return records
+        wanted = [self._symbol_ids[symbol] for symbol in symbols if symbol in self._symbol_ids]
+        return records[np.isin(records['symbol_id'], wanted)]
+
+    # 레코드 배열의 심볼 번호 -> 심볼 문자열 배열
+    def symbol_names(self, records):
+        return np.array(self.symbols, dtype=object)[records['symbol_id']] if len(records) else np.empty(0, dtype=object)
+
+    # 기존 가로형 CSV(Timestamp (KST), {코인}_closing_price, ...)를 저장소로 옮김. 옮긴 행 수를 반환합니다.
+    # 헤더에 있는 모든 코인을 옮기고, 날짜별로 모아서 파티션마다 한 번에 씁니다.
+    def import_csv(self, csv_path):
+        with open(csv_path, 'r', encoding='utf-8', newline='') as f:
+            reader = csv.reader(f)
+            header = next(reader, [])
+            column_index = {name: i for i, name in enumerate(header)}
+            coins = [name[:-len('_closing_price')] for name in header if name.endswith('_closing_price')]
+            symbol_ids = [self.symbol_id(coin) for coin in coins]
+            pending = {} # 파티션 이름 -> 레코드 튜플 목록
+            imported = 0
+            for row in reader:
+                try:
+                    timestamp = datetime.strptime(row[column_index["Timestamp (KST)"]], '%Y-%m-%d %H:%M:%S').timestamp()
+                except (KeyError, IndexError, ValueError):
+                    continue
+                if self._last_timestamp is not None:
+                    timestamp = max(timestamp, self._last_timestamp)
+                self._last_timestamp = timestamp
+                records = pending.setdefault(partition_name(timestamp), [])
+                for coin, symbol_id in zip(coins, symbol_ids):
+                    values = []
+                    for field in ('closing_price', 'fluctate_rate_24H', 'units_traded_24H'):
+                        i = column_index.get(f"{coin}_{field}")
+                        values.append(to_float(row[i]) if i is not None and i < len(row) else np.nan)
+                    records.append((timestamp, symbol_id, *values))
+                imported += 1
+        for name, records in pending.items():
+            self._write(name, np.array(records, dtype=HISTORY_RECORD_DTYPE))
+        return imported
+
+
+def main():
+    parser = argparse.ArgumentParser(description="시세 이력 저장소 관리")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    migrate_parser = subparsers.add_parser('migrate', help="기존 CSV 파일을 날짜별 이력 저장소로 변환")
+    migrate_parser.add_argument('csv_path')
+    migrate_parser.add_argument('store_dir')
+    info_parser = subparsers.add_parser('info', help="저장소의 파티션과 레코드 수 출력")
+    info_parser.add_argument('store_dir')
+    args = parser.parse_args()
+
+    if args.command == 'migrate':
+        store = HistoryStore(args.store_dir)
+        if store.partitions():
+            raise SystemExit(f"[중단] '{args.store_dir}'에 이미 데이터가 있습니다. 빈 디렉터리를 지정하세요.")
+        start = time.perf_counter()
+        rows = store.import_csv(args.csv_path)
+        print(f"CSV {rows}행 -> 파티션 {len(store.partitions())}개, 심볼 {len(store.symbols)}개 ({time.perf_counter() - start:.2f}초)")
+    elif args.command == 'info':
+        store = HistoryStore(args.store_dir)
+        print(f"심볼 {len(store.symbols)}개: {', '.join(store.symbols)}")
+        for name in store.partitions():
+            records = store._open_partition(name)
+            print(f"  {name}: 레코드 {len(records)}개, 시각 {len(np.unique(records['timestamp']))}개")
+
+
+if __name__ == "__main__":
+    main()
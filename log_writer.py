@@ -0,0 +1,146 @@
+# log_writer.py
+# 파트너, 이 모듈은 콘솔/로그 파일 출력을 백그라운드 스레드로 넘기는 비동기 로그 기록기입니다.
+# 탐지 루프는 메시지를 큐에 넣기만 하고, 실제 파일 쓰기/콘솔 출력은 별도 스레드가
+# 하나의 열린 파일 핸들로 모아서(batch) 처리합니다. 파일은 크기 또는 시간 기준으로 교체(rotate)됩니다.
+
+import atexit
+import os
+import queue
+import sys
+import threading
+import time
+
+# 로그 레벨 (콘솔 출력 레벨 설정용)
+LOG_LEVELS = {'DEBUG': 10, 'INFO': 20, 'WARNING': 30, 'ERROR': 40}
+
+_STOP = object() # 기록 스레드 종료 신호
+_ROTATE_RETRY_SECONDS = 60.0 # 교체에 실패하면 이 시간 동안은 다시 시도하지 않음 (매 flush마다 오류가 찍히지 않도록)
+
+
+class AsyncLogWriter:
+    # file_path: 로그 파일 경로
+    # console_level: 이 레벨 이상인 메시지만 콘솔에 출력 (파일에는 모두 기록)
+    # flush_interval: 파일/콘솔 버퍼를 비우는 최대 간격 (초)
+    # batch_size: 한 번에 모아서 쓰는 최대 메시지 수
+    # max_bytes: 로그 파일이 이 크기를 넘으면 교체 (0이면 크기 기준 교체 안 함)
+    # rotate_interval_seconds: 이 시간이 지나면 교체 (None이면 시간 기준 교체 안 함)
+    # backup_count: 보관할 이전 로그 파일 수 (file.log.1, file.log.2, ...)
+    # queue_size: 대기 큐 최대 길이. 가득 차면 탐지 루프를 막지 않고 메시지를 버리며 개수를 셉니다.
+    def __init__(self, file_path, console_level='INFO', flush_interval=0.5, batch_size=256,
+                 max_bytes=10 * 1024 * 1024, rotate_interval_seconds=None, backup_count=5,
+                 queue_size=10000, console_stream=None):
+        self.file_path = file_path
+        self.console_level = LOG_LEVELS[console_level]
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_bytes = max_bytes
+        self.rotate_interval_seconds = rotate_interval_seconds
+        self.backup_count = backup_count
+        self.console_stream = console_stream
+        self.dropped_messages = 0 # 큐가 가득 차서 버린 메시지 수
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._file = None
+        self._opened_at = 0.0
+        self._rotate_retry_at = 0.0
+
+    # 메시지를 큐에 넣기만 하고 바로 반환 (message는 문자열 또는 str()로 변환 가능한 객체)
+    def write(self, message, level='INFO'):
+        if self._thread is None:
+            self._start()
+        try:
+            self._queue.put_nowait((LOG_LEVELS[level], message))
+        except queue.Full:
+            self.dropped_messages += 1
+
+    # 남은 메시지를 모두 기록하고 스레드 종료 (프로그램 종료 시 자동 호출)
+    def close(self, timeout=5.0):
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _start(self):
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='async-log-writer', daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def _open(self):
+        self._file = open(self.file_path, 'a', encoding='utf-8')
+        self._opened_at = time.monotonic()
+
+    # 이름 바꾸기가 실패해도(Windows에서 다른 프로세스가 파일을 열고 있는 경우, 권한 등) 파일을 다시 열어
+    # 교체하지 못한 파일에 이어서 기록합니다. (닫힌 핸들에 쓰면 ValueError로 기록 스레드가 멈춤)
+    def _rotate(self):
+        self._file.close()
+        try:
+            if self.backup_count > 0:
+                for i in range(self.backup_count - 1, 0, -1):
+                    source = f"{self.file_path}.{i}"
+                    if os.path.exists(source):
+                        os.replace(source, f"{self.file_path}.{i + 1}")
+                os.replace(self.file_path, f"{self.file_path}.1")
+            else:
+                open(self.file_path, 'w', encoding='utf-8').close()
+        finally:
+            self._file = None
+            self._open()
+
+    def _run(self):
+        console = self.console_stream or sys.stdout
+        try:
+            self._open()
+        except IOError as e:
+            print(f"로그 파일 '{self.file_path}' 열기 오류: {e}")
+        last_flush = time.monotonic()
+        stopping = False
+
+        while not stopping:
+            batch = []
+            try:
+                batch.append(self._queue.get(timeout=self.flush_interval))
+                while len(batch) < self.batch_size:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+            if any(item is _STOP for item in batch):
+                batch = [item for item in batch if item is not _STOP]
+                stopping = True
+
+            if batch:
+                lines = [str(message) + "\n" for _, message in batch]
+                console.write("".join(line for (level, _), line in zip(batch, lines) if level >= self.console_level))
+                if self._file is not None:
+                    try:
+                        self._file.write("".join(lines))
+                    except IOError as e:
+                        console.write(f"로그 파일 '{self.file_path}' 쓰기 오류: {e}\n")
+
+            now = time.monotonic()
+            if stopping or now - last_flush >= self.flush_interval:
+                console.flush()
+                if self._file is None:
+                    try:
+                        self._open() # 열기/교체에 실패했던 파일을 다시 열어 봄
+                    except (IOError, OSError):
+                        pass
+                if self._file is not None:
+                    try:
+                        self._file.flush()
+                        if now >= self._rotate_retry_at and (
+                                (self.max_bytes and self._file.tell() >= self.max_bytes) or
+                                (self.rotate_interval_seconds and now - self._opened_at >= self.rotate_interval_seconds)):
+                            self._rotate()
+                    except (IOError, OSError) as e:
+                        self._rotate_retry_at = now + _ROTATE_RETRY_SECONDS
+                        console.write(f"로그 파일 '{self.file_path}' 교체 오류: {e}\n")
+                last_flush = now
+
+        if self._file is not None:
+            self._file.close()
+            self._file = None
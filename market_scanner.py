@@ -0,0 +1,128 @@
+# market_scanner.py
+# 파트너, 이 모듈은 ALL_KRW 티커 응답에 들어 있는 모든 심볼을 한꺼번에 검사하는 전체 시장 스캐너입니다.
+# 심볼 x 시간 행렬(numpy)에 매 주기 한 열씩 쌓고, 24H 변동률과 이동 평균 이탈률을 행렬 연산으로 한 번에 계산합니다.
+# 비용이 큰 코인별 REST 탐지(체결 내역, 호가창)는 스캔 점수가 높은 상위 K개 심볼에만 적용합니다.
+
+from collections import namedtuple
+
+import numpy as np
+
+from market_state import to_float
+
+# 스캔 결과 (모든 배열은 symbols와 같은 순서)
+#   fluctuate_rate: 최신 24H 변동률(%), moving_average: 최근 ma_window개 현재가 평균, deviation_percent: 이동 평균 대비 이탈률(%)
+#   score: 임계치 대비 비율 중 큰 값 (1 이상이면 이상 징후), flagged: score >= 1
+ScanResult = namedtuple('ScanResult', ['symbols', 'closing_price', 'fluctuate_rate', 'moving_average',
+                                       'deviation_percent', 'score', 'flagged'])
+
+
+class MarketScanner:
+    # capacity: 심볼마다 보관할 주기 수 (행렬의 열 수)
+    # ma_window: 이동 평균 창 크기 (analyze_and_notify_anomaly의 ma_window와 같은 의미, 현재 값 포함)
+    # initial_symbols: 처음 확보할 행 수 (새 심볼이 늘어나면 두 배씩 늘림)
+    def __init__(self, capacity, ma_window, initial_symbols=256):
+        self.capacity = capacity
+        self.ma_window = ma_window
+        self.symbols = [] # 행 번호 -> 심볼
+        self._rows = {} # 심볼 -> 행 번호
+        self._timestamps = np.full(capacity, np.nan)
+        self._prices = np.full((initial_symbols, capacity), np.nan)
+        self._fluctuations = np.full((initial_symbols, capacity), np.nan)
+        self._volumes = np.full((initial_symbols, capacity), np.nan)
+        self._head = 0 # 다음에 쓸 열
+        self._count = 0 # 채워진 열 수
+
+    def __len__(self):
+        return self._count
+
+    # 티커 응답의 'data' 딕셔너리를 새 열로 추가 (응답에 없는 심볼은 NaN)
+    def update(self, ticker_data, timestamp):
+        rows, prices, fluctuations, volumes = [], [], [], []
+        for symbol, info in ticker_data.items():
+            if not isinstance(info, dict): # ALL_KRW 응답의 'date' 같은 항목 제외
+                continue
+            rows.append(self._row_for(symbol))
+            prices.append(to_float(info.get('closing_price')))
+            fluctuations.append(to_float(info.get('fluctate_rate_24H')))
+            volumes.append(to_float(info.get('units_traded_24H')))
+
+        column = self._head
+        self._timestamps[column] = timestamp
+        for matrix, values in ((self._prices, prices), (self._fluctuations, fluctuations), (self._volumes, volumes)):
+            matrix[:, column] = np.nan
+            matrix[rows, column] = values
+        self._head = (column + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+
+    # 최근 length개 열의 인덱스 (오래된 것부터)
+    def _recent_columns(self, length):
+        length = min(length, self._count)
+        return (self._head - length + np.arange(length)) % self.capacity
+
+    # 모든 심볼의 24H 변동률 / 이동 평균 이탈률 검사
+    # 이동 평균은 최근 ma_window개 현재가(NaN 제외)의 평균이며, 데이터가 ma_window + 1개 미만이면 이탈률은 NaN입니다.
+    def scan(self, fluctuation_threshold, deviation_threshold):
+        n = len(self.symbols)
+        if self._count == 0:
+            empty = np.empty(0)
+            return ScanResult(np.array([], dtype=object), empty, empty, empty, empty, empty, np.zeros(0, dtype=bool))
+        latest = (self._head - 1) % self.capacity
+        closing_price = self._prices[:n, latest]
+        fluctuate_rate = self._fluctuations[:n, latest]
+
+        moving_average = np.full(n, np.nan)
+        deviation_percent = np.full(n, np.nan)
+        if self._count >= self.ma_window + 1:
+            window = self._prices[:n, self._recent_columns(self.ma_window)]
+            valid = ~np.isnan(window)
+            counts = valid.sum(axis=1)
+            sums = np.where(valid, window, 0.0).sum(axis=1)
+            has_mean = counts > 0
+            moving_average[has_mean] = sums[has_mean] / counts[has_mean]
+            usable = has_mean & (moving_average != 0) & ~np.isnan(closing_price)
+            deviation_percent[usable] = (closing_price[usable] - moving_average[usable]) / moving_average[usable] * 100
+
+        # np.fmax는 한쪽이 NaN이면 다른 쪽 값을 사용 (둘 다 NaN이면 NaN -> flagged 아님)
+        score = np.fmax(np.abs(fluctuate_rate) / fluctuation_threshold, np.abs(deviation_percent) / deviation_threshold)
+        flagged = score >= 1
+        return ScanResult(np.array(self.symbols, dtype=object), closing_price, fluctuate_rate,
+                          moving_average, deviation_percent, score, flagged)
+
+    # 이상 징후로 표시된 심볼 중 점수가 높은 순으로 최대 k개의 인덱스 (exclude에 있는 심볼은 제외)
+    @staticmethod
+    def top_flagged(result, k, exclude=()):
+        candidates = np.flatnonzero(result.flagged)
+        if exclude:
+            excluded = set(exclude)
+            candidates = np.array([i for i in candidates if result.symbols[i] not in excluded], dtype=np.intp)
+        if len(candidates) == 0 or k <= 0:
+            return []
+        order = np.argsort(-result.score[candidates], kind='stable')
+        return [int(i) for i in candidates[order[:k]]]
+
+    # 심볼 하나의 이력 (시각, 현재가, 24H 변동률, 24H 거래량 배열, 오래된 것부터). 처음 승격된 코인의 상태를 채우는 데 사용
+    def history(self, symbol):
+        columns = self._recent_columns(self._count)
+        row = self._rows.get(symbol)
+        if row is None:
+            empty = np.empty(0)
+            return empty, empty, empty, empty
+        return (self._timestamps[columns], self._prices[row, columns],
+                self._fluctuations[row, columns], self._volumes[row, columns])
+
+    def _row_for(self, symbol):
+        row = self._rows.get(symbol)
+        if row is None:
+            row = len(self.symbols)
+            if row == self._prices.shape[0]:
+                self._grow()
+            self.symbols.append(symbol)
+            self._rows[symbol] = row
+        return row
+
+    def _grow(self):
+        for name in ('_prices', '_fluctuations', '_volumes'):
+            matrix = getattr(self, name)
+            grown = np.full((matrix.shape[0] * 2, self.capacity), np.nan)
+            grown[:matrix.shape[0]] = matrix
+            setattr(self, name, grown)
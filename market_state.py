@@ -0,0 +1,211 @@
+# market_state.py
+# 파트너, 이 모듈은 코인별 시세 이력을 메모리에 유지하기 위한 자료구조를 담고 있습니다.
+# 매 주기마다 CSV 파일 전체를 다시 읽는 대신, 고정 크기의 배열 기반 링 버퍼에
+# 최신 데이터를 누적하고 탐지 함수들이 이 버퍼를 직접 읽도록 합니다.
+
+import math
+from collections import deque
+
+import numpy as np
+
+from trade_tape import TradeTape
+
+
+# 문자열/None/'N/A' 값을 float으로 변환합니다. 변환할 수 없으면 NaN을 반환합니다.
+# (수집 시점에 한 번만 변환해 두면 분석 단계에서 문자열을 다시 파싱할 필요가 없습니다.)
+def to_float(value):
+    if value is None:
+        return math.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+# 코인 하나의 시세 이력(시각, 현재가, 24H 변동률, 24H 거래량)을 담는 고정 크기 링 버퍼
+# 버퍼가 가득 차면 가장 오래된 값부터 덮어씁니다. 모든 추가 연산은 O(1)입니다.
+class CoinRingBuffer:
+    FIELDS = ('timestamp', 'closing_price', 'fluctate_rate_24H', 'units_traded_24H')
+
+    def __init__(self, capacity):
+        if capacity <= 0:
+            raise ValueError(f"링 버퍼 크기는 1 이상이어야 합니다: {capacity}")
+        self.capacity = capacity
+        # 각 필드를 별도의 float64 배열로 보관 (timestamp는 epoch 초 단위)
+        self._columns = {field: np.full(capacity, np.nan) for field in self.FIELDS}
+        self._next_index = 0 # 다음에 기록할 위치
+        self._size = 0 # 현재 저장된 데이터 개수
+
+    def __len__(self):
+        return self._size
+
+    # 새 데이터 포인트 추가 (값은 숫자 또는 'N/A' 같은 문자열 모두 허용)
+    # timestamp는 시간 기준 조회(values_at)를 위해 단조 증가해야 하므로, 시스템 시계가 뒤로 가면 직전 시각으로 맞춥니다.
+    def append(self, timestamp, closing_price, fluctate_rate_24H, units_traded_24H):
+        i = self._next_index
+        if self._size > 0:
+            timestamp = max(timestamp, self._columns['timestamp'][(i - 1) % self.capacity])
+        self._columns['timestamp'][i] = timestamp
+        self._columns['closing_price'][i] = to_float(closing_price)
+        self._columns['fluctate_rate_24H'][i] = to_float(fluctate_rate_24H)
+        self._columns['units_traded_24H'][i] = to_float(units_traded_24H)
+        self._next_index = (i + 1) % self.capacity
+        if self._size < self.capacity:
+            self._size += 1
+
+    # 지정한 필드의 최근 count개 값을 시간순(오래된 것 -> 최신)으로 반환
+    # 버퍼가 한 바퀴 돌지 않은 경우에는 복사 없이 뷰(view)를 반환합니다.
+    def tail(self, field, count):
+        column = self._columns[field]
+        count = min(count, self._size)
+        if count <= 0:
+            return column[:0]
+        start = (self._next_index - count) % self.capacity
+        if start + count <= self.capacity:
+            return column[start:start + count]
+        return np.concatenate((column[start:], column[:self._next_index]))
+
+    # 지정한 필드의 최신 값 (데이터가 없으면 NaN)
+    def latest(self, field):
+        if self._size == 0:
+            return math.nan
+        return float(self._columns[field][(self._next_index - 1) % self.capacity])
+
+    # 시각 배열 epochs 각각에 대해 '그 시각 이전(포함)의 마지막 데이터 포인트'의 필드 값을 한 번에 조회
+    # (예: 현재 시각 - 창 길이에서의 현재가). 그보다 오래된 데이터가 없으면 NaN.
+    # 버퍼는 시간순이므로 두 구간(한 바퀴 돈 경우)에 대한 이진 탐색으로 시각 하나당 O(log n)입니다.
+    def values_at(self, field, epochs):
+        epochs = np.asarray(epochs, dtype=np.float64)
+        result = np.full(epochs.shape, np.nan)
+        if self._size == 0:
+            return result
+        timestamps = self._columns['timestamp']
+        values = self._columns[field]
+        start = (self._next_index - self._size) % self.capacity
+        # 오래된 구간 [start, start + len1)과 최신 구간 [0, len2) (한 바퀴 돌지 않았으면 최신 구간은 비어 있음)
+        len1 = min(self._size, self.capacity - start)
+        len2 = self._size - len1
+        positions = np.searchsorted(timestamps[start:start + len1], epochs, side='right') - 1
+        found = positions >= 0
+        result[found] = values[start + positions[found]]
+        if len2 > 0:
+            positions = np.searchsorted(timestamps[:len2], epochs, side='right') - 1
+            found = positions >= 0
+            result[found] = values[positions[found]]
+        return result
+
+    # 시각 하나에 대한 values_at
+    def value_at(self, field, epoch):
+        return float(self.values_at(field, (epoch,))[0])
+
+
+# 고정 길이 창(window)에 대한 이동 통계를 새 값이 들어올 때마다 O(1)로 갱신하는 클래스
+# 합계/제곱합(이동 평균, 표준편차), 단조 덱(이동 최소/최대), EMA를 함께 유지합니다.
+# NaN(데이터 없음)도 창의 한 칸을 차지하지만 통계 계산에서는 제외됩니다.
+# (pandas의 tail(window) + dropna() + mean()과 같은 결과)
+class RollingStats:
+    # 누적 합계의 부동소수점 오차가 쌓이지 않도록 이 횟수마다 창 전체로 합계를 다시 계산합니다.
+    RESUM_INTERVAL = 10000
+
+    def __init__(self, window):
+        if window <= 0:
+            raise ValueError(f"이동 통계 창 크기는 1 이상이어야 합니다: {window}")
+        self.window = window
+        self.ema_alpha = 2.0 / (window + 1)
+        self._values = [math.nan] * window # 창 안의 원본 값 (고정 크기 순환 배열)
+        self._updates = 0 # 지금까지 들어온 값의 개수 (NaN 포함)
+        self.count = 0 # 창 안의 유효 값 개수
+        self._sum = 0.0
+        self._sum_sq = 0.0
+        self._min_deque = deque() # (순번, 값) - 값이 증가하는 순서
+        self._max_deque = deque() # (순번, 값) - 값이 감소하는 순서
+        self.ema = math.nan
+        self.last = math.nan
+
+    def update(self, value):
+        value = to_float(value)
+        seq = self._updates
+        slot = seq % self.window
+
+        # 창 밖으로 밀려나는 값 제거
+        old = self._values[slot]
+        if not math.isnan(old):
+            self._sum -= old
+            self._sum_sq -= old * old
+            self.count -= 1
+        self._values[slot] = value
+        self._updates += 1
+        self.last = value
+
+        expired = seq - self.window
+        while self._min_deque and self._min_deque[0][0] <= expired:
+            self._min_deque.popleft()
+        while self._max_deque and self._max_deque[0][0] <= expired:
+            self._max_deque.popleft()
+
+        if not math.isnan(value):
+            self._sum += value
+            self._sum_sq += value * value
+            self.count += 1
+            while self._min_deque and self._min_deque[-1][1] >= value:
+                self._min_deque.pop()
+            self._min_deque.append((seq, value))
+            while self._max_deque and self._max_deque[-1][1] <= value:
+                self._max_deque.pop()
+            self._max_deque.append((seq, value))
+            self.ema = value if math.isnan(self.ema) else self.ema + self.ema_alpha * (value - self.ema)
+
+        if self._updates % self.RESUM_INTERVAL == 0:
+            valid = [v for v in self._values if not math.isnan(v)]
+            self._sum = math.fsum(valid)
+            self._sum_sq = math.fsum(v * v for v in valid)
+
+    # 지금까지 들어온 값의 개수 (창 크기와 무관, NaN 포함)
+    @property
+    def observations(self):
+        return self._updates
+
+    @property
+    def mean(self):
+        return self._sum / self.count if self.count > 0 else math.nan
+
+    # 표본 표준편차 (ddof=1, pandas 기본값과 동일)
+    @property
+    def std(self):
+        if self.count < 2:
+            return math.nan
+        variance = (self._sum_sq - self._sum * self._sum / self.count) / (self.count - 1)
+        return math.sqrt(variance) if variance > 0 else 0.0
+
+    @property
+    def minimum(self):
+        return self._min_deque[0][1] if self._min_deque else math.nan
+
+    @property
+    def maximum(self):
+        return self._max_deque[0][1] if self._max_deque else math.nan
+
+    # 이동 평균 대비 이탈률(%)
+    # value를 주지 않으면 가장 최근 값 기준. 평균이 0이거나 데이터가 없으면 NaN.
+    def deviation_percent(self, value=None):
+        value = self.last if value is None else value
+        mean = self.mean
+        if math.isnan(mean) or mean == 0 or math.isnan(value):
+            return math.nan
+        return (value - mean) / mean * 100
+
+
+# 코인 하나에 대해 수집기가 유지하는 모든 메모리 상태를 묶어 두는 컨테이너
+class CoinState:
+    def __init__(self, symbol, history_capacity, stats_window, trade_tape_capacity):
+        self.symbol = symbol
+        self.buffer = CoinRingBuffer(history_capacity)
+        self.price_stats = RollingStats(stats_window) # 현재가 이동 통계 (추세 이탈 분석용)
+        self.trade_tape = TradeTape(trade_tape_capacity) # 주기 간 중복 없이 이어 붙인 체결 내역
+        self.order_book = None # 최신 호가창 스냅샷 (order_book.OrderBookSnapshot, 받지 못했으면 None)
+        self.order_book_features = None # 최신 호가창 깊이 지표 (order_book.DepthFeatures)
+
+    # 새 티커 값을 링 버퍼와 이동 통계에 함께 반영
+    def append_ticker(self, timestamp, closing_price, fluctate_rate_24H, units_traded_24H):
+        self.buffer.append(timestamp, closing_price, fluctate_rate_24H, units_traded_24H)
+        self.price_stats.update(self.buffer.latest('closing_price'))
@@ -0,0 +1,208 @@
+# metrics.py
+# 파트너, 이 모듈은 수집 루프의 단계별 소요 시간(히스토그램)과 횟수(카운터)를 메모리에 모으는 가벼운 계측 도구입니다.
+# 단계 하나를 재는 비용은 perf_counter() 두 번 + 잠금 한 번 + 버킷 이진 탐색 정도(수 마이크로초)라서
+# 수집 주기에 비해 무시할 만하며, 실제 비용은 measure_observation_cost()로 재서 로그/지표에 함께 남깁니다.
+# 모은 값은 to_dict()로 공유 스냅샷(shared_data.json)에 실리고, 웹 서버가 format_prometheus()로 /metrics에 내보냅니다.
+
+import bisect
+import math
+import threading
+import time
+
+# 단계/HTTP 요청 소요 시간 히스토그램 버킷 상한 (초)
+DEFAULT_LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# 지표 이름 -> (Prometheus 종류, 설명). 여기 없는 이름도 기록할 수 있으며 설명 없이 내보냅니다.
+METRIC_DESCRIPTIONS = {
+    'stage_seconds': ('histogram', "수집 루프 단계별 소요 시간 (초)"),
+    'http_request_seconds': ('histogram', "엔드포인트 그룹별 HTTP 요청 소요 시간 (재시도는 시도마다 따로, 초)"),
+    'cycles_total': ('counter', "작업을 실행한 수집 루프 반복 수"),
+    'cycle_overruns_total': ('counter', "작업 시간이 티커 주기를 넘긴 수집 루프 반복 수"),
+    'anomalies_total': ('counter', "탐지기별 이상 징후 이벤트 수"),
+    'http_requests_total': ('counter', "엔드포인트 그룹별 get() 호출 수"),
+    'http_retries_total': ('counter', "엔드포인트 그룹별 재시도 수"),
+    'http_errors_total': ('counter', "엔드포인트 그룹별 재시도 후에도 실패한 요청 수"),
+    'http_throttled_total': ('counter', "엔드포인트 그룹별 429 응답 수"),
+    'http_short_circuited_total': ('counter', "서킷 브레이커가 열려 보내지 않은 요청 수"),
+    'scheduler_job_runs_total': ('counter', "작업 종류별 실행 수"),
+    'scheduler_deadline_misses_total': ('counter', "작업 종류별 마감 초과 수"),
+    'scheduler_deferrals_total': ('counter', "작업 종류별 요청 예산 대기로 미룬 수"),
+    'circuit_breaker_open': ('gauge', "엔드포인트 그룹별 서킷 브레이커 열림 여부 (1 = 열림 또는 half-open)"),
+    'instrumentation_overhead_ratio': ('gauge', "계측 비용 추정치 / 수집 루프 작업 시간"),
+}
+
+
+# 고정 버킷 히스토그램 하나 (버킷별 개수는 누적이 아닌 구간 개수로 보관하고, 내보낼 때 누적으로 바꿈)
+class LatencyHistogram:
+    __slots__ = ('buckets', 'counts', 'count', 'sum', 'max')
+
+    def __init__(self, buckets=DEFAULT_LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1) # 마지막 칸은 가장 큰 상한을 넘은 값 (+Inf)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    # 누적 개수 기준 분위수 근사값 (해당 분위가 들어 있는 버킷의 상한, 데이터가 없으면 NaN)
+    def quantile(self, q):
+        if self.count == 0:
+            return math.nan
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return self.max
+
+    def to_dict(self):
+        return {'buckets': list(self.buckets), 'counts': list(self.counts), 'count': self.count, 'sum': self.sum, 'max': self.max}
+
+
+# with 문으로 감싼 구간의 소요 시간을 히스토그램에 기록 (contextmanager 데코레이터보다 호출 비용이 작음)
+class _Span:
+    __slots__ = ('_registry', '_name', '_labels', '_started')
+
+    def __init__(self, registry, name, labels):
+        self._registry = registry
+        self._name = name
+        self._labels = labels
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._registry.observe(self._name, time.perf_counter() - self._started, **self._labels)
+        return False
+
+
+# 이름 + 레이블별 히스토그램/카운터/게이지 모음 (여러 스레드에서 기록해도 안전)
+class MetricsRegistry:
+    def __init__(self, buckets=DEFAULT_LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.observations = 0 # 지금까지의 observe() 호출 수 (계측 비용 추정용)
+        self._histograms = {} # (이름, 정렬된 레이블 튜플) -> LatencyHistogram
+        self._counters = {} # (이름, 정렬된 레이블 튜플) -> 값
+        self._gauges = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = LatencyHistogram(self.buckets)
+            histogram.observe(value)
+            self.observations += 1
+
+    def increment(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    # 외부에서 이미 세고 있는 누적 값(클라이언트/스케줄러 통계 등)을 그대로 카운터로 옮길 때 사용
+    def set_counter(self, name, value, **labels):
+        with self._lock:
+            self._counters[(name, tuple(sorted(labels.items())))] = value
+
+    def set_gauge(self, name, value, **labels):
+        with self._lock:
+            self._gauges[(name, tuple(sorted(labels.items())))] = value
+
+    # 예) with metrics.span('stage_seconds', stage='publish'): ...
+    def span(self, name, **labels):
+        return _Span(self, name, labels)
+
+    def histogram(self, name, **labels):
+        return self._histograms.get((name, tuple(sorted(labels.items()))))
+
+    # 이름이 name인 모든 히스토그램 [(레이블 딕셔너리, LatencyHistogram), ...] (레이블 순)
+    def histograms(self, name):
+        with self._lock:
+            return [(dict(labels), histogram) for (key_name, labels), histogram in sorted(self._histograms.items()) if key_name == name]
+
+    def gauge(self, name, **labels):
+        return self._gauges.get((name, tuple(sorted(labels.items()))))
+
+    def counter(self, name, **labels):
+        return self._counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    # 공유 스냅샷에 실을 JSON 직렬화 가능한 사본
+    # {'histograms': [{'name', 'labels', 'buckets', 'counts', 'count', 'sum', 'max'}], 'counters': [{'name', 'labels', 'value'}], 'gauges': [...]}
+    def to_dict(self):
+        with self._lock:
+            return {
+                'histograms': [dict(histogram.to_dict(), name=name, labels=dict(labels)) for (name, labels), histogram in sorted(self._histograms.items())],
+                'counters': [{'name': name, 'labels': dict(labels), 'value': value} for (name, labels), value in sorted(self._counters.items())],
+                'gauges': [{'name': name, 'labels': dict(labels), 'value': value} for (name, labels), value in sorted(self._gauges.items())],
+            }
+
+
+# span() 하나(레이블 하나, 잠금 경합 없음)의 평균 비용(초)을 별도 레지스트리에서 측정
+def measure_observation_cost(samples=20000):
+    registry = MetricsRegistry()
+    started = time.perf_counter()
+    for _ in range(samples):
+        with registry.span('stage_seconds', stage='calibration'):
+            pass
+    return (time.perf_counter() - started) / samples
+
+
+# 레이블 값의 역슬래시, 큰따옴표, 줄바꿈을 Prometheus 텍스트 형식에 맞게 이스케이프
+def _escape_label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels, extra=None):
+    items = list(labels.items()) + (list(extra.items()) if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape_label_value(value)}"' for key, value in items) + "}"
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        if math.isnan(value):
+            return "NaN"
+        if math.isinf(value):
+            return "+Inf" if value > 0 else "-Inf"
+        return repr(value)
+    return str(value)
+
+
+# MetricsRegistry.to_dict() 결과 -> Prometheus 텍스트 형식 (version 0.0.4)
+# 모든 지표 이름 앞에 prefix를 붙이고, 히스토그램은 누적 버킷(_bucket{le=...})과 _sum, _count로 내보냅니다.
+def format_prometheus(snapshot, prefix="bithumb_", descriptions=METRIC_DESCRIPTIONS):
+    families = {} # prefix를 붙인 지표 이름 -> (종류, 원래 이름, [줄, ...])
+    for kind, entries in (('histogram', snapshot.get('histograms', [])), ('counter', snapshot.get('counters', [])), ('gauge', snapshot.get('gauges', []))):
+        for entry in entries:
+            name = prefix + entry['name']
+            lines = families.setdefault(name, (kind, entry['name'], []))[2]
+            labels = entry.get('labels', {})
+            if kind != 'histogram':
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(entry['value'])}")
+                continue
+            cumulative = 0
+            for bound, count in zip(entry['buckets'], entry['counts']):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels(labels, {'le': _format_value(float(bound))})} {cumulative}")
+            lines.append(f"{name}_bucket{_format_labels(labels, {'le': '+Inf'})} {entry['count']}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(float(entry['sum']))}")
+            lines.append(f"{name}_count{_format_labels(labels)} {entry['count']}")
+
+    output = []
+    for name, (kind, base_name, lines) in families.items():
+        description = descriptions.get(base_name)
+        if description is not None:
+            output.append(f"# HELP {name} {description[1]}")
+        output.append(f"# TYPE {name} {kind}")
+        output.extend(lines)
+    return "\n".join(output) + "\n"
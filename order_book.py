@@ -0,0 +1,115 @@
+# order_book.py
+# 파트너, 이 모듈은 빗썸 호가창(/orderbook) 응답을 다루는 자료구조를 담고 있습니다.
+# 응답을 한 번만 파싱해 매도/매수 쪽마다 (가격, 수량) float 리스트로 보관하고,
+# 매물벽 탐지와 깊이(depth) 지표 계산이 같은 파싱 결과를 함께 씁니다.
+# 수집기가 받는 호가창은 쪽마다 ORDER_BOOK_COUNT(10)개, 빗썸 최대치로도 30개 안팎이라
+# numpy 배열을 만드는 고정 비용이 계산보다 커서 벡터 연산 대신 파이썬 루프로 계산합니다. (benchmark_suite.py orderbook 참고)
+
+import bisect
+from collections import namedtuple
+
+# 호가창 깊이 지표
+#   best_ask, best_bid: 최우선 매도/매수 호가, spread: best_ask - best_bid, spread_percent: 중간가 대비 스프레드(%)
+#   mid_price: (best_ask + best_bid) / 2 (한쪽이 비어 있으면 NaN)
+#   bid_depth, ask_depth: 기준가 대비 depth_percent % 이내 호가의 누적 수량
+#   imbalance: (bid_depth - ask_depth) / (bid_depth + ask_depth), -1(매도 우위) ~ 1(매수 우위), 둘 다 0이면 0
+DepthFeatures = namedtuple('DepthFeatures', ['best_ask', 'best_bid', 'spread', 'spread_percent', 'mid_price',
+                                             'depth_percent', 'bid_depth', 'ask_depth', 'imbalance'])
+
+
+# 호가 목록([{'price': str, 'quantity': str}, ...])을 (가격 리스트, 수량 리스트)로 파싱하고 순서가 어긋난 경우에만 정렬
+# descending: 매수 호가처럼 가격 내림차순이어야 하면 True. 잘못된 항목은 건너뛰고 (원본 항목, 예외) 목록으로 반환합니다.
+def _parse_levels(levels, descending):
+    errors = []
+    try:
+        prices = [float(level['price']) for level in levels]
+        quantities = [float(level['quantity']) for level in levels]
+    except (ValueError, KeyError, TypeError):
+        # 잘못된 항목이 섞인 경우에만 항목별로 다시 파싱
+        prices, quantities = [], []
+        for level in levels:
+            try:
+                price, quantity = float(level['price']), float(level['quantity'])
+            except (ValueError, KeyError, TypeError) as e:
+                errors.append((level, e))
+                continue
+            prices.append(price)
+            quantities.append(quantity)
+    # 빗썸 응답은 보통 이미 정렬되어 있으므로 정렬 여부만 확인 (이미 정렬된 리스트의 sorted()는 한 번 훑는 비용)
+    if prices != sorted(prices, reverse=descending):
+        # 안정 정렬 (같은 가격의 호가는 응답 순서 유지)
+        order = sorted(range(len(prices)), key=(lambda i: -prices[i]) if descending else prices.__getitem__)
+        prices, quantities = [prices[i] for i in order], [quantities[i] for i in order]
+    return prices, quantities, errors
+
+
+# 한 번의 호가창 응답 스냅샷
+#   ask_prices, ask_quantities: 매도 호가 (가격 오름차순, 최우선 호가가 0번)
+#   bid_prices, bid_quantities: 매수 호가 (가격 내림차순, 최우선 호가가 0번)
+class OrderBookSnapshot:
+    __slots__ = ('ask_prices', 'ask_quantities', 'bid_prices', 'bid_quantities')
+
+    def __init__(self, ask_prices, ask_quantities, bid_prices, bid_quantities):
+        self.ask_prices = ask_prices
+        self.ask_quantities = ask_quantities
+        self.bid_prices = bid_prices
+        self.bid_quantities = bid_quantities
+
+    # 빗썸 응답의 'data' 딕셔너리({'asks': [...], 'bids': [...]})를 파싱합니다.
+    # 파싱에 실패한 항목은 건너뛰고 (쪽 'ask'/'bid', 원본 항목, 예외) 목록으로 함께 반환합니다.
+    @classmethod
+    def from_api(cls, order_book_data):
+        ask_prices, ask_quantities, ask_errors = _parse_levels(order_book_data.get('asks') or [], descending=False)
+        bid_prices, bid_quantities, bid_errors = _parse_levels(order_book_data.get('bids') or [], descending=True)
+        errors = [('ask', level, e) for level, e in ask_errors] + [('bid', level, e) for level, e in bid_errors]
+        return cls(ask_prices, ask_quantities, bid_prices, bid_quantities), errors
+
+    # 쪽('ask'/'bid')별 (가격 리스트, 수량 리스트)
+    def side(self, side):
+        if side == 'ask':
+            return self.ask_prices, self.ask_quantities
+        return self.bid_prices, self.bid_quantities
+
+    # 쪽별로 이번 호가창에 보이는 가격 범위 {'ask': (최저가, 최고가), 'bid': (최저가, 최고가)} (빈 쪽은 None)
+    # 벽 추적기가 호가 수 밖으로 밀려난 벽을 철회로 세지 않도록 WallTracker.update에 넘깁니다.
+    def price_ranges(self):
+        return {
+            'ask': (self.ask_prices[0], self.ask_prices[-1]) if self.ask_prices else None,
+            'bid': (self.bid_prices[-1], self.bid_prices[0]) if self.bid_prices else None,
+        }
+
+    # 매물벽 인덱스: 기준가에서 price_distance_percent % 이상 떨어져 있고 수량이 threshold_quantity 이상인 호가
+    # 반환값: 해당 쪽 안의 인덱스 리스트 (최우선 호가에 가까운 순)
+    def find_walls(self, side, reference_price, price_distance_percent, threshold_quantity):
+        prices, quantities = self.side(side)
+        # 수량 조건을 먼저 확인 (벽은 드물어서 대부분 max() 한 번으로 끝남)
+        if reference_price == 0 or not quantities or max(quantities) < threshold_quantity:
+            return []
+        return [i for i, quantity in enumerate(quantities)
+                if quantity >= threshold_quantity and abs(prices[i] - reference_price) / reference_price * 100 >= price_distance_percent]
+
+    # 기준가 대비 가격 차이(%) 리스트 (find_walls 결과와 함께 로그/근거에 사용)
+    def deviation_percent(self, side, reference_price):
+        prices, _ = self.side(side)
+        return [abs(price - reference_price) / reference_price * 100 for price in prices]
+
+    # 깊이 지표 계산 (기준가를 주지 않으면 중간가 기준)
+    def depth_features(self, depth_percent, reference_price=None):
+        best_ask = self.ask_prices[0] if self.ask_prices else float('nan')
+        best_bid = self.bid_prices[0] if self.bid_prices else float('nan')
+        mid_price = (best_ask + best_bid) / 2
+        spread = best_ask - best_bid
+        spread_percent = spread / mid_price * 100 if mid_price else float('nan')
+        if reference_price is None:
+            reference_price = mid_price
+        if reference_price != reference_price or reference_price == 0: # NaN이거나 0
+            bid_depth = ask_depth = 0.0
+        else:
+            # 호가는 정렬되어 있으므로 범위 끝은 이진 탐색으로 찾고 누적 수량은 앞부분 합계
+            ask_limit = reference_price * (1 + depth_percent / 100)
+            bid_limit = reference_price * (1 - depth_percent / 100)
+            ask_depth = float(sum(self.ask_quantities[:bisect.bisect_right(self.ask_prices, ask_limit)]))
+            bid_depth = float(sum(self.bid_quantities[:bisect.bisect_right(self.bid_prices, -bid_limit, key=lambda price: -price)]))
+        total = bid_depth + ask_depth
+        imbalance = (bid_depth - ask_depth) / total if total > 0 else 0.0
+        return DepthFeatures(best_ask, best_bid, spread, spread_percent, mid_price, depth_percent, bid_depth, ask_depth, imbalance)
@@ -0,0 +1,77 @@
+# rate_limit.py
+# 파트너, 이 모듈은 빗썸 Public API 요청 수를 제한하기 위한 토큰 버킷(token bucket)입니다.
+# 초당 rate개의 토큰이 채워지고(최대 capacity개), 요청 하나가 토큰 하나를 씁니다.
+# 여러 스레드에서 동시에 써도 안전합니다.
+
+import threading
+import time
+
+
+class TokenBucket:
+    # rate: 초당 채워지는 토큰 수 (= 허용 요청률), capacity: 한 번에 몰아서 쓸 수 있는 최대 토큰 수 (버스트)
+    def __init__(self, rate, capacity, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self._clock = clock
+        self._tokens = float(capacity)
+        self._updated_at = clock()
+        self._lock = threading.Lock()
+        self.granted = 0 # 토큰을 받은 요청 수
+        self.throttled = 0 # 토큰이 없어 거절되거나 기다려야 했던 횟수
+        self.total_wait_seconds = 0.0 # acquire()에서 토큰을 기다린 시간 합계
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    # 토큰이 있으면 바로 쓰고 True, 없으면 기다리지 않고 False
+    def try_acquire(self, tokens=1):
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                self.granted += 1
+                return True
+            self.throttled += 1
+            return False
+
+    # 미리 받아 둔 토큰을 쓰지 않았을 때 돌려줌 (최대 capacity개까지)
+    # 스케줄러가 작업을 허용하며 받아 둔 토큰을, 실제로 요청을 보내지 않은 작업만큼 돌려줄 때 씁니다.
+    def refund(self, tokens=1):
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.capacity, self._tokens + tokens)
+            self.granted -= tokens # 요청 하나가 토큰 하나이므로 허용 횟수에서도 뺌
+
+    # 토큰 tokens개가 모이기까지 남은 시간 (초, 지금 있으면 0)
+    def wait_time(self, tokens=1):
+        with self._lock:
+            self._refill()
+            return max(0.0, (tokens - self._tokens) / self.rate)
+
+    # 토큰이 생길 때까지 기다렸다가 씀. timeout(초) 안에 못 받으면 False
+    def acquire(self, tokens=1, timeout=None):
+        deadline = None if timeout is None else self._clock() + timeout
+        waited = False
+        start = self._clock()
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    self.granted += 1
+                    if waited:
+                        self.total_wait_seconds += self._clock() - start
+                    return True
+                delay = (tokens - self._tokens) / self.rate
+                if not waited:
+                    self.throttled += 1
+                    waited = True
+            if deadline is not None:
+                remaining = deadline - self._clock()
+                if remaining <= 0:
+                    self.total_wait_seconds += self._clock() - start
+                    return False
+                delay = min(delay, remaining)
+            time.sleep(delay)
@@ -0,0 +1,222 @@
+# replay.py
+# 파트너, 이 모듈은 저장된 시세 이력(과 기록된 체결 내역/호가창 응답)을 실시간 수집과 같은 탐지 함수들에 다시 흘려보내는 재생(백테스트) 엔진입니다.
+# 네트워크 요청이나 대기(sleep) 없이 기록된 시각을 그대로 시뮬레이션 시계로 사용하므로 한 달치 이력도 몇 분 안에 재생되며,
+# 코인마다 상태(링 버퍼, 이동 통계, 체결 테이프, 벽 추적기)가 독립적이므로 코인 단위로 여러 프로세스에 나누어 실행합니다.
+# 임계치(예: DEVIATION_THRESHOLD_PERCENT)를 바꿔 가며 재생하면 설정에 따라 이상 징후가 얼마나 나오는지 비교할 수 있습니다.
+#
+# 사용 예:
+#   python replay.py --store history_store --start 2026-01-01 --end 2026-02-01 --workers 4
+#   python replay.py --coins BTC ETH --set DEVIATION_THRESHOLD_PERCENT=0.5 --output replay_events.json
+#   python replay.py --recordings recordings (RESPONSE_RECORDING_ENABLED로 기록한 체결 내역/호가창 응답도 함께 재생)
+
+import argparse
+import heapq
+import json
+import math
+import os
+import time
+from collections import Counter, deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import anomaly_detection_system as ads
+from history_store import HistoryStore
+from log_writer import AsyncLogWriter
+from market_state import CoinState
+from order_book import OrderBookSnapshot
+from response_recorder import iter_recordings
+from trade_tape import TradeSnapshot
+
+# 재생 입력의 종류 (같은 시각이면 이 순서로 처리: 티커가 먼저 들어와야 호가창 탐지가 최신 현재가를 봄)
+KIND_TICKER = 0
+KIND_TRADES = 1
+KIND_ORDER_BOOK = 2
+
+# 코인 하나의 재생 결과
+#   ticks: 재생한 티커 시각 수, snapshots: 재생한 체결 내역/호가창 응답 수
+#   events: 탐지된 이상 징후 (AnomalyEvent.to_dict() 목록), elapsed_seconds: 재생에 걸린 시간
+CoinReplayResult = namedtuple('CoinReplayResult', ['coin', 'ticks', 'snapshots', 'events', 'elapsed_seconds'])
+
+
+# 원래의 로그 함수 (--log-file을 지정한 재생에서 사용)
+_print_and_log = ads.print_and_log
+
+
+# 탐지 함수들의 로그 출력을 버림 (재생 속도를 위해 기본값)
+def _discard_log(message, file_path=None, level="INFO"):
+    pass
+
+
+# 'YYYY-MM-DD' 또는 'YYYY-MM-DD HH:MM:SS' (로컬 시각) -> epoch 초
+def parse_time_argument(value):
+    for time_format in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(value, time_format).timestamp()
+        except ValueError:
+            continue
+    raise argparse.ArgumentTypeError(f"시각 형식이 올바르지 않습니다: {value} (예: 2026-01-01 또는 '2026-01-01 09:00:00')")
+
+
+# '이름=값' 형식의 설정 덮어쓰기 인자 파싱 (값은 JSON으로 해석, 예: DEVIATION_THRESHOLD_PERCENT=0.5)
+def parse_override_argument(value):
+    name, separator, raw = value.partition('=')
+    if not separator or not name.isupper() or not hasattr(ads, name):
+        raise argparse.ArgumentTypeError(f"알 수 없는 설정입니다: {value} (anomaly_detection_system.py의 대문자 설정 이름=값)")
+    try:
+        return name, json.loads(raw)
+    except json.JSONDecodeError:
+        raise argparse.ArgumentTypeError(f"설정 값을 해석할 수 없습니다: {value}")
+
+
+# 탐지 모듈의 전역 상태를 코인 하나만 재생하도록 초기화 (작업 프로세스는 여러 코인을 차례로 재생하므로 코인마다 호출)
+def _reset_detector_state(coin, overrides, log_file):
+    for name, value in overrides.items():
+        setattr(ads, name, [tuple(item) for item in value] if name == 'PUMP_DETECTION_WINDOWS' else value)
+    ads.global_coin_states = {coin: CoinState(coin, ads.IN_MEMORY_HISTORY_LENGTH, ads.MOVING_AVERAGE_WINDOW, ads.TRADE_TAPE_CAPACITY)}
+    ads.global_latest_ticker = {}
+    ads.global_wall_trackers = {}
+    ads.global_saved_wall_state = {}
+    ads.global_anomaly_events = deque() # 재생 중에는 모든 이벤트를 모음 (웹 UI용 최대 개수 제한 없음)
+    ads.global_event_sequence = 0
+    if log_file is None:
+        ads.print_and_log = _discard_log
+    else:
+        # 코인마다 별도 파일 (예: replay.log -> replay.BTC.log). 탐지 함수는 기본 로그 경로로 기록하므로 그 자리에 등록
+        root, ext = os.path.splitext(log_file)
+        ads._log_writers[ads.LOG_FILE_PATH] = AsyncLogWriter(f"{root}.{coin}{ext}", console_level="ERROR", max_bytes=0, queue_size=1000000)
+        ads.print_and_log = _print_and_log
+
+
+# 티커 이력 레코드(history_store)를 (시각, 종류, 순번, 값) 재생 입력으로 변환
+def _ticker_inputs(records):
+    columns = zip(records['timestamp'].tolist(), records['closing_price'].tolist(),
+                  records['fluctate_rate_24H'].tolist(), records['units_traded_24H'].tolist())
+    for i, (epoch, closing_price, fluctate_rate_24H, units_traded_24H) in enumerate(columns):
+        yield (epoch, KIND_TICKER, i, (closing_price, fluctate_rate_24H, units_traded_24H))
+
+
+# 기록된 응답 중 코인 하나의 체결 내역/호가창 응답을 (시각, 종류, 응답의 'data') 재생 입력으로 변환 (요청 시각순)
+# 동시에 보낸 요청은 기록 순서가 조금 뒤바뀔 수 있으므로 reorder_seconds 길이의 힙에 모았다가 시각순으로 내보냅니다.
+# 실패한 응답(상태 코드 200이 아니거나 형식이 다른 응답)은 건너뜁니다. (재시도 전 응답도 함께 기록되기 때문)
+def recorded_detail_inputs(recordings_dir, coin, start_epoch=None, end_epoch=None, reorder_seconds=60.0):
+    endpoint_kinds = {f"/transaction_history/{coin}_KRW": (KIND_TRADES, list), f"/orderbook/{coin}_KRW": (KIND_ORDER_BOOK, dict)}
+    pending = []
+    for i, response in enumerate(iter_recordings(recordings_dir, start_epoch, end_epoch)):
+        kind_and_type = endpoint_kinds.get(response.endpoint)
+        if kind_and_type is None or response.status_code != 200:
+            continue
+        try:
+            data = json.loads(response.body).get('data')
+        except (ValueError, AttributeError):
+            continue
+        kind, data_type = kind_and_type
+        if not isinstance(data, data_type):
+            continue
+        heapq.heappush(pending, (response.fetch_epoch, kind, i, data))
+        while pending[0][0] < response.fetch_epoch - reorder_seconds:
+            epoch, kind, _, data = heapq.heappop(pending)
+            yield epoch, kind, data
+    while pending:
+        epoch, kind, _, data = heapq.heappop(pending)
+        yield epoch, kind, data
+
+
+# 재생 입력 하나를 실시간 수집과 같은 경로로 탐지 함수들에 전달
+def _apply_input(coin, epoch, kind, payload):
+    current_time_kst = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(epoch))
+    if kind == KIND_TICKER:
+        closing_price, fluctate_rate_24H, units_traded_24H = payload
+        ads.global_coin_states[coin].append_ticker(epoch, closing_price, fluctate_rate_24H, units_traded_24H)
+        # 실시간 수집과 같이 값이 없으면 'N/A' (호가창 탐지가 이 값을 보고 건너뜀)
+        ads.global_latest_ticker[coin] = {
+            'closing_price': 'N/A' if math.isnan(closing_price) else closing_price,
+            'units_traded_24H': 'N/A' if math.isnan(units_traded_24H) else units_traded_24H
+        }
+        ads.analyze_and_notify_anomaly(ads.global_coin_states, ads.FLUCTUATION_THRESHOLD_PERCENT, ads.DEVIATION_THRESHOLD_PERCENT,
+                                       [coin], current_time_kst, ads.MOVING_AVERAGE_WINDOW)
+    elif kind == KIND_TRADES:
+        trade_snapshot, _ = TradeSnapshot.from_api(payload)
+        ads.process_trade_snapshot(coin, trade_snapshot, current_time_kst)
+    elif kind == KIND_ORDER_BOOK:
+        order_book, _ = OrderBookSnapshot.from_api(payload)
+        ads.process_order_book(coin, order_book, epoch, current_time_kst)
+
+
+# 코인 하나를 처음부터 끝까지 재생 (작업 프로세스에서 실행)
+# store_dir의 티커 이력 중 [start_epoch, end_epoch) 구간만 읽고 (해당 날짜 파티션만 열림),
+# detail_inputs: 함께 재생할 체결 내역/호가창 응답 [(시각, KIND_TRADES/KIND_ORDER_BOOK, 응답의 'data'), ...] (시각순)
+# recordings_dir를 주면 그 디렉터리의 응답 기록(response_recorder)에서 이 코인의 응답을 읽어 detail_inputs로 씁니다.
+def replay_coin(coin, store_dir, start_epoch=None, end_epoch=None, overrides=None, log_file=None, detail_inputs=(), recordings_dir=None):
+    started_at = time.perf_counter()
+    _reset_detector_state(coin, overrides or {}, log_file)
+    records = HistoryStore(store_dir).read_range(start_epoch, end_epoch, symbols=[coin])
+    if recordings_dir is not None:
+        detail_inputs = recorded_detail_inputs(recordings_dir, coin, start_epoch, end_epoch)
+    detail_inputs = ((epoch, kind, i, payload) for i, (epoch, kind, payload) in enumerate(detail_inputs))
+    ticks = snapshots = 0
+    for epoch, kind, _, payload in heapq.merge(_ticker_inputs(records), detail_inputs):
+        _apply_input(coin, epoch, kind, payload)
+        if kind == KIND_TICKER:
+            ticks += 1
+        else:
+            snapshots += 1
+    events = [event.to_dict() for event in ads.global_anomaly_events]
+    if log_file is not None:
+        ads._log_writers.pop(ads.LOG_FILE_PATH).close()
+    return CoinReplayResult(coin, ticks, snapshots, events, time.perf_counter() - started_at)
+
+
+# 여러 코인을 프로세스 풀로 나누어 재생하고 코인별 결과를 모아 반환 (완료 순서와 무관하게 coins 순서)
+# workers가 1이면 현재 프로세스에서 차례로 재생합니다 (디버깅용).
+def replay(coins, store_dir, start_epoch=None, end_epoch=None, overrides=None, workers=None, log_file=None, recordings_dir=None):
+    if workers == 1:
+        return [replay_coin(coin, store_dir, start_epoch, end_epoch, overrides, log_file, recordings_dir=recordings_dir) for coin in coins]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(replay_coin, coin, store_dir, start_epoch, end_epoch, overrides, log_file, recordings_dir=recordings_dir)
+                   for coin in coins]
+        return [future.result() for future in futures]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="저장된 시세 이력으로 이상 징후 탐지를 재생(백테스트)")
+    parser.add_argument('--store', default=ads.HISTORY_STORE_DIR, help="이력 저장소 디렉터리")
+    parser.add_argument('--start', type=parse_time_argument, default=None, help="재생 시작 시각 (포함, 로컬 시각)")
+    parser.add_argument('--end', type=parse_time_argument, default=None, help="재생 끝 시각 (미포함, 로컬 시각)")
+    parser.add_argument('--recordings', default=None, help="함께 재생할 응답 기록 디렉터리 (response_recorder, 기본값: 티커 이력만 재생)")
+    parser.add_argument('--coins', nargs='+', default=None, help="재생할 코인 (기본값: 저장소의 모든 심볼)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="작업 프로세스 수 (1이면 현재 프로세스에서 실행)")
+    parser.add_argument('--set', dest='overrides', type=parse_override_argument, action='append', default=[],
+                        metavar='NAME=VALUE', help="탐지 설정 덮어쓰기 (여러 번 지정 가능)")
+    parser.add_argument('--log-file', default=None, help="탐지 로그를 기록할 파일 (기본값: 기록하지 않음)")
+    parser.add_argument('--output', default=None, help="탐지된 이상 징후 이벤트를 저장할 JSON 파일")
+    args = parser.parse_args()
+
+    store = HistoryStore(args.store)
+    coins = args.coins or list(store.symbols)
+    if not coins:
+        raise SystemExit(f"[중단] 이력 저장소 '{args.store}'에 데이터가 없습니다.")
+    overrides = dict(args.overrides)
+
+    print(f"재생: 코인 {len(coins)}개, 작업 프로세스 {args.workers}개, 설정 덮어쓰기 {overrides or '없음'}")
+    started_at = time.perf_counter()
+    results = replay(coins, args.store, args.start, args.end, overrides, args.workers, args.log_file, args.recordings)
+    elapsed = time.perf_counter() - started_at
+
+    total_inputs = sum(result.ticks + result.snapshots for result in results)
+    detector_counts = Counter(event['detector'] for result in results for event in result.events)
+    for result in results:
+        coin_counts = Counter(event['detector'] for event in result.events)
+        print(f"  {result.coin}: 티커 {result.ticks}개, 응답 {result.snapshots}개, 이상 징후 {len(result.events)}건 "
+              f"{dict(coin_counts) if coin_counts else ''} ({result.elapsed_seconds:.2f}초)")
+    print(f"합계: 입력 {total_inputs}개를 {elapsed:.2f}초에 재생 (초당 {total_inputs / elapsed if elapsed > 0 else 0:,.0f}개), "
+          f"이상 징후 {sum(detector_counts.values())}건 {dict(detector_counts)}")
+
+    if args.output:
+        events = sorted((event for result in results for event in result.events), key=lambda event: (event['timestamp'], event['coin']))
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'overrides': overrides, 'start': args.start, 'end': args.end, 'events': events}, f, ensure_ascii=False, indent=2)
+        print(f"이상 징후 이벤트 {len(events)}건을 '{args.output}'에 저장했습니다.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+# response_recorder.py
+# 파트너, 이 모듈은 빗썸 API의 원본 응답을 받은 그대로 압축 파일에 남기는 기록기와, 그 파일을 순서대로 읽는 리더입니다.
+# 기록된 응답은 장애 상황 재현, 재생(replay.py), 벤치마크 입력으로 쓰입니다.
+#
+# 파일 형식: 날짜(로컬, 요청 시각 기준)별 파일 {날짜}.responses.gz
+#   파일은 gzip 멤버(청크)를 이어 붙인 것이라 gzip.open() 하나로 전체를 스트림으로 읽을 수 있고,
+#   청크 압축을 풀면 레코드가 이어져 있습니다.
+#   레코드 하나 = 헤더(요청 시각 f8, 응답 시간 f4, 상태 코드 u16, 대상 길이 u16, 본문 길이 u32, 리틀 엔디언)
+#                 + 대상('/orderbook/BTC_KRW?count=10', UTF-8) + 응답 본문(원본 바이트)
+#   기록 중 프로그램이 종료되어 마지막 청크가 잘려도, 그 앞의 레코드는 모두 읽을 수 있습니다.
+#
+# 탐지 루프는 기록할 응답을 크기가 정해진 큐에 넣기만 하고(가득 차면 버리고 개수를 셈),
+# 청크 모으기/압축/파일 쓰기는 백그라운드 스레드가 처리합니다. (zlib 압축은 GIL을 놓고 실행됨)
+
+import atexit
+import gzip
+import os
+import queue
+import struct
+import threading
+import time
+from collections import namedtuple
+from urllib.parse import parse_qsl, urlencode
+
+_RECORD_HEADER = struct.Struct('<dfHHI')
+_STOP = object() # 기록 스레드 종료 신호
+RECORDING_FILE_SUFFIX = ".responses.gz"
+
+# 기록된 응답 하나
+#   fetch_epoch: 요청을 보낸 시각 (epoch 초), latency_seconds: 응답까지 걸린 시간
+#   endpoint: '/orderbook/BTC_KRW' 같은 경로, params: 쿼리 파라미터 딕셔너리 (문자열 값), body: 응답 본문 바이트
+RecordedResponse = namedtuple('RecordedResponse', ['fetch_epoch', 'latency_seconds', 'status_code', 'endpoint', 'params', 'body'])
+
+
+# epoch 초 -> 기록 파일 이름의 날짜 부분 (로컬 날짜, history_store 파티션과 같은 기준)
+def recording_date(epoch):
+    return time.strftime('%Y-%m-%d', time.localtime(epoch))
+
+
+class ResponseRecorder:
+    # directory: 기록 파일을 둘 디렉터리 (없으면 생성)
+    # chunk_bytes: 압축 전 청크 크기 (이만큼 모이면 압축해서 씀)
+    # flush_interval: 청크가 덜 찼어도 이 시간(초)마다 압축해서 씀 (프로그램이 죽었을 때 잃는 양의 상한)
+    # queue_size: 대기 큐 최대 길이. 가득 차면 탐지 루프를 막지 않고 응답을 버리며 개수를 셉니다.
+    # compress_level: gzip 압축 수준 (1~9)
+    def __init__(self, directory, chunk_bytes=1024 * 1024, flush_interval=5.0, queue_size=10000, compress_level=6):
+        self.directory = directory
+        self.chunk_bytes = chunk_bytes
+        self.flush_interval = flush_interval
+        self.compress_level = compress_level
+        self.recorded = 0 # 파일에 쓴 응답 수
+        self.dropped = 0 # 큐가 가득 차서 버린 응답 수
+        self.raw_bytes = 0 # 압축 전 기록 바이트 수
+        self.compressed_bytes = 0 # 압축 후 기록 바이트 수
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._start_lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    # 응답 하나를 큐에 넣기만 하고 바로 반환 (BithumbClient가 응답을 받을 때마다 호출)
+    def record(self, endpoint, params, fetch_epoch, latency_seconds, status_code, body):
+        if self._thread is None:
+            self._start()
+        try:
+            self._queue.put_nowait((endpoint, params, fetch_epoch, latency_seconds, status_code, body))
+        except queue.Full:
+            self.dropped += 1
+
+    # 남은 응답을 모두 기록하고 스레드 종료 (프로그램 종료 시 자동 호출)
+    def close(self, timeout=10.0):
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _start(self):
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='response-recorder', daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    # 모인 청크를 gzip 멤버 하나로 압축해 해당 날짜 파일 끝에 추가
+    def _write_chunk(self, date, chunk, count):
+        if not chunk:
+            return
+        compressed = gzip.compress(bytes(chunk), compresslevel=self.compress_level)
+        try:
+            with open(os.path.join(self.directory, date + RECORDING_FILE_SUFFIX), 'ab') as f:
+                f.write(compressed)
+        except (IOError, OSError) as e:
+            print(f"응답 기록 파일 쓰기 오류: {e}")
+            return
+        self.recorded += count
+        self.raw_bytes += len(chunk)
+        self.compressed_bytes += len(compressed)
+
+    def _run(self):
+        chunk = bytearray()
+        chunk_date = None
+        chunk_count = 0
+        last_flush = time.monotonic()
+        stopping = False
+
+        while not stopping:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                item = None
+            if item is _STOP:
+                stopping = True
+            elif item is not None:
+                endpoint, params, fetch_epoch, latency_seconds, status_code, body = item
+                date = recording_date(fetch_epoch)
+                if date != chunk_date: # 날짜가 바뀌면 이전 날짜 청크를 먼저 씀
+                    self._write_chunk(chunk_date, chunk, chunk_count)
+                    chunk, chunk_date, chunk_count = bytearray(), date, 0
+                target = (endpoint + '?' + urlencode(params) if params else endpoint).encode('utf-8')
+                chunk += _RECORD_HEADER.pack(fetch_epoch, latency_seconds, status_code, len(target), len(body))
+                chunk += target
+                chunk += body
+                chunk_count += 1
+
+            now = time.monotonic()
+            if stopping or len(chunk) >= self.chunk_bytes or now - last_flush >= self.flush_interval:
+                self._write_chunk(chunk_date, chunk, chunk_count)
+                chunk, chunk_count = bytearray(), 0
+                last_flush = now
+
+
+# 기록 파일 하나의 응답을 순서대로 하나씩 읽음 (파일 전체를 메모리에 올리지 않음)
+# 마지막 청크가 잘린 파일(기록 중 종료)은 읽을 수 있는 데까지만 읽습니다.
+def iter_recorded_responses(path):
+    with gzip.open(path, 'rb') as f:
+        while True:
+            try:
+                header = f.read(_RECORD_HEADER.size)
+                if len(header) < _RECORD_HEADER.size:
+                    return
+                fetch_epoch, latency_seconds, status_code, target_length, body_length = _RECORD_HEADER.unpack(header)
+                target = f.read(target_length)
+                body = f.read(body_length)
+            except (EOFError, gzip.BadGzipFile):
+                return
+            if len(target) < target_length or len(body) < body_length:
+                return
+            endpoint, _, query = target.decode('utf-8').partition('?')
+            yield RecordedResponse(fetch_epoch, latency_seconds, status_code, endpoint, dict(parse_qsl(query)), body)
+
+
+# 디렉터리의 기록 중 [start_epoch, end_epoch) 구간의 응답을 날짜 파일 순서대로 읽음
+# 파일 안에서는 응답을 받은 순서이므로 동시에 보낸 요청끼리는 요청 시각 순서가 조금 뒤바뀔 수 있습니다.
+# 구간과 겹치는 날짜의 파일만 엽니다. endpoint_prefix를 주면 경로가 그것으로 시작하는 응답만 반환합니다.
+def iter_recordings(directory, start_epoch=None, end_epoch=None, endpoint_prefix=None):
+    first = recording_date(start_epoch) if start_epoch is not None else None
+    last = recording_date(end_epoch) if end_epoch is not None else None
+    dates = sorted(name[:-len(RECORDING_FILE_SUFFIX)] for name in os.listdir(directory) if name.endswith(RECORDING_FILE_SUFFIX))
+    for date in dates:
+        if (first is not None and date < first) or (last is not None and date > last):
+            continue
+        for response in iter_recorded_responses(os.path.join(directory, date + RECORDING_FILE_SUFFIX)):
+            if start_epoch is not None and response.fetch_epoch < start_epoch:
+                continue
+            if end_epoch is not None and response.fetch_epoch >= end_epoch:
+                continue
+            if endpoint_prefix is not None and not response.endpoint.startswith(endpoint_prefix):
+                continue
+            yield response
@@ -0,0 +1,134 @@
+# scheduler.py
+# 파트너, 이 모듈은 (코인, 작업 종류)별로 다음 실행 시각을 관리하는 우선순위 큐 기반 스케줄러입니다.
+# 고정 주기로 모든 탐지를 한 바퀴씩 도는 대신, 작업마다 자기 주기(interval)를 가지고
+# 실행 시각이 된 작업만 꺼내 실행합니다. 예정 시각보다 늦게 시작한 정도(지연)와 마감 초과 횟수를 집계합니다.
+
+import heapq
+import itertools
+import time
+
+
+# 예약된 작업 하나
+#   key: (코인, 작업 종류) 등 작업 식별자, kind: 통계를 묶는 작업 종류, interval: 실행 간격 (초)
+#   priority: 같은 시각이면 작은 값이 먼저 실행, due: 다음 실행 예정 시각 (스케줄러 clock 기준)
+class ScheduledJob:
+    __slots__ = ('key', 'kind', 'interval', 'priority', 'due', 'token')
+
+    def __init__(self, key, kind, interval, priority, due):
+        self.key = key
+        self.kind = kind
+        self.interval = interval
+        self.priority = priority
+        self.due = due
+        self.token = 0 # 힙 안의 오래된 항목을 구분하기 위한 번호 (재예약될 때마다 바뀜)
+
+
+# 작업 종류별 실행 통계
+class JobStats:
+    __slots__ = ('runs', 'missed', 'deferred', 'total_lateness', 'max_lateness')
+
+    def __init__(self):
+        self.runs = 0 # 실행 횟수
+        self.missed = 0 # 허용 지연을 넘겨 시작한 횟수 (마감 초과)
+        self.deferred = 0 # 요청 예산이 없어 뒤로 미룬 횟수
+        self.total_lateness = 0.0
+        self.max_lateness = 0.0
+
+    @property
+    def mean_lateness(self):
+        return self.total_lateness / self.runs if self.runs else 0.0
+
+
+class JobScheduler:
+    # lateness_tolerance: 예정 시각보다 이 시간(초) 넘게 늦게 시작하면 마감 초과로 집계
+    def __init__(self, lateness_tolerance=1.0, clock=time.monotonic):
+        self.lateness_tolerance = lateness_tolerance
+        self.clock = clock
+        self.stats = {} # 작업 종류 -> JobStats
+        self._jobs = {} # key -> ScheduledJob
+        self._heap = [] # (due, priority, 순번, token, key)
+        self._counter = itertools.count()
+
+    def __contains__(self, key):
+        return key in self._jobs
+
+    def __len__(self):
+        return len(self._jobs)
+
+    def _push(self, job):
+        job.token += 1
+        heapq.heappush(self._heap, (job.due, job.priority, next(self._counter), job.token, job.key))
+
+    # 작업 예약 (이미 있으면 간격만 바꾸고, 새 간격 기준으로 더 빨리 돌아와야 하면 예정 시각도 앞당김)
+    # due를 주지 않으면 지금 바로 실행 대상이 됩니다.
+    def schedule(self, key, kind, interval, priority=1, due=None):
+        job = self._jobs.get(key)
+        now = self.clock()
+        if job is None:
+            job = ScheduledJob(key, kind, interval, priority, now if due is None else due)
+            self._jobs[key] = job
+            self.stats.setdefault(kind, JobStats())
+            self._push(job)
+            return job
+        last_start = job.due - job.interval
+        job.interval = interval
+        if last_start + interval < job.due:
+            job.due = max(now, last_start + interval)
+            self._push(job)
+        return job
+
+    def remove(self, key):
+        self._jobs.pop(key, None) # 힙 안의 항목은 꺼낼 때 버려짐
+
+    # 가장 빠른 다음 실행 예정 시각 (예약된 작업이 없으면 None)
+    def next_due(self):
+        while self._heap:
+            due, _, _, token, key = self._heap[0]
+            job = self._jobs.get(key)
+            if job is not None and job.token == token:
+                return due
+            heapq.heappop(self._heap)
+        return None
+
+    # 예정 시각이 지난 작업을 모두 꺼냄 (예정 시각, 우선순위 순). 꺼낸 작업은 complete()나 defer()로 다시 넣어야 합니다.
+    # limit: 최대 개수 (나머지는 큐에 남아 다음 호출에서 꺼냄)
+    def pop_due(self, now=None, limit=None):
+        now = self.clock() if now is None else now
+        due_jobs = []
+        while self._heap and self._heap[0][0] <= now and (limit is None or len(due_jobs) < limit):
+            _, _, _, token, key = heapq.heappop(self._heap)
+            job = self._jobs.get(key)
+            if job is not None and job.token == token:
+                due_jobs.append(job)
+        return due_jobs
+
+    # 작업 실행 시작을 기록하고 다음 실행을 예약 (started_at: 실제 시작 시각)
+    # 다음 예정 시각은 '이번 예정 시각 + 간격'이며, 이미 지났다면 놓친 실행은 건너뛰고 지금으로 맞춥니다.
+    def complete(self, job, started_at):
+        stats = self.stats[job.kind]
+        lateness = max(0.0, started_at - job.due)
+        stats.runs += 1
+        stats.total_lateness += lateness
+        stats.max_lateness = max(stats.max_lateness, lateness)
+        if lateness > self.lateness_tolerance:
+            stats.missed += 1
+        if self._jobs.get(job.key) is not job:
+            return # 실행 중에 제거된 작업
+        job.due = max(job.due + job.interval, started_at)
+        self._push(job)
+
+    # 요청 예산이 없어 실행하지 못한 작업을 delay초 뒤로 미룸 (예정 시각은 그대로 두어 지연이 집계되도록 함)
+    def defer(self, job, delay):
+        self.stats[job.kind].deferred += 1
+        if self._jobs.get(job.key) is not job:
+            return
+        job.token += 1
+        heapq.heappush(self._heap, (self.clock() + delay, job.priority, next(self._counter), job.token, job.key))
+
+    # 통계 요약 문자열 (로그용)
+    def format_stats(self):
+        parts = []
+        for kind, stats in sorted(self.stats.items()):
+            parts.append(f"{kind}: 실행 {stats.runs}회, 마감 초과 {stats.missed}회, 예산 대기 {stats.deferred}회, "
+                         f"평균 지연 {stats.mean_lateness * 1000:.0f}ms, 최대 지연 {stats.max_lateness * 1000:.0f}ms")
+        return parts
@@ -5,17 +5,24 @@
 import subprocess
 import sys
 import os
+import gzip
+import hashlib
 import json
+import threading
 import time
 
+from metrics import format_prometheus
+from snapshot_channel import SnapshotRegionReader
+from stream_hub import StreamHub
+
 # Flask 라이브러리 설치 확인 및 설치
 try:
-    from flask import Flask, jsonify, send_from_directory
+    from flask import Flask, Response, jsonify, send_from_directory, request
 except ImportError:
     print("Flask 라이브러리가 설치되어 있지 않습니다. 설치를 시도합니다...")
     try:
         subprocess.check_call([sys.executable, "-m", "pip", "install", "Flask"])
-        from flask import Flask, jsonify, send_from_directory
+        from flask import Flask, Response, jsonify, send_from_directory, request
         print("Flask 라이브러리 설치 완료.")
     except Exception as e:
         print(f"Flask 라이브러리 설치 실패: {e}")
@@ -25,9 +32,59 @@ except ImportError:
 # --- 설정 ---
 WEB_SERVER_PORT = 5000 # 웹 서버가 실행될 포트
 SHARED_DATA_FILE = "shared_data.json" # 데이터 수집 스크립트와 공유하는 파일명
+SNAPSHOT_REGION_FILE = "shared_snapshot.mmap" # 데이터 수집 스크립트가 기록하는 메모리 매핑 스냅샷 영역
+RESPONSE_CACHE_MAX_ENTRIES = 32 # 같은 스냅샷에 대해 보관할 최대 응답 수 (coin/type 필터 조합별)
+GZIP_MIN_BYTES = 1024 # 이 크기 이상인 응답만 gzip 압축본을 만듦
+GZIP_LEVEL = 5
+STREAM_POLL_INTERVAL_SECONDS = 0.25 # /stream 감시 스레드가 스냅샷 변경을 확인하는 간격
+STREAM_HEARTBEAT_SECONDS = 15 # 보낼 데이터가 없을 때 heartbeat 간격
+STREAM_CLIENT_MAX_PENDING = 16 # 클라이언트별 대기 프레임 수 (넘치면 재동기화 요청)
+STREAM_MAX_CLIENTS = 200 # 동시 스트림 구독자 수 제한
 
 app = Flask(__name__)
 
+_region_reader = None # 스냅샷 영역 읽기 객체 (처음 필요할 때 열고, 수집기가 재시작되면 다시 엶)
+_region_lock = threading.Lock() # 요청 스레드 간 영역 열기/닫기 보호
+
+# /data 응답 캐시: 스냅샷이 바뀌기 전까지는 직렬화/압축된 바이트를 그대로 재사용합니다.
+# {(스냅샷 키, coin 필터, type 필터): (ETag, 본문 바이트, gzip 본문 바이트 또는 None)}
+_response_cache = {}
+_response_cache_snapshot_key = None
+_response_cache_lock = threading.Lock()
+
+# /metrics 응답 캐시: (공유 데이터 파일 수정 시각/크기, Prometheus 텍스트 바이트)
+_metrics_cache = None
+_metrics_cache_lock = threading.Lock()
+
+# 스냅샷 영역 읽기 객체 반환 (없거나 수집기가 영역을 새로 만들었으면 다시 엶). _region_lock 안에서 호출
+def _get_region_reader():
+    global _region_reader
+    if _region_reader is not None and _region_reader.is_stale():
+        _region_reader.close()
+        _region_reader = None
+    if _region_reader is None:
+        try:
+            _region_reader = SnapshotRegionReader(SNAPSHOT_REGION_FILE)
+        except (OSError, ValueError):
+            return None
+    return _region_reader
+
+# 메모리 매핑 영역의 현재 version만 확인 (영역 전체를 복사하지 않음). 영역이 없거나 아직 기록 전이면 None
+def read_region_version():
+    with _region_lock:
+        reader = _get_region_reader()
+        version = reader.version() if reader is not None else 0
+    return version or None
+
+# 메모리 매핑 스냅샷 영역에서 최신 데이터를 읽음. 영역이 없거나 아직 기록 전이면 None (JSON 파일로 대체)
+def read_region_snapshot():
+    with _region_lock:
+        reader = _get_region_reader()
+        data = reader.read() if reader is not None else None
+    if data is None or data['version'] == 0:
+        return None
+    return data
+
 # 루트 경로 ('/')에 접속 시 'index.html' 파일 제공
 @app.route('/')
 def index():
@@ -35,42 +92,219 @@ def index():
     # 이 파일은 UI를 담당합니다.
     return send_from_directory('.', 'index.html')
 
+# 이상 징후 이벤트 목록을 코인/탐지 종류로 필터링 (쉼표로 여러 값 지정 가능, 예: ?coin=BTC,ETH&type=spoofing)
+def filter_anomaly_events(events, coins=None, detectors=None):
+    if coins:
+        coin_set = {coin.strip().upper() for coin in coins.split(',') if coin.strip()}
+        events = [event for event in events if event.get('coin') in coin_set]
+    if detectors:
+        detector_set = {detector.strip() for detector in detectors.split(',') if detector.strip()}
+        events = [event for event in events if event.get('detector') in detector_set]
+    return events
+
+# 증분 응답 생성: since(클라이언트가 마지막으로 받은 version) 이후에 추가된 이력/이벤트만 남김
+# 클라이언트가 너무 뒤처져 이력 일부가 이미 밀려났거나, 수집기 version이 다시 시작된 경우에는 전체 응답(delta=False)
+def make_delta(data, since):
+    version = data.get('version', 0)
+    history = data.get('history', {})
+    fell_behind = any(points and points[0].get('version', 0) > since + 1 for points in history.values())
+    if since > version or fell_behind:
+        data['delta'] = False
+        return data
+    data['delta'] = True
+    data['history'] = {coin: [point for point in points if point.get('version', 0) > since] for coin, points in history.items()}
+    data['anomaly_events'] = [event for event in data.get('anomaly_events', []) if event.get('version', 0) > since]
+    return data
+
+# 응답 캐시 조회/저장. 스냅샷 키가 바뀌면 이전 스냅샷의 응답은 모두 버립니다.
+# 캐시 항목: (ETag, 본문 바이트, gzip 본문 바이트 또는 None, 스냅샷 version)
+def _cached_response(cache_key):
+    with _response_cache_lock:
+        return _response_cache.get(cache_key)
+
+def _store_response(cache_key, data):
+    global _response_cache_snapshot_key
+    body = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    etag = hashlib.sha1(body).hexdigest()[:20]
+    gzip_body = gzip.compress(body, GZIP_LEVEL) if len(body) >= GZIP_MIN_BYTES else None
+    entry = (etag, body, gzip_body, data.get('version', 0))
+    with _response_cache_lock:
+        if cache_key[0] != _response_cache_snapshot_key:
+            _response_cache.clear()
+            _response_cache_snapshot_key = cache_key[0]
+        if len(_response_cache) < RESPONSE_CACHE_MAX_ENTRIES:
+            _response_cache[cache_key] = entry
+    return entry
+
+# 캐시된 바이트로 응답 생성 (If-None-Match가 일치하면 본문 없이 304, 클라이언트가 gzip을 받으면 압축본 전송)
+def _build_response(entry):
+    etag, body, gzip_body, _ = entry
+    use_gzip = gzip_body is not None and 'gzip' in request.accept_encodings
+    if use_gzip:
+        etag += '-gz' # 압축본은 다른 표현이므로 ETag도 구분
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(gzip_body if use_gzip else body, mimetype='application/json')
+        if use_gzip:
+            response.headers['Content-Encoding'] = 'gzip'
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache' # 매번 재검증 (바뀌지 않았으면 304)
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+# 스냅샷을 제공할 수 없을 때 발생 (status: HTTP 상태 코드, message: 웹 UI에 보여줄 오류 문장)
+class SnapshotUnavailable(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+# 현재 스냅샷을 식별하는 키 (메모리 매핑 영역 version, 없으면 파일 수정 시각/크기). 스냅샷이 없으면 None
+def current_snapshot_key():
+    region_version = read_region_version()
+    if region_version is not None:
+        return ('region', region_version)
+    try:
+        file_stat = os.stat(SHARED_DATA_FILE)
+    except OSError:
+        return None
+    return ('file', file_stat.st_mtime_ns, file_stat.st_size)
+
+# 현재 스냅샷의 응답 캐시 항목 반환 (없으면 만들어 저장). 제공할 수 없으면 SnapshotUnavailable 발생
+# 스냅샷 version(또는 파일 수정 시각/크기)이 그대로이면 이전에 만든 응답 바이트를 재사용합니다.
+def load_snapshot_entry(coins=None, detectors=None, since=None):
+    # 1. 수집기가 기록한 메모리 매핑 영역이 있으면 version만 보고 캐시 확인, 없으면 영역을 한 번 복사해 응답 생성
+    region_version = read_region_version()
+    if region_version is not None:
+        entry = _cached_response((('region', region_version), coins, detectors, since))
+        if entry is not None:
+            return entry
+        data = read_region_snapshot()
+        if data is not None:
+            data['anomaly_events'] = filter_anomaly_events(data['anomaly_events'], coins, detectors)
+            if since is not None:
+                data = make_delta(data, since)
+            return _store_response((('region', data['version']), coins, detectors, since), data)
+
+    # 2. shared_data.json 파일이 존재하는지 확인
+    try:
+        file_stat = os.stat(SHARED_DATA_FILE)
+    except OSError:
+        raise SnapshotUnavailable(404, "오류: 데이터 파일이 없습니다. anomaly_detection_system.py를 먼저 실행하세요.")
+
+    cache_key = (('file', file_stat.st_mtime_ns, file_stat.st_size), coins, detectors, since)
+    entry = _cached_response(cache_key)
+    if entry is not None:
+        return entry
+
+    try:
+        # shared_data.json 파일 읽기
+        with open(SHARED_DATA_FILE, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except json.JSONDecodeError:
+        raise SnapshotUnavailable(500, f"오류: 데이터 파일 '{SHARED_DATA_FILE}'이 손상되었습니다. anomaly_detection_system.py를 다시 시작해주세요.")
+    except Exception as e:
+        raise SnapshotUnavailable(500, f"오류: 데이터 로드 중 예상치 못한 오류 발생: {e}")
+    data.pop('wall_trackers', None) # 수집기 재시작용 상태이므로 웹 UI에는 보내지 않음
+    data.pop('last_detected_large_walls', None) # 예전 형식
+    data.pop('metrics', None) # 계측 값은 /metrics로 제공
+    if coins or detectors:
+        data['anomaly_events'] = filter_anomaly_events(data.get('anomaly_events', []), coins, detectors)
+    if since is not None:
+        data = make_delta(data, since)
+    # 읽어온 JSON 데이터를 캐시에 저장
+    return _store_response(cache_key, data)
+
 # 데이터 API 엔드포인트 ('/data')에 접속 시 'shared_data.json' 내용 제공
+# 쿼리 파라미터 coin, type 으로 이상 징후 이벤트를 필터링할 수 있습니다.
+# since=<version> 을 주면 그 version 이후에 추가된 이력/이벤트만 돌려줍니다 (응답의 delta 값으로 구분).
 @app.route('/data')
 def get_data():
-    # shared_data.json 파일이 존재하는지 확인
-    if not os.path.exists(SHARED_DATA_FILE):
-        # 파일이 없으면 오류 메시지와 함께 404 상태 코드 반환
+    coins = request.args.get('coin') or None
+    detectors = request.args.get('type') or None
+    since = request.args.get('since', type=int)
+    try:
+        return _build_response(load_snapshot_entry(coins, detectors, since))
+    except SnapshotUnavailable as e:
+        # 파일이 없으면 404, 손상/기타 오류는 500 상태 코드와 오류 메시지 반환
         return jsonify({
             "history": {}, 
-            "anomaly_logs": [f"오류: 데이터 파일이 없습니다. anomaly_detection_system.py를 먼저 실행하세요."], 
+            "anomaly_logs": [e.message], 
             "current_summary": {}
-        }), 404
-    
+        }), e.status
+
+# 공유 데이터 파일의 계측 값('metrics')을 Prometheus 텍스트로 변환한 바이트 (파일이 바뀌지 않았으면 이전 결과 재사용)
+# 계측 값은 메모리 매핑 영역에는 없고 수집기가 티커 주기마다 파일에만 갱신합니다. 제공할 수 없으면 SnapshotUnavailable 발생
+def load_metrics_text():
+    global _metrics_cache
+    try:
+        file_stat = os.stat(SHARED_DATA_FILE)
+    except OSError:
+        raise SnapshotUnavailable(404, "오류: 데이터 파일이 없습니다. anomaly_detection_system.py를 먼저 실행하세요.")
+    file_key = (file_stat.st_mtime_ns, file_stat.st_size)
+    with _metrics_cache_lock:
+        if _metrics_cache is not None and _metrics_cache[0] == file_key:
+            return _metrics_cache[1]
     try:
-        # shared_data.json 파일 읽기
         with open(SHARED_DATA_FILE, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        # 읽어온 JSON 데이터를 클라이언트에 응답으로 반환
-        return jsonify(data)
+            snapshot = json.load(f).get('metrics')
     except json.JSONDecodeError:
-        # JSON 파싱 오류 발생 시 500 상태 코드와 오류 메시지 반환
-        return jsonify({
-            "history": {}, 
-            "anomaly_logs": [f"오류: 데이터 파일 '{SHARED_DATA_FILE}'이 손상되었습니다. anomaly_detection_system.py를 다시 시작해주세요."], 
-            "current_summary": {}
-        }), 500
+        raise SnapshotUnavailable(500, f"오류: 데이터 파일 '{SHARED_DATA_FILE}'이 손상되었습니다.")
     except Exception as e:
-        # 기타 예외 발생 시 500 상태 코드와 오류 메시지 반환
-        return jsonify({
-            "history": {}, 
-            "anomaly_logs": [f"오류: 데이터 로드 중 예상치 못한 오류 발생: {e}"], 
-            "current_summary": {}
-        }), 500
+        raise SnapshotUnavailable(500, f"오류: 데이터 로드 중 예상치 못한 오류 발생: {e}")
+    if not snapshot:
+        raise SnapshotUnavailable(503, "계측 값이 아직 없습니다. 수집기의 첫 티커 작업 이후에 다시 시도하세요.")
+    text = format_prometheus(snapshot).encode('utf-8')
+    with _metrics_cache_lock:
+        _metrics_cache = (file_key, text)
+    return text
+
+# 계측 엔드포인트 ('/metrics', Prometheus 텍스트 형식)
+# 단계별 소요 시간 히스토그램, 엔드포인트별 HTTP 요청 시간/요청/오류 수, 탐지기별 이상 징후 수, 주기 초과 수 등
+@app.route('/metrics')
+def get_metrics():
+    try:
+        text = load_metrics_text()
+    except SnapshotUnavailable as e:
+        return Response(e.message + "\n", status=e.status, mimetype='text/plain')
+    return Response(text, content_type='text/plain; version=0.0.4; charset=utf-8')
+
+# 푸시 스트림 배포기: 감시 스레드 하나가 스냅샷 변경을 확인하고 모든 구독자에게 증분 프레임을 나눠 줍니다.
+def _build_stream_snapshot(since):
+    _, body, _, version = load_snapshot_entry(since=since)
+    return version, body
+
+stream_hub = StreamHub(current_snapshot_key, _build_stream_snapshot,
+                       poll_interval=STREAM_POLL_INTERVAL_SECONDS,
+                       heartbeat_interval=STREAM_HEARTBEAT_SECONDS,
+                       max_pending=STREAM_CLIENT_MAX_PENDING,
+                       max_clients=STREAM_MAX_CLIENTS)
+
+# 실시간 푸시 엔드포인트 ('/stream', Server-Sent Events)
+# 새 시세 점과 이상 징후 이벤트를 /data?since= 와 같은 형태의 'snapshot' 이벤트로 보냅니다.
+# since 쿼리(또는 재연결 시 브라우저가 보내는 Last-Event-ID)가 있으면 그 이후의 증분부터 시작합니다.
+# 구독자 수 제한에 걸리면 503을 돌려주며, 웹 UI는 /data 폴링으로 대체합니다.
+@app.route('/stream')
+def stream():
+    since = request.args.get('since', type=int)
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+    if last_event_id is not None:
+        since = last_event_id
+    subscriber = stream_hub.subscribe()
+    if subscriber is None:
+        return jsonify({"error": "스트림 구독자 수가 가득 찼습니다. /data 폴링을 사용하세요."}), 503
+    response = Response(stream_hub.stream(subscriber, since), mimetype='text/event-stream')
+    # 생성기가 한 번도 시작되지 않고 응답이 닫혀도 구독 해제 (stream()의 finally는 시작된 뒤에만 실행됨)
+    response.call_on_close(lambda: stream_hub.unsubscribe(subscriber))
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no' # 프록시 버퍼링 방지
+    return response
 
 if __name__ == '__main__':
     print(f"--- Flask 웹 서버 시작 (http://127.0.0.1:{WEB_SERVER_PORT}) ---")
     print(f"웹 UI를 보려면 브라우저에서 이 주소로 접속하세요.")
     # Flask 앱 실행. debug=False로 설정하여 운영 환경에 적합하게.
     # use_reloader=False는 스레딩과 함께 사용 시 문제가 발생할 수 있어 비활성화.
-    app.run(host='127.0.0.1', port=WEB_SERVER_PORT, debug=False, use_reloader=False)
+    # threaded=True: /stream 연결마다 요청 스레드 하나를 사용합니다.
+    app.run(host='127.0.0.1', port=WEB_SERVER_PORT, debug=False, use_reloader=False, threaded=True)
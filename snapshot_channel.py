@@ -0,0 +1,311 @@
+# snapshot_channel.py
+# 파트너, 이 모듈은 수집기(anomaly_detection_system.py)가 웹 서버(serve_web.py)와 데이터를 주고받는 통로입니다.
+# 스냅샷은 임시 파일에 먼저 쓴 뒤 os.replace로 한 번에 교체하므로, 웹 서버가 반쯤 쓰인 파일을 읽는 일이 없습니다.
+# 내용이 바뀌지 않은 주기에는 파일을 다시 쓰지 않고, 바뀔 때마다 단조 증가하는 version을 붙입니다.
+# 같은 내용을 고정 레이아웃의 메모리 매핑(mmap) 영역에도 기록하여, 웹 서버가 파일을 다시 열고
+# JSON을 파싱하지 않고 잠금 없이(seqlock 방식) 한 번의 복사로 읽을 수 있게 합니다.
+
+import json
+import math
+import mmap
+import os
+import re
+import struct
+import time
+
+import numpy as np
+
+from market_state import to_float
+
+VERSION_KEY = 'version'
+_VERSION_HEAD_BYTES = 64 # version은 항상 JSON의 첫 번째 키이므로 파일 앞부분만 읽으면 됩니다.
+_VERSION_PATTERN = re.compile(rb'^\{"version":(\d+)')
+
+
+# 스냅샷 파일의 version만 읽는 함수 (JSON 전체를 파싱하지 않음). 파일이 없거나 형식이 다르면 None
+def read_snapshot_version(file_path):
+    try:
+        with open(file_path, 'rb') as f:
+            head = f.read(_VERSION_HEAD_BYTES)
+    except OSError:
+        return None
+    match = _VERSION_PATTERN.match(head)
+    return int(match.group(1)) if match else None
+
+
+class SnapshotPublisher:
+    # file_path: 스냅샷 파일 경로 (예: "shared_data.json")
+    # replace_retries: os.replace 실패 시 재시도 횟수 (Windows에서 읽는 쪽이 파일을 열고 있으면 잠시 실패할 수 있음)
+    def __init__(self, file_path, replace_retries=5):
+        self.file_path = file_path
+        self.replace_retries = replace_retries
+        self.version = read_snapshot_version(file_path) or 0 # 재시작해도 version이 거꾸로 가지 않도록 이어서 사용
+        self.skipped_writes = 0 # 내용이 같아서 건너뛴 횟수
+        self._last_body = None
+
+    # 다음에 발행될 스냅샷의 version (이번 주기에 추가되는 데이터에 붙여 두면 웹 UI가 증분 조회에 사용)
+    @property
+    def next_version(self):
+        return self.version + 1
+
+    # 스냅샷 발행. 내용이 직전과 같으면 쓰지 않고 False, 새로 썼으면 True 반환 (쓰기 실패 시 OSError 발생)
+    def publish(self, data):
+        body = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        if body == self._last_body:
+            self.skipped_writes += 1
+            return False
+
+        version = self.version + 1
+        # version을 첫 번째 키로 두어 read_snapshot_version이 앞부분만 읽고도 알 수 있게 함
+        payload = b'{"%s":%d' % (VERSION_KEY.encode('ascii'), version) + (b',' + body[1:] if body != b'{}' else b'}')
+        self._write_atomic(payload)
+        self.version = version
+        self._last_body = body
+        return True
+
+    def _write_atomic(self, payload):
+        temp_path = f"{self.file_path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(payload)
+        for attempt in range(self.replace_retries + 1):
+            try:
+                os.replace(temp_path, self.file_path)
+                return
+            except PermissionError:
+                if attempt == self.replace_retries:
+                    os.remove(temp_path)
+                    raise
+                time.sleep(0.01 * (attempt + 1))
+
+
+# --- 메모리 매핑 스냅샷 영역 ---
+# 레이아웃 (리틀 엔디언, 모든 크기는 생성 시 고정):
+#   헤더 (64바이트): magic, 레이아웃 버전, 코인 수, 코인별 이력 길이, 이벤트 슬롯 수, 이벤트 슬롯 크기,
+#                    seqlock 카운터, 스냅샷 version, 지금까지 기록한 이벤트 수
+#   코인 표: 코인마다 심볼(12바이트) + 이력 개수(u32)
+#   이력 배열: float64[코인 수, 5, 이력 길이] (시각 epoch, 현재가, 24H 변동률, 24H 거래량, 처음 실린 version / 값 없음은 NaN)
+#   이벤트 링: 슬롯마다 길이(u32) + 이벤트 JSON(UTF-8)
+# 기록하는 쪽은 seqlock 카운터를 홀수로 올린 뒤 내용을 쓰고, 다시 짝수로 올립니다.
+# 읽는 쪽은 카운터가 짝수인지 확인 -> 영역 전체 복사 -> 카운터가 그대로인지 확인하여 일관된 사본만 사용합니다.
+
+REGION_MAGIC = b'CADSNAP1'
+REGION_LAYOUT_VERSION = 2
+_HEADER = struct.Struct('<8sIIIIIIQQQ') # magic, layout, coins, history, events, slot_size, (pad), seq, version, event_total
+_HEADER_SIZE = 64
+_SEQ_OFFSET = 32
+_COIN_ENTRY = struct.Struct('<12sI')
+_SLOT_LENGTH = struct.Struct('<I')
+_HISTORY_FIELDS = ('timestamp', 'closing_price', 'fluctate_rate_24H', 'units_traded_24H', 'version')
+
+
+# 영역 안의 각 구역 위치 계산
+def _region_layout(coin_count, history_capacity, event_capacity, event_slot_size):
+    coins_offset = _HEADER_SIZE
+    history_offset = coins_offset + coin_count * _COIN_ENTRY.size
+    history_offset += -history_offset % 8 # float64 정렬
+    events_offset = history_offset + coin_count * len(_HISTORY_FIELDS) * history_capacity * 8
+    total_size = events_offset + event_capacity * event_slot_size
+    return coins_offset, history_offset, events_offset, total_size
+
+
+# 이력 값(문자열 또는 'N/A')을 웹 UI가 받던 문자열 형태로 되돌림
+def _format_history_value(value):
+    return 'N/A' if math.isnan(value) else format(value, '.15g')
+
+
+def _timestamp_to_epoch(timestamp):
+    try:
+        return time.mktime(time.strptime(timestamp, '%Y-%m-%d %H:%M:%S'))
+    except (TypeError, ValueError):
+        return np.nan
+
+
+# 수집기 쪽: 매 주기 스냅샷을 영역에 기록
+class SnapshotRegionWriter:
+    # file_path: 매핑할 파일 경로, coins: 코인 심볼 목록 (순서 고정)
+    # history_capacity: 코인별로 보관할 이력 길이 (웹 UI 차트 길이)
+    # event_capacity: 이벤트 링 슬롯 수, event_slot_size: 슬롯 하나의 크기 (바이트, 길이 필드 포함)
+    def __init__(self, file_path, coins, history_capacity, event_capacity, event_slot_size=1024):
+        self.file_path = file_path
+        self.coins = list(coins)
+        self.history_capacity = history_capacity
+        self.event_capacity = event_capacity
+        self.event_slot_size = event_slot_size
+        self._coins_offset, self._history_offset, self._events_offset, self.size = _region_layout(
+            len(self.coins), history_capacity, event_capacity, event_slot_size)
+
+        # 웹 서버가 이전 영역을 매핑하고 있을 수 있으므로 기존 파일을 잘라내지 않고 새 파일로 교체합니다.
+        # (읽는 쪽은 is_stale()로 교체를 알아채고 다시 엽니다.)
+        temp_path = f"{file_path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.truncate(self.size)
+        os.replace(temp_path, file_path)
+        self._file = open(file_path, 'r+b')
+        self._mm = mmap.mmap(self._file.fileno(), self.size)
+        self._history = np.ndarray((len(self.coins), len(_HISTORY_FIELDS), history_capacity),
+                                   dtype='<f8', buffer=self._mm, offset=self._history_offset)
+        self._history[:] = np.nan
+        self._seq = 0
+        self._event_total = 0
+        self._last_event_seq = 0
+        for index, coin in enumerate(self.coins):
+            _COIN_ENTRY.pack_into(self._mm, self._coins_offset + index * _COIN_ENTRY.size, coin.encode('ascii')[:12], 0)
+        _HEADER.pack_into(self._mm, 0, REGION_MAGIC, REGION_LAYOUT_VERSION, len(self.coins), history_capacity,
+                          event_capacity, event_slot_size, 0, 0, 0, 0)
+
+    # version: 스냅샷 version, history: {코인: [{'timestamp': ..., 'closing_price': ..., ...}, ...]}
+    # events: AnomalyEvent 목록 (seq 오름차순). 이미 기록한 이벤트(seq 기준)는 다시 쓰지 않습니다.
+    def write(self, version, history, events):
+        self._set_seq(self._seq + 1) # 홀수: 기록 중
+        try:
+            for index, coin in enumerate(self.coins):
+                points = history.get(coin, [])[-self.history_capacity:]
+                rows = self._history[index]
+                for position, point in enumerate(points):
+                    rows[0, position] = _timestamp_to_epoch(point.get('timestamp'))
+                    rows[1, position] = to_float(point.get('closing_price'))
+                    rows[2, position] = to_float(point.get('fluctate_rate_24H'))
+                    rows[3, position] = to_float(point.get('units_traded_24H'))
+                    rows[4, position] = point.get('version', 0)
+                _COIN_ENTRY.pack_into(self._mm, self._coins_offset + index * _COIN_ENTRY.size,
+                                      coin.encode('ascii')[:12], len(points))
+
+            for event in events:
+                if event.seq <= self._last_event_seq:
+                    continue
+                self._write_event_slot(self._event_total % self.event_capacity, event.to_dict())
+                self._event_total += 1
+                self._last_event_seq = event.seq
+
+            struct.pack_into('<QQ', self._mm, _SEQ_OFFSET + 8, version, self._event_total)
+        finally:
+            self._set_seq(self._seq + 1) # 짝수: 기록 완료
+
+    def close(self):
+        del self._history
+        self._mm.close()
+        self._file.close()
+
+    def _set_seq(self, seq):
+        self._seq = seq
+        struct.pack_into('<Q', self._mm, _SEQ_OFFSET, seq)
+
+    # 슬롯보다 큰 이벤트는 수치 근거를 빼고, 그래도 크면 알림 문장을 줄여서 항상 올바른 JSON으로 기록
+    # (바이트 단위로 잘라 깨진 JSON을 쓰면 읽는 쪽이 이벤트를 조용히 건너뜀)
+    def _write_event_slot(self, slot, event_dict):
+        body = json.dumps(event_dict, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        limit = self.event_slot_size - _SLOT_LENGTH.size
+        if len(body) > limit:
+            event_dict = dict(event_dict, evidence={})
+            body = json.dumps(event_dict, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        while len(body) > limit:
+            message = event_dict.get('message') or ''
+            if not message:
+                raise ValueError(f"이벤트 {event_dict.get('seq')}이(가) 슬롯 크기 {self.event_slot_size}바이트에 들어가지 않습니다.")
+            # 넘친 만큼(+ 말줄임표) 문장 끝을 UTF-8 바이트 기준으로 잘라냄 (글자 중간에서 잘린 바이트는 버림)
+            message_bytes = message.encode('utf-8')
+            keep = max(0, len(message_bytes) - (len(body) - limit) - len('…'.encode('utf-8')))
+            event_dict = dict(event_dict, message=message_bytes[:keep].decode('utf-8', errors='ignore') + '…' if keep else '')
+            body = json.dumps(event_dict, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        start = self._events_offset + slot * self.event_slot_size
+        _SLOT_LENGTH.pack_into(self._mm, start, len(body))
+        self._mm[start + _SLOT_LENGTH.size:start + _SLOT_LENGTH.size + len(body)] = body
+
+
+# 웹 서버 쪽: 잠금 없이 영역을 읽어 /data 응답과 같은 형태의 딕셔너리로 만듦
+class SnapshotRegionReader:
+    # max_retries: 기록 중인 영역을 만났을 때 다시 시도할 횟수
+    def __init__(self, file_path, max_retries=100):
+        self.file_path = file_path
+        self.max_retries = max_retries
+        self.retries = 0 # 기록 중이라 다시 읽은 횟수 (통계용)
+        self._file = open(file_path, 'rb')
+        try:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, OSError):
+            self._file.close()
+            raise
+        magic, layout, *_ = _HEADER.unpack_from(self._mm, 0)
+        if magic != REGION_MAGIC or layout != REGION_LAYOUT_VERSION:
+            self.close()
+            raise ValueError(f"'{file_path}'은(는) 스냅샷 영역 파일이 아닙니다.")
+
+    # 수집기가 재시작되어 영역 파일이 새로 만들어졌는지 확인 (True이면 새 Reader를 열어야 함)
+    def is_stale(self):
+        try:
+            return os.stat(self.file_path).st_ino != os.fstat(self._file.fileno()).st_ino
+        except OSError:
+            return True
+
+    # 현재 스냅샷 version (영역 전체를 복사하지 않고 헤더만 읽음, 변경 여부 확인용). 재시도 횟수를 넘기면 None
+    # read_raw와 같은 seqlock 확인으로 기록 중인 헤더 값은 쓰지 않습니다.
+    def version(self):
+        for _ in range(self.max_retries):
+            seq_before = struct.unpack_from('<Q', self._mm, _SEQ_OFFSET)[0]
+            if seq_before % 2 == 0:
+                version = struct.unpack_from('<Q', self._mm, _SEQ_OFFSET + 8)[0]
+                if struct.unpack_from('<Q', self._mm, _SEQ_OFFSET)[0] == seq_before:
+                    return version
+            self.retries += 1
+            time.sleep(0)
+        return None
+
+    # 일관된 사본 한 벌을 복사해 반환 (bytes). 재시도 횟수를 넘기면 None
+    def read_raw(self):
+        for _ in range(self.max_retries):
+            seq_before = struct.unpack_from('<Q', self._mm, _SEQ_OFFSET)[0]
+            if seq_before % 2 == 0:
+                raw = self._mm[:] # 영역 전체를 한 번에 복사
+                if struct.unpack_from('<Q', self._mm, _SEQ_OFFSET)[0] == seq_before:
+                    return raw
+            self.retries += 1
+            time.sleep(0)
+        return None
+
+    # /data 응답과 같은 형태: {'version', 'history', 'anomaly_events', 'current_summary'}. 읽기 실패 시 None
+    def read(self):
+        raw = self.read_raw()
+        if raw is None:
+            return None
+        (_, _, coin_count, history_capacity, event_capacity, event_slot_size,
+         _, _, version, event_total) = _HEADER.unpack_from(raw, 0)
+        coins_offset, history_offset, events_offset, total_size = _region_layout(
+            coin_count, history_capacity, event_capacity, event_slot_size)
+        if len(raw) < total_size:
+            return None
+
+        values = np.frombuffer(raw, dtype='<f8', count=coin_count * len(_HISTORY_FIELDS) * history_capacity,
+                               offset=history_offset).reshape(coin_count, len(_HISTORY_FIELDS), history_capacity)
+        history = {}
+        summary = {}
+        for index in range(coin_count):
+            symbol, count = _COIN_ENTRY.unpack_from(raw, coins_offset + index * _COIN_ENTRY.size)
+            coin = symbol.rstrip(b'\0').decode('ascii')
+            timestamps, closing_prices, fluctate_rates, units_traded, versions = values[index, :, :count].tolist()
+            points = []
+            for position in range(count):
+                timestamp = timestamps[position]
+                points.append({
+                    'timestamp': 'N/A' if math.isnan(timestamp) else time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(timestamp)),
+                    'closing_price': _format_history_value(closing_prices[position]),
+                    'fluctate_rate_24H': _format_history_value(fluctate_rates[position]),
+                    'units_traded_24H': _format_history_value(units_traded[position]),
+                    'version': int(versions[position]),
+                })
+            history[coin] = points
+            summary[coin] = points[-1] if points else {}
+
+        events = []
+        for total_index in range(max(0, event_total - event_capacity), event_total):
+            start = events_offset + (total_index % event_capacity) * event_slot_size
+            (length,) = _SLOT_LENGTH.unpack_from(raw, start)
+            try:
+                events.append(json.loads(raw[start + _SLOT_LENGTH.size:start + _SLOT_LENGTH.size + length]))
+            except ValueError:
+                continue
+
+        return {'version': version, 'history': history, 'anomaly_events': events, 'current_summary': summary}
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
@@ -0,0 +1,122 @@
+# stream_hub.py
+# 파트너, 이 모듈은 웹 UI에 새 데이터를 밀어주는(push) Server-Sent Events 배포기입니다.
+# 하나의 감시 스레드만 공유 스냅샷의 변경을 확인하고, 바뀌면 증분 프레임을 한 번만 만들어
+# 접속한 모든 클라이언트의 큐에 나눠 줍니다. 느린 클라이언트는 자기 큐만 넘치고 다른 클라이언트를 막지 않습니다.
+
+import json
+import queue
+import threading
+import time
+
+
+# SSE 프레임 생성 (data는 이미 직렬화된 JSON 바이트, 줄바꿈 없음)
+def format_sse(event, data, event_id=None):
+    frame = b''
+    if event_id is not None:
+        frame += b'id: %d\n' % event_id
+    return frame + b'event: ' + event.encode('ascii') + b'\ndata: ' + data + b'\n\n'
+
+
+# 클라이언트 한 명의 구독 (제한된 크기의 프레임 큐)
+class StreamSubscriber:
+    def __init__(self, max_pending):
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.resyncs = 0 # 큐가 넘쳐 전체 재동기화를 요청한 횟수
+
+    # 프레임 전달. 큐가 가득 차면 밀린 프레임을 버리고 재동기화 프레임 하나만 남김 (클라이언트가 전체 데이터를 다시 받음)
+    def offer(self, frame, resync_frame):
+        try:
+            self.queue.put_nowait(frame)
+        except queue.Full:
+            self.resyncs += 1
+            try:
+                while True:
+                    self.queue.get_nowait()
+            except queue.Empty:
+                pass
+            self.queue.put_nowait(resync_frame)
+
+
+class StreamHub:
+    # snapshot_key: 현재 스냅샷을 식별하는 값을 돌려주는 함수 (바뀌었는지만 비교, 스냅샷이 없으면 None)
+    # build_snapshot: since(version 또는 None)를 받아 (version, 증분 JSON 바이트)를 돌려주는 함수 (실패 시 예외)
+    # poll_interval: 스냅샷 변경 확인 간격 (초), heartbeat_interval: 보낼 데이터가 없을 때 heartbeat 간격 (초)
+    # max_pending: 클라이언트별 대기 프레임 수, max_clients: 동시 구독자 수 제한
+    def __init__(self, snapshot_key, build_snapshot, poll_interval=0.25, heartbeat_interval=15.0,
+                 max_pending=16, max_clients=200):
+        self.snapshot_key = snapshot_key
+        self.build_snapshot = build_snapshot
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.max_pending = max_pending
+        self.max_clients = max_clients
+        self.frames_published = 0
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._last_version = None
+        self._resync_frame = format_sse('resync', b'{}')
+
+    # 새 구독자 등록. 구독자 수 제한에 걸리면 None (클라이언트는 폴링으로 대체)
+    def subscribe(self):
+        with self._lock:
+            if len(self._subscribers) >= self.max_clients:
+                return None
+            subscriber = StreamSubscriber(self.max_pending)
+            self._subscribers.add(subscriber)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='stream-hub', daemon=True)
+                self._thread.start()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    @property
+    def client_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    # 구독자 한 명에게 보낼 SSE 바이트 스트림. since가 있으면 그 이후의 증분으로 시작합니다.
+    # 데이터가 heartbeat_interval 동안 없으면 heartbeat 이벤트를 보내 연결이 살아 있음을 알립니다.
+    # 첫 스냅샷을 쓰는 중에 연결이 끊겨도 구독이 해제되도록 첫 프레임부터 try/finally 안에서 보냅니다.
+    def stream(self, subscriber, since=None):
+        try:
+            try:
+                version, body = self.build_snapshot(since)
+                first_frame = format_sse('snapshot', body, version)
+            except Exception:
+                first_frame = self._resync_frame
+            yield first_frame
+            while True:
+                try:
+                    frame = subscriber.queue.get(timeout=self.heartbeat_interval)
+                except queue.Empty:
+                    frame = format_sse('heartbeat', json.dumps({'time': time.time()}).encode('ascii'))
+                yield frame
+        finally:
+            self.unsubscribe(subscriber)
+
+    # 감시 스레드: 스냅샷이 바뀌면 직전 version 이후의 증분 프레임을 한 번 만들어 모든 구독자에게 전달
+    def _run(self):
+        last_key = None
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                key = self.snapshot_key()
+                if key is None or key == last_key or self.client_count == 0:
+                    continue
+                version, body = self.build_snapshot(self._last_version)
+            except Exception:
+                continue
+            last_key = key
+            if version == self._last_version:
+                continue
+            self._last_version = version
+            frame = format_sse('snapshot', body, version)
+            with self._lock:
+                subscribers = list(self._subscribers)
+            for subscriber in subscribers:
+                subscriber.offer(frame, self._resync_frame)
+            self.frames_published += 1
@@ -0,0 +1,112 @@
+# test_trade_tape.py
+# 파트너, 이 모듈은 trade_tape.find_wash_trade_pairs(벡터화)가 기존 detect_wash_trading의 이중 루프와
+# 같은 쌍을 같은 순서로 찾는지 확인하는 테스트입니다. (python -m pytest -q)
+
+import random
+from datetime import datetime
+
+import pytest
+
+from trade_tape import TradeSnapshot, find_wash_trade_pairs
+
+START_EPOCH_MS = 1767225600000
+THRESHOLDS = (1.0, 0.05, 0.01) # 시간 창(초), 가격 허용(%), 수량 허용(%) (수집기 기본값과 같은 크기)
+
+
+# 기존 detect_wash_trading의 이중 루프 로직 (비교 기준). (i, j) 쌍 목록을 반환합니다.
+def reference_wash_trade_pairs(trades_raw, time_window_seconds, price_tolerance_percent, quantity_tolerance_percent):
+    trades_processed = []
+    for trade in trades_raw:
+        try:
+            trade_datetime = datetime.strptime(trade['transaction_date'], '%Y-%m-%d %H:%M:%S.%f')
+        except ValueError:
+            trade_datetime = datetime.strptime(trade['transaction_date'], '%Y-%m-%d %H:%M:%S')
+        trades_processed.append({'datetime_obj': trade_datetime, 'type': trade['type'],
+                                 'units_traded_float': float(trade['units_traded']), 'price_float': float(trade['price'])})
+    trades_processed.sort(key=lambda x: x['datetime_obj'])
+
+    pairs = []
+    for i in range(len(trades_processed)):
+        trade1 = trades_processed[i]
+        for j in range(i + 1, len(trades_processed)):
+            trade2 = trades_processed[j]
+            time_diff = (trade2['datetime_obj'] - trade1['datetime_obj']).total_seconds()
+            if time_diff > time_window_seconds:
+                break
+            if (trade1['type'] == 'bid' and trade2['type'] == 'ask') or (trade1['type'] == 'ask' and trade2['type'] == 'bid'):
+                if trade1['price_float'] == 0: continue
+                price_diff_percent = abs((trade1['price_float'] - trade2['price_float']) / trade1['price_float']) * 100
+                if price_diff_percent <= price_tolerance_percent:
+                    if trade1['units_traded_float'] == 0: continue
+                    quantity_diff_percent = abs((trade1['units_traded_float'] - trade2['units_traded_float']) / trade1['units_traded_float']) * 100
+                    if quantity_diff_percent <= quantity_tolerance_percent:
+                        pairs.append((i, j))
+    return pairs
+
+
+def make_trade(epoch_ms, side, price, quantity):
+    transaction_date = datetime.fromtimestamp(epoch_ms / 1000).strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
+    return {'transaction_date': transaction_date, 'type': side, 'units_traded': quantity, 'price': price, 'total': '0'}
+
+
+# 시드 고정 랜덤 체결 테이프: 좁은 가격/수량 범위 + 같은 밀리초 체결 + 가끔 가격/수량 0, 가끔 시간 역순 응답
+def random_tape(seed, count):
+    rng = random.Random(seed)
+    now_ms = START_EPOCH_MS
+    trades = []
+    for _ in range(count):
+        now_ms += rng.choice((0, 0, 1, 250, 999, 1000, 1001, rng.randint(0, 1500)))
+        price = rng.choice(('1000.0000', '1000.4000', '1000.5000', '1001.0000', '0.0000'))
+        quantity = rng.choice(('1.0000', '1.0001', '1.0002', '2.0000', '0.0000'))
+        trades.append(make_trade(now_ms, rng.choice(('bid', 'ask')), price, quantity))
+    if rng.random() < 0.3:
+        trades.reverse() # 빗썸 응답처럼 최신 체결이 먼저 오는 경우
+    return trades
+
+
+def found_pairs(trades_raw, thresholds=THRESHOLDS):
+    snapshot, errors = TradeSnapshot.from_api(trades_raw)
+    assert errors == []
+    pairs = find_wash_trade_pairs(snapshot, *thresholds)
+    return list(zip(pairs.first.tolist(), pairs.second.tolist()))
+
+
+@pytest.mark.parametrize('seed', range(40))
+def test_matches_reference_on_random_tapes(seed):
+    trades_raw = random_tape(seed, count=random.Random(seed).randint(0, 300))
+    assert found_pairs(trades_raw) == reference_wash_trade_pairs(trades_raw, *THRESHOLDS)
+
+
+# 시간 창 경계: 정확히 창 길이만큼 떨어진 체결은 포함, 1ms 더 떨어지면 제외 (searchsorted의 1ms 여유가 결과를 바꾸지 않음)
+@pytest.mark.parametrize('window_seconds', [0.3, 1.0, 2.5])
+def test_time_window_boundary(window_seconds):
+    window_ms = int(round(window_seconds * 1000))
+    trades_raw = [
+        make_trade(START_EPOCH_MS, 'bid', '1000.0000', '1.0000'),
+        make_trade(START_EPOCH_MS + window_ms, 'ask', '1000.0000', '1.0000'), # 경계 위: 포함
+        make_trade(START_EPOCH_MS + window_ms + 1, 'ask', '1000.0000', '1.0000'), # 경계 + 1ms: 첫 체결과는 제외
+    ]
+    thresholds = (window_seconds, 0.05, 0.01)
+    expected = reference_wash_trade_pairs(trades_raw, *thresholds)
+    assert (0, 1) in expected and (0, 2) not in expected
+    assert found_pairs(trades_raw, thresholds) == expected
+
+
+# 같은 밀리초 체결: 응답 순서를 유지한 (first, second) 오름차순이어야 함
+def test_same_timestamp_ordering():
+    trades_raw = [make_trade(START_EPOCH_MS, side, '1000.0000', '1.0000') for side in ('bid', 'ask', 'bid', 'ask', 'ask')]
+    trades_raw.append(make_trade(START_EPOCH_MS + 1, 'bid', '1000.0000', '1.0000'))
+    expected = reference_wash_trade_pairs(trades_raw, *THRESHOLDS)
+    assert expected == sorted(expected)
+    assert found_pairs(trades_raw) == expected
+
+
+# 앞선 체결의 가격/수량이 0이면 (0으로 나누기 대신) 쌍에서 제외
+def test_zero_price_and_quantity_are_skipped():
+    trades_raw = [
+        make_trade(START_EPOCH_MS, 'bid', '0.0000', '1.0000'),
+        make_trade(START_EPOCH_MS + 10, 'ask', '0.0000', '1.0000'),
+        make_trade(START_EPOCH_MS + 20, 'bid', '1000.0000', '0.0000'),
+        make_trade(START_EPOCH_MS + 30, 'ask', '1000.0000', '0.0000'),
+    ]
+    assert found_pairs(trades_raw) == reference_wash_trade_pairs(trades_raw, *THRESHOLDS) == []
@@ -0,0 +1,247 @@
+# trade_tape.py
+# 파트너, 이 모듈은 빗썸 체결 내역(/transaction_history) 데이터를 다루는 자료구조를 담고 있습니다.
+# API 응답을 한 번만 파싱해 열(column) 단위 배열로 보관하고, 자전거래/펌프 탐지 등
+# 체결 내역을 사용하는 모든 탐지 함수가 같은 스냅샷을 공유하도록 합니다.
+
+from collections import Counter, namedtuple
+from datetime import datetime
+
+import numpy as np
+
+# 체결 종류 비트마스크 (bid | ask == SIDE_BID_ASK 이면 매수/매도 한 쌍)
+SIDE_BID = 1
+SIDE_ASK = 2
+SIDE_BID_ASK = SIDE_BID | SIDE_ASK
+_SIDE_CODES = {'bid': SIDE_BID, 'ask': SIDE_ASK}
+
+
+# 빗썸 transaction_date 문자열 ('%Y-%m-%d %H:%M:%S' 또는 '%Y-%m-%d %H:%M:%S.%f', 로컬 시각)을 epoch 밀리초로 변환
+def parse_transaction_date_ms(transaction_date):
+    return int(round(datetime.fromisoformat(transaction_date).timestamp() * 1000))
+
+
+# epoch 밀리초를 로그 출력용 문자열로 변환 (밀리초가 있으면 소수점 이하 표시)
+def format_epoch_ms(epoch_ms):
+    dt = datetime.fromtimestamp(epoch_ms / 1000)
+    if epoch_ms % 1000:
+        return dt.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
+    return dt.strftime('%Y-%m-%d %H:%M:%S')
+
+
+# 체결 한 건의 식별자 (빗썸 Public API는 체결 ID를 주지 않으므로 원본 필드 전체의 튜플을 그대로 씁니다)
+# hash() 값은 문자열 해시가 프로세스마다 달라지고 서로 다른 체결이 같은 값으로 충돌할 수 있어 키로 쓰지 않습니다.
+def trade_identity(trade):
+    return (trade['transaction_date'], trade['type'], trade['units_traded'], trade['price'], trade.get('total'))
+
+
+# 한 번의 체결 내역 응답을 열 단위로 보관하는 스냅샷 (시간순 정렬)
+#   epoch_ms:   int64 체결 시각 (epoch 밀리초)
+#   prices:     float64 체결 가격
+#   quantities: float64 체결 수량
+#   sides:      uint8 체결 종류 비트마스크 (SIDE_BID / SIDE_ASK, 알 수 없으면 0)
+#   trade_ids:  object 체결 식별자 튜플 (trade_identity, 주기 간 중복 제거용)
+class TradeSnapshot:
+    __slots__ = ('epoch_ms', 'prices', 'quantities', 'sides', 'trade_ids')
+    COLUMNS = __slots__
+
+    def __init__(self, epoch_ms, prices, quantities, sides, trade_ids):
+        self.epoch_ms = epoch_ms
+        self.prices = prices
+        self.quantities = quantities
+        self.sides = sides
+        self.trade_ids = trade_ids
+
+    def __len__(self):
+        return len(self.epoch_ms)
+
+    # 빗썸 응답의 'data' 리스트를 파싱합니다.
+    # 파싱에 실패한 항목은 건너뛰고 (원본 항목, 예외) 목록으로 함께 반환합니다.
+    @classmethod
+    def from_api(cls, trades_raw):
+        count = len(trades_raw)
+        epoch_ms = np.empty(count, dtype=np.int64)
+        prices = np.empty(count, dtype=np.float64)
+        quantities = np.empty(count, dtype=np.float64)
+        sides = np.empty(count, dtype=np.uint8)
+        trade_ids = np.empty(count, dtype=object)
+        errors = []
+
+        k = 0
+        for trade in trades_raw:
+            try:
+                epoch_ms[k] = parse_transaction_date_ms(trade['transaction_date'])
+                quantities[k] = float(trade['units_traded'])
+                prices[k] = float(trade['price'])
+                sides[k] = _SIDE_CODES.get(trade['type'], 0)
+                trade_ids[k] = trade_identity(trade)
+                k += 1
+            except (ValueError, KeyError, TypeError) as e:
+                errors.append((trade, e))
+
+        snapshot = cls(epoch_ms[:k], prices[:k], quantities[:k], sides[:k], trade_ids[:k])
+        if k > 1 and np.any(np.diff(snapshot.epoch_ms) < 0):
+            snapshot = snapshot.take(np.argsort(snapshot.epoch_ms, kind='stable'))
+        return snapshot, errors
+
+    # 인덱스 배열(또는 슬라이스)로 일부 체결만 골라 새 스냅샷 생성
+    def take(self, index):
+        return TradeSnapshot(*(getattr(self, column)[index] for column in self.COLUMNS))
+
+    # since_ms 이후(포함) 체결 수량 합계
+    def volume_since(self, since_ms):
+        start = np.searchsorted(self.epoch_ms, since_ms, side='left')
+        return float(self.quantities[start:].sum())
+
+    # 여러 시작 시각(since_ms 배열) 각각 이후(포함)의 체결 수량 합계를 한 번에 계산 (누적 합 + 이진 탐색)
+    def volumes_since(self, since_ms):
+        starts = np.searchsorted(self.epoch_ms, np.asarray(since_ms, dtype=np.int64), side='left')
+        cumulative = np.concatenate(([0.0], np.cumsum(self.quantities)))
+        return cumulative[-1] - cumulative[starts]
+
+
+# 코인 하나의 체결 테이프: 여러 주기에 걸쳐 받은 체결 내역을 중복 없이 이어 붙여 보관하는 고정 크기 버퍼
+# 매 주기 최근 N개의 체결을 다시 받아도, 최고 수위(high-water mark: 마지막 체결 시각 + 그 시각의 체결 식별자)
+# 이후의 새 체결만 추가하므로 이미 분석/알림한 체결을 다시 처리하지 않습니다.
+class TradeTape:
+    def __init__(self, capacity):
+        if capacity <= 0:
+            raise ValueError(f"체결 테이프 크기는 1 이상이어야 합니다: {capacity}")
+        self.capacity = capacity
+        # 2배 크기로 잡아 두고 끝에 도달하면 최근 데이터만 앞으로 옮깁니다 (추가는 평균 O(1))
+        empty = TradeSnapshot.from_api([])[0]
+        self._columns = {column: np.empty(capacity * 2, dtype=getattr(empty, column).dtype) for column in TradeSnapshot.COLUMNS}
+        self._start = 0
+        self._end = 0
+        self.high_water_ms = None # 지금까지 본 가장 늦은 체결 시각
+        self._high_water_ids = Counter() # high_water_ms 시각에 본 체결 식별자 (같은 체결이 여러 건일 수 있어 개수로 보관)
+        self.new_trade_count = 0 # 마지막 ingest()에서 새로 추가된 체결 수
+
+    def __len__(self):
+        return self._end - self._start
+
+    # 새로 받은 스냅샷에서 아직 보지 못한 체결만 추가하고 그 개수를 반환합니다.
+    # high_water_ms보다 이른 체결은 이미 처리한 것으로 보고 버립니다.
+    def ingest(self, snapshot):
+        if len(snapshot) == 0:
+            self.new_trade_count = 0
+            return 0
+
+        if self.high_water_ms is not None:
+            older_end = int(np.searchsorted(snapshot.epoch_ms, self.high_water_ms, side='left'))
+            same_time_end = int(np.searchsorted(snapshot.epoch_ms, self.high_water_ms, side='right'))
+            # 최고 수위와 같은 시각의 체결은 식별자 개수를 비교해 새 체결만 남김
+            seen = Counter()
+            keep = []
+            for index in range(older_end, same_time_end):
+                trade_id = snapshot.trade_ids[index]
+                seen[trade_id] += 1
+                if seen[trade_id] > self._high_water_ids[trade_id]:
+                    keep.append(index)
+            keep.extend(range(same_time_end, len(snapshot)))
+            snapshot = snapshot.take(np.asarray(keep, dtype=np.int64))
+
+        new_trades = snapshot
+        count = len(new_trades)
+        self.new_trade_count = count
+        if count == 0:
+            return 0
+
+        # 최고 수위 갱신
+        latest_ms = int(new_trades.epoch_ms[-1])
+        latest_ids = Counter(new_trades.trade_ids[new_trades.epoch_ms == latest_ms].tolist())
+        if latest_ms == self.high_water_ms:
+            self._high_water_ids.update(latest_ids)
+        else:
+            self.high_water_ms = latest_ms
+            self._high_water_ids = latest_ids
+
+        self._append(new_trades)
+        return count
+
+    def _append(self, trades):
+        count = len(trades)
+        if count >= self.capacity:
+            trades = trades.take(slice(count - self.capacity, None))
+            count = self.capacity
+            self._start = self._end = 0
+        elif self._end + count > self.capacity * 2:
+            keep = min(len(self), self.capacity - count)
+            for column in self._columns.values():
+                column[:keep] = column[self._end - keep:self._end]
+            self._start, self._end = 0, keep
+        for name, column in self._columns.items():
+            column[self._end:self._end + count] = getattr(trades, name)
+        self._end += count
+        self._start = max(self._start, self._end - self.capacity)
+
+    # 보관 중인 체결 전체를 스냅샷(복사 없는 뷰)으로 반환
+    def snapshot(self):
+        return TradeSnapshot(*(self._columns[column][self._start:self._end] for column in TradeSnapshot.COLUMNS))
+
+    # 마지막 ingest()에서 추가된 새 체결과, 그 앞의 margin_ms 이내 기존 체결만 담은 스냅샷을 반환
+    # (스냅샷, 새 체결이 시작되는 인덱스) 형태이며, 탐지는 이 구간에서만 수행하면 됩니다.
+    def recent_with_margin(self, margin_ms):
+        full = self.snapshot()
+        new_start = len(full) - self.new_trade_count
+        if self.new_trade_count == 0:
+            return full.take(slice(len(full), None)), 0
+        margin_start = int(np.searchsorted(full.epoch_ms, full.epoch_ms[new_start] - margin_ms, side='left'))
+        return full.take(slice(margin_start, None)), new_start - margin_start
+
+    # since_ms 이후(포함) 체결 수량 합계
+    def volume_since(self, since_ms):
+        return self.snapshot().volume_since(since_ms)
+
+    # 여러 시작 시각 각각 이후(포함)의 체결 수량 합계
+    def volumes_since(self, since_ms):
+        return self.snapshot().volumes_since(since_ms)
+
+
+# 자전거래 의심 쌍 탐색 결과 (각 필드는 같은 길이의 numpy 배열, (first, second) 오름차순 정렬)
+#   first, second: 스냅샷 안에서의 두 체결 인덱스 (first < second)
+#   time_diff_seconds, price_diff_percent, quantity_diff_percent: 두 체결 간 차이
+WashTradePairs = namedtuple('WashTradePairs', ['first', 'second', 'time_diff_seconds', 'price_diff_percent', 'quantity_diff_percent'])
+
+
+# 시간순으로 정렬된 체결 스냅샷에서 자전거래 의심 쌍을 찾는 벡터화 함수
+# 조건: 시간 차이 <= time_window_seconds, 매수/매도 한 쌍,
+#       가격/수량 차이(앞선 체결 기준 %)가 각각 허용치 이하 (앞선 체결의 가격/수량이 0이면 제외)
+# 각 체결마다 searchsorted로 시간 창의 끝을 구한 뒤, 창 안의 k번째 다음 체결과의 비교를
+# k = 1, 2, ... 순서로 한꺼번에 수행합니다. 전체 연산량은 시간 창 안의 후보 쌍 수에 비례합니다.
+def find_wash_trade_pairs(trade_snapshot, time_window_seconds, price_tolerance_percent, quantity_tolerance_percent):
+    epoch_ms = trade_snapshot.epoch_ms
+    prices = trade_snapshot.prices
+    quantities = trade_snapshot.quantities
+    sides = trade_snapshot.sides
+    count = len(epoch_ms)
+
+    # 부동소수점 반올림에 대비해 창 끝을 1ms 여유 있게 잡고, 정확한 시간 조건은 아래 마스크에서 다시 확인
+    window_end = np.searchsorted(epoch_ms, epoch_ms + time_window_seconds * 1000 + 1, side='right')
+    span = window_end - np.arange(count) - 1 # 각 체결 뒤로 시간 창 안에 있는 체결 수
+    active = np.nonzero(span > 0)[0]
+
+    found = []
+    k = 1
+    while len(active) > 0:
+        i = active
+        j = i + k
+        time_diff = (epoch_ms[j] - epoch_ms[i]) / 1000
+        mask = (time_diff <= time_window_seconds) & ((sides[i] | sides[j]) == SIDE_BID_ASK) & (sides[i] != sides[j])
+        mask &= (prices[i] != 0) & (quantities[i] != 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            price_diff = np.abs((prices[i] - prices[j]) / prices[i]) * 100
+            quantity_diff = np.abs((quantities[i] - quantities[j]) / quantities[i]) * 100
+        mask &= (price_diff <= price_tolerance_percent) & (quantity_diff <= quantity_tolerance_percent)
+        if mask.any():
+            found.append((i[mask], j[mask], time_diff[mask], price_diff[mask], quantity_diff[mask]))
+        k += 1
+        active = active[span[active] >= k]
+
+    if not found:
+        empty_index = np.empty(0, dtype=np.int64)
+        empty_value = np.empty(0, dtype=np.float64)
+        return WashTradePairs(empty_index, empty_index, empty_value, empty_value, empty_value)
+
+    columns = [np.concatenate(column) for column in zip(*found)]
+    order = np.lexsort((columns[1], columns[0])) # 기존 이중 루프와 같은 (first, second) 순서
+    return WashTradePairs(*(column[order] for column in columns))
@@ -0,0 +1,197 @@
+# wall_tracker.py
+# 파트너, 이 모듈은 코인별 호가창 대규모 벽(매물벽)을 여러 번의 호가창 조회에 걸쳐 추적하는 기록기입니다.
+# 벽은 (매수/매도, 양자화된 가격대)를 키로 하는 딕셔너리에 보관되어, 새로 감지된 벽과 기존 벽의 대응을 O(1)로 찾습니다.
+# (같은 가격대에 여러 벽이 있을 수 있으므로 가격대마다 벽 목록을 두고, 가격 차이가 허용 오차 이내인 벽끼리만 같은 벽으로 봅니다.)
+# 벽마다 처음/마지막 감지 시각, 최대 수량, 철회(사라짐) 횟수를 기억하므로
+# 같은 가격대에 벽을 반복해서 세웠다 거두는 패턴(반복 스푸핑)을 찾을 수 있습니다.
+# 철회는 벽의 가격이 아직 보이는 호가 범위 안에 있는데 벽이 없어졌을 때만 셉니다.
+# (가격이 움직여 벽이 조회한 호가 수 밖으로 밀려나거나 가격이 벽을 지나간 것은 철회가 아님)
+
+import math
+
+
+# 가격을 가격대 번호로 바꿈 (로그 눈금, 한 칸 = tolerance_percent %)
+# 같은 벽으로 볼 수 있는 가격 차이(상대 오차)가 가격 수준과 무관하게 일정합니다.
+def quantize_price_level(price, tolerance_percent):
+    return int(math.floor(math.log(price) / math.log1p(tolerance_percent / 100)))
+
+
+# 추적 중인 벽 하나
+class TrackedWall:
+    __slots__ = ('side', 'level', 'price', 'quantity', 'max_quantity', 'first_seen', 'last_seen',
+                 'first_seen_timestamp', 'sightings', 'placements', 'pulls', 'active')
+
+    def __init__(self, side, level, price, quantity, now, timestamp):
+        self.side = side # 'ask' 또는 'bid'
+        self.level = level # 양자화된 가격대 번호
+        self.price = price # 마지막으로 감지된 호가
+        self.quantity = quantity # 마지막으로 감지된 수량
+        self.max_quantity = quantity
+        self.first_seen = now # 처음 감지 시각 (epoch 초)
+        self.last_seen = now # 마지막 감지 시각 (epoch 초)
+        self.first_seen_timestamp = timestamp # 처음 감지 시각 (로그용 문자열)
+        self.sightings = 1 # 감지된 호가창 조회 수
+        self.placements = 1 # 벽이 (다시) 세워진 횟수
+        self.pulls = 0 # 벽이 사라진(철회된) 횟수
+        self.active = True # 마지막 호가창 조회에 있었는지
+
+    # 현재 벽이 처음 세워진 뒤 지난 시간 (초)
+    def lifetime_seconds(self):
+        return self.last_seen - self.first_seen
+
+    # JSON 저장용 딕셔너리 ('price', 'quantity', 'type', 'timestamp'는 예전 last_detected_large_walls 형식과 같음)
+    def to_dict(self):
+        return {
+            'price': self.price,
+            'quantity': self.quantity,
+            'type': self.side,
+            'timestamp': self.first_seen_timestamp,
+            'level': self.level,
+            'max_quantity': self.max_quantity,
+            'first_seen': self.first_seen,
+            'last_seen': self.last_seen,
+            'sightings': self.sightings,
+            'placements': self.placements,
+            'pulls': self.pulls,
+            'active': self.active,
+        }
+
+
+class WallTracker:
+    # price_tolerance_percent: 같은 벽으로 볼 가격 차이 (%, 가격대 한 칸의 크기)
+    # retention_seconds: 사라진 벽의 기록을 보관할 시간 (이 시간 동안 다시 세워지지 않으면 잊음)
+    # quantity_tolerance_percent: 같은 벽으로 볼 수량 차이 (%). 이보다 많이 바뀌면 직전 벽을 거두고 새로 세운 것으로 봄
+    #                             (None이면 수량은 비교하지 않음)
+    def __init__(self, price_tolerance_percent=0.01, retention_seconds=3600, quantity_tolerance_percent=None):
+        self.price_tolerance_percent = price_tolerance_percent
+        self.retention_seconds = retention_seconds
+        self.quantity_tolerance_percent = quantity_tolerance_percent
+        self._walls = {} # (side, level) -> [TrackedWall, ...] (대부분 1개)
+
+    def __len__(self):
+        return sum(len(walls) for walls in self._walls.values())
+
+    def __iter__(self):
+        return (wall for walls in self._walls.values() for wall in walls)
+
+    def _add(self, wall):
+        self._walls.setdefault((wall.side, wall.level), []).append(wall)
+
+    # 이미 추적 중인 벽 찾기: 가격 차이가 허용 오차 이내인 벽 중 가장 가까운 벽 (가격대 경계에 걸친 경우를 위해 이웃 가격대까지 확인)
+    # 이번 조회에서 이미 대응된 벽(seen)은 제외하므로, 가까운 가격의 서로 다른 벽이 하나로 합쳐지지 않습니다.
+    def _find(self, side, level, price, seen):
+        best, best_difference = None, None
+        for candidate in (level, level - 1, level + 1):
+            for wall in self._walls.get((side, candidate), ()):
+                if id(wall) in seen:
+                    continue
+                difference = abs(wall.price - price) / wall.price * 100
+                if difference < self.price_tolerance_percent and (best is None or difference < best_difference):
+                    best, best_difference = wall, difference
+        return best
+
+    # 수량이 허용 오차보다 많이 바뀌었는지 (직전에 본 수량 기준)
+    def _quantity_changed(self, wall, quantity):
+        if self.quantity_tolerance_percent is None or wall.quantity <= 0:
+            return False
+        return abs(wall.quantity - quantity) / wall.quantity * 100 >= self.quantity_tolerance_percent
+
+    # 이번 호가창 조회에서 감지된 벽들로 상태 갱신
+    # walls: [{'price': float, 'quantity': float, 'type': 'ask'/'bid', 'timestamp': str}, ...]
+    # visible_ranges: 이번 조회에서 보인 쪽별 호가 범위 {'ask': (최저가, 최고가), 'bid': (최저가, 최고가)}
+    #                 주면 이 범위 밖에 있는 사라진 벽은 철회로 세지 않고 추적만 멈춥니다. (None이면 모두 철회로 셈)
+    # 반환값: (새로 세워진 벽 목록, 이번에 사라진 벽 목록) - 모두 TrackedWall
+    def update(self, walls, now, visible_ranges=None):
+        placed, pulled, seen = [], [], set()
+        for wall_info in walls:
+            side, price, quantity = wall_info['type'], wall_info['price'], wall_info['quantity']
+            if price <= 0:
+                continue
+            level = quantize_price_level(price, self.price_tolerance_percent)
+            wall = self._find(side, level, price, seen)
+            if wall is not None and wall.active and self._quantity_changed(wall, quantity):
+                # 같은 가격에 수량이 다른 벽: 직전 벽을 거두고 새로 세운 것으로 봄 (철회/설치 횟수는 이어 감)
+                self._walls[(wall.side, wall.level)].remove(wall)
+                wall.active = False
+                wall.pulls += 1
+                pulled.append(wall)
+                replacement = TrackedWall(side, level, price, quantity, now, wall_info.get('timestamp'))
+                replacement.pulls = wall.pulls
+                replacement.placements = wall.placements + 1
+                self._add(replacement)
+                placed.append(replacement)
+                wall = replacement
+            elif wall is None:
+                wall = TrackedWall(side, level, price, quantity, now, wall_info.get('timestamp'))
+                self._add(wall)
+                placed.append(wall)
+            else:
+                if not wall.active: # 같은 가격대에 벽이 다시 세워짐
+                    wall.active = True
+                    wall.placements += 1
+                    wall.first_seen = now
+                    wall.first_seen_timestamp = wall_info.get('timestamp')
+                    placed.append(wall)
+                wall.price = price
+                wall.quantity = quantity
+                wall.max_quantity = max(wall.max_quantity, quantity)
+                wall.last_seen = now
+                wall.sightings += 1
+            seen.add(id(wall))
+
+        expired = []
+        for key, walls_at_level in self._walls.items():
+            for wall in walls_at_level:
+                if id(wall) in seen:
+                    continue
+                if wall.active:
+                    wall.active = False
+                    if self._visible(wall, visible_ranges):
+                        wall.pulls += 1
+                        pulled.append(wall)
+                elif now - wall.last_seen > self.retention_seconds:
+                    expired.append(wall)
+        for wall in expired:
+            walls_at_level = self._walls[(wall.side, wall.level)]
+            walls_at_level.remove(wall)
+            if not walls_at_level:
+                del self._walls[(wall.side, wall.level)]
+        return placed, pulled
+
+    # 벽의 가격이 이번 조회에서 보인 호가 범위 안에 있는지 (범위를 모르면 True)
+    @staticmethod
+    def _visible(wall, visible_ranges):
+        if visible_ranges is None:
+            return True
+        price_range = visible_ranges.get(wall.side)
+        return price_range is not None and price_range[0] <= wall.price <= price_range[1]
+
+    # 현재 세워져 있는 벽 목록
+    def active_walls(self):
+        return [wall for wall in self if wall.active]
+
+    # JSON 저장용 (수집기를 다시 시작해도 철회 횟수 등을 이어 가기 위함)
+    def to_list(self):
+        return [wall.to_dict() for wall in self]
+
+    # to_list() 결과(또는 예전 last_detected_large_walls 형식의 벽 목록)로 상태 복원
+    @classmethod
+    def from_list(cls, items, price_tolerance_percent=0.01, retention_seconds=3600, now=0.0, quantity_tolerance_percent=None):
+        tracker = cls(price_tolerance_percent, retention_seconds, quantity_tolerance_percent)
+        for item in items:
+            try:
+                side, price, quantity = item['type'], float(item['price']), float(item['quantity'])
+                if price <= 0:
+                    continue
+                level = quantize_price_level(price, price_tolerance_percent)
+                wall = TrackedWall(side, level, price, quantity, float(item.get('first_seen', now)), item.get('timestamp'))
+                wall.last_seen = float(item.get('last_seen', now))
+                wall.max_quantity = float(item.get('max_quantity', quantity))
+                wall.sightings = int(item.get('sightings', 1))
+                wall.placements = int(item.get('placements', 1))
+                wall.pulls = int(item.get('pulls', 0))
+                wall.active = bool(item.get('active', True))
+            except (KeyError, TypeError, ValueError):
+                continue
+            tracker._add(wall)
+        return tracker